@@ -0,0 +1,115 @@
+# Copyright (C) 2018 British Broadcasting Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import gzip
+import hashlib
+import mimetypes
+import os
+
+from flask import Response, abort, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Hashed asset URLs never change content, so they may be cached for as long as browsers allow
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Content types worth compressing, in addition to any text/* type
+COMPRESSIBLE_TYPES = ["application/javascript", "application/json", "image/svg+xml"]
+
+
+class Asset(object):
+    """A static file held in memory, with its precompressed variants keyed by content coding"""
+    def __init__(self, path, content):
+        self.path = path
+        self.digest = hashlib.sha256(content).hexdigest()[:12]
+        self.content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.variants = {"identity": content}
+        if self.content_type.startswith("text/") or self.content_type in COMPRESSIBLE_TYPES:
+            self._add_variant("gzip", gzip.compress(content, 9, mtime=0))
+            if brotli is not None:
+                self._add_variant("br", brotli.compress(content))
+
+    def _add_variant(self, coding, compressed):
+        if len(compressed) < len(self.variants["identity"]):
+            self.variants[coding] = compressed
+
+    def hashed_path(self):
+        root, ext = os.path.splitext(self.path)
+        return "{}.{}{}".format(root, self.digest, ext)
+
+    def etag(self, coding):
+        return self.digest if coding == "identity" else "{}-{}".format(self.digest, coding)
+
+    def select(self, accept_encodings):
+        """Choose the variant to send for the client's Accept-Encoding, preferring the smallest it will accept"""
+        acceptable = [coding for coding in self.variants if coding == "identity" or accept_encodings[coding] > 0]
+        return min(acceptable, key=lambda coding: len(self.variants[coding]))
+
+
+class AssetPipeline(object):
+    """
+    Loads and precompresses the static files at startup, and serves them from content hashed URLs which can be cached
+    indefinitely. Unminified files are left out where a minified equivalent exists, as are source maps.
+    """
+    def __init__(self, static_folder, url_prefix="/assets"):
+        self.static_folder = static_folder
+        self.url_prefix = url_prefix
+        self.assets = {}
+        self.hashed = {}
+
+    def build(self):
+        for directory, _, filenames in os.walk(self.static_folder):
+            for filename in filenames:
+                full_path = os.path.join(directory, filename)
+                path = os.path.relpath(full_path, self.static_folder).replace(os.sep, "/")
+                if not self._wanted(path):
+                    continue
+                with open(full_path, "rb") as f:
+                    asset = Asset(path, f.read())
+                self.assets[path] = asset
+                self.hashed[asset.hashed_path()] = asset
+
+    def _wanted(self, path):
+        if path.endswith(".map"):
+            return False
+        root, ext = os.path.splitext(path)
+        return root.endswith(".min") or not os.path.exists(os.path.join(self.static_folder, root + ".min" + ext))
+
+    def url(self, path):
+        """Get the URL of a static file, which is hashed if the file is handled by the pipeline"""
+        if path not in self.assets:
+            return "/static/" + path
+        return "{}/{}".format(self.url_prefix, self.assets[path].hashed_path())
+
+    def serve(self, filename):
+        asset = self.hashed.get(filename)
+        if asset is None:
+            abort(404)
+        coding = asset.select(request.accept_encodings)
+        response = Response(asset.variants[coding], mimetype=asset.content_type)
+        response.set_etag(asset.etag(coding))
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        response.headers["Vary"] = "Accept-Encoding"
+        if coding != "identity":
+            response.headers["Content-Encoding"] = coding
+        return response.make_conditional(request)
+
+    def init_app(self, app):
+        """Build the assets and register the route serving them, and the 'asset_url' template function"""
+        self.build()
+        app.add_url_rule(self.url_prefix + "/<path:filename>", "assets", self.serve)
+        app.add_template_global(self.url, "asset_url")
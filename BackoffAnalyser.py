@@ -0,0 +1,61 @@
+# Copyright (C) 2018 British Broadcasting Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import TestHelper
+
+# Requests closer together than this, in seconds, are treated as part of the same retry attempt, as a Node may
+# re-send several resources at once
+BURST_GAP = 0.1
+
+# Median ratio between successive retry intervals above which backoff is considered exponential
+EXPONENTIAL_GROWTH = 1.5
+
+
+class BackoffAnalyser(object):
+    """Characterises the retries a client made while its requests were failing"""
+    def __init__(self, times):
+        self.attempts = []
+        for arrival in sorted(times):
+            if not self.attempts or arrival - self.attempts[-1][-1] > BURST_GAP:
+                self.attempts.append([arrival])
+            else:
+                self.attempts[-1].append(arrival)
+        starts = [attempt[0] for attempt in self.attempts]
+        self.intervals = [later - earlier for earlier, later in zip(starts, starts[1:])]
+
+    def growth(self):
+        """The median ratio between successive retry intervals"""
+        ratios = [later / earlier for earlier, later in zip(self.intervals, self.intervals[1:]) if earlier > 0]
+        return TestHelper.percentile(ratios, 50)
+
+    def shape(self):
+        """Classify the backoff as 'exponential', 'linear' or 'constant', or None if there are too few retries"""
+        if len(self.intervals) < 3:
+            return None
+        growth = self.growth()
+        if growth >= EXPONENTIAL_GROWTH:
+            return "exponential"
+        steps = [later - earlier for earlier, later in zip(self.intervals, self.intervals[1:])]
+        if TestHelper.percentile(steps, 50) > 0.1 * TestHelper.percentile(self.intervals, 50):
+            return "linear"
+        return "constant"
+
+    def summary(self):
+        return {"attempts": len(self.attempts),
+                "requests": sum(len(attempt) for attempt in self.attempts),
+                "min": min(self.intervals) if self.intervals else None,
+                "median": TestHelper.percentile(self.intervals, 50),
+                "max": max(self.intervals) if self.intervals else None,
+                "growth": self.growth(),
+                "shape": self.shape()}
@@ -0,0 +1,169 @@
+# Copyright (C) 2018 British Broadcasting Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import copy
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import TestHelper
+from NodeFleet import load_fixtures, make_resource_set
+
+# Resource types registered during the search. Both only require the shared parent Device to exist.
+CAPACITY_TYPES = ["source", "receiver"]
+
+
+class CapacitySearch(object):
+    """
+    Finds the maximum sustainable rate of POST /resource requests a Registration API can accept.
+    The request rate is ramped up until latency exceeds the SLO or errors appear, then bisected to find the knee.
+    Requests are paced open-loop and latency is measured from each request's intended start time, so that a
+    registry which falls behind is not hidden by the load generator slowing down with it.
+    """
+    def __init__(self, reg_url, slo, start_rate=50, max_rate=10000, step_duration=5, growth=1.5, bisect_steps=4,
+                 workers=64):
+        self.reg_url = reg_url
+        self.slo = slo
+        self.start_rate = start_rate
+        self.max_rate = max_rate
+        self.step_duration = step_duration
+        self.growth = growth
+        self.bisect_steps = bisect_steps
+        self.workers = workers
+
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.parents = make_resource_set(load_fixtures(), "Capacity Search")
+        self.node_id = self.parents[0][1]["id"]
+        self.device_id = self.parents[1][1]["id"]
+        self.templates = {res_type: data for res_type, data in self.parents}
+        self.stop_heartbeats = threading.Event()
+
+    def _session(self):
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = requests.Session()
+            self.local.session = session
+        return session
+
+    def _register_parents(self):
+        for res_type, data in self.parents[:2]:
+            response = self._session().post(self.reg_url + "resource", json={"type": res_type, "data": data},
+                                            timeout=5)
+            if response.status_code not in [200, 201]:
+                return False, "Registration of parent {} returned {}".format(res_type, response.status_code)
+        return True, ""
+
+    def _heartbeat(self):
+        """Keep the parent Node alive for the duration of the search"""
+        session = requests.Session()
+        while not self.stop_heartbeats.wait(5):
+            try:
+                session.post(self.reg_url + "health/nodes/" + self.node_id, timeout=5)
+            except requests.exceptions.RequestException:
+                pass
+
+    def _make_request(self, sequence):
+        res_type = CAPACITY_TYPES[sequence % len(CAPACITY_TYPES)]
+        data = copy.copy(self.templates[res_type])
+        data["id"] = str(uuid.uuid4())
+        data["device_id"] = self.device_id
+        data["version"] = TestHelper.getTAITime()
+        return {"type": res_type, "data": data}
+
+    def _send(self, due, body, step):
+        with self.lock:
+            step["in_flight"] += 1
+            step["max_in_flight"] = max(step["max_in_flight"], step["in_flight"])
+        try:
+            response = self._session().post(self.reg_url + "resource", json=body, timeout=max(self.slo * 10, 5))
+            ok = response.status_code in [200, 201]
+        except requests.exceptions.RequestException:
+            ok = False
+        latency = time.monotonic() - due
+        with self.lock:
+            step["in_flight"] -= 1
+            if ok:
+                step["latency"].append(latency)
+            else:
+                step["errors"] += 1
+
+    def run_step(self, rate):
+        """Offer load at a fixed rate for one step and measure the registry's response"""
+        step = {"rate": rate, "latency": [], "errors": 0, "in_flight": 0, "max_in_flight": 0}
+        count = int(rate * self.step_duration)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            start = time.monotonic()
+            for sequence in range(count):
+                due = start + sequence / rate
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(self._send, due, self._make_request(sequence), step)
+        elapsed = time.monotonic() - start
+
+        step["achieved"] = len(step["latency"]) / elapsed if elapsed > 0 else 0
+        step["p50"] = TestHelper.percentile(step["latency"], 50)
+        step["p99"] = TestHelper.percentile(step["latency"], 99)
+        step["ok"] = step["errors"] == 0 and step["p99"] is not None and step["p99"] <= self.slo and \
+            step["achieved"] >= 0.9 * rate
+        # Let any backlog in the registry drain before the next step
+        time.sleep(1)
+        return step
+
+    def run(self):
+        """Perform the search, returning the maximum sustainable rate (or None) and the latency curve"""
+        valid, message = self._register_parents()
+        if not valid:
+            raise Exception(message)
+        heartbeat_thread = threading.Thread(target=self._heartbeat, daemon=True)
+        heartbeat_thread.start()
+
+        curve = []
+        good = None
+        bad = None
+        try:
+            rate = self.start_rate
+            while rate <= self.max_rate:
+                step = self.run_step(rate)
+                curve.append(step)
+                if not step["ok"]:
+                    bad = rate
+                    break
+                good = rate
+                rate = rate * self.growth
+
+            if bad is not None:
+                lower = good or 0
+                for _ in range(self.bisect_steps):
+                    mid = (lower + bad) / 2.0
+                    if mid < 1:
+                        break
+                    step = self.run_step(mid)
+                    curve.append(step)
+                    if step["ok"]:
+                        lower = good = mid
+                    else:
+                        bad = mid
+        finally:
+            self.stop_heartbeats.set()
+            try:
+                self._session().delete(self.reg_url + "resource/nodes/" + self.node_id, timeout=5)
+            except requests.exceptions.RequestException:
+                pass
+
+        return {"max_rate": good, "knee": bad, "curve": sorted(curve, key=lambda step: step["rate"])}
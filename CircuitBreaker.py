@@ -0,0 +1,63 @@
+# Copyright (C) 2018 British Broadcasting Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+
+
+class CircuitBreaker(object):
+    """
+    Tracks consecutive connection failures to each host, and opens once there have been 'threshold' of them so that
+    further requests to the host can fail immediately. After 'reset_timeout' seconds a single request is let through
+    to try the host again, closing the breaker if it succeeds.
+    """
+    def __init__(self, threshold, reset_timeout):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.failures = {}
+        self.opened = {}
+
+    def allow(self, host):
+        """Check whether a request may be made to a host"""
+        with self.lock:
+            opened = self.opened.get(host)
+            if opened is None:
+                return True
+            if time.monotonic() - opened >= self.reset_timeout:
+                # Let this request through to try the host again, and hold back others until it is known to work
+                self.opened[host] = time.monotonic()
+                return True
+            return False
+
+    def record_success(self, host):
+        with self.lock:
+            self.failures.pop(host, None)
+            self.opened.pop(host, None)
+
+    def record_failure(self, host):
+        with self.lock:
+            self.failures[host] = self.failures.get(host, 0) + 1
+            if self.failures[host] >= self.threshold:
+                self.opened[host] = time.monotonic()
+
+    def trip(self, host):
+        """Open the breaker for a host which is known to be unreachable"""
+        with self.lock:
+            self.failures[host] = max(self.failures.get(host, 0), self.threshold)
+            self.opened[host] = time.monotonic()
+
+    def is_open(self, host):
+        with self.lock:
+            return host in self.opened
@@ -0,0 +1,140 @@
+# Copyright (C) 2018 British Broadcasting Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+
+# Latencies below this, in seconds, are not taken as a baseline, so that timer resolution and tiny responses do not
+# make ordinary requests look like spikes
+MIN_BASELINE = 0.005
+
+
+class TokenBucket(object):
+    """Caps a rate of events, allowing bursts of up to 'burst' events at once"""
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    def wait_time(self):
+        """Take a token if one is available, returning 0, or otherwise return the time until one will be"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class HostLimit(object):
+    """The adaptive concurrency limit, and optional rate cap, for requests to one host"""
+    def __init__(self, initial, rate=None, burst=1):
+        self.limit = float(initial)
+        self.in_flight = 0
+        self.baselines = {}
+        self.lowest = self.highest = int(self.limit)
+        self.decreases = 0
+        self.last_decrease = 0
+        self.bucket = TokenBucket(rate, burst) if rate else None
+
+    def report(self):
+        return {"limit": int(self.limit), "lowest": self.lowest, "highest": self.highest, "decreases": self.decreases,
+                "rate_limit": self.bucket.rate if self.bucket else None}
+
+
+class ConcurrencyLimiter(object):
+    """
+    Limits the number of requests in flight to each host, adapting the limit with additive increase and
+    multiplicative decrease. The limit grows by one for each limit's worth of requests answered within 'tolerance'
+    times the lowest latency seen for the same kind of request, and is multiplied by 'backoff' when a request is
+    answered more slowly, fails with a 5xx response or times out. A rate cap in requests per second may also be
+    applied.
+    """
+    def __init__(self, initial, maximum, tolerance, backoff=0.5, rate=None, burst=1):
+        self.initial = initial
+        self.maximum = maximum
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.rate = rate
+        self.burst = burst
+        self.condition = threading.Condition()
+        self.hosts = {}
+
+    def _host(self, host):
+        if host not in self.hosts:
+            self.hosts[host] = HostLimit(self.initial, self.rate, self.burst)
+        return self.hosts[host]
+
+    def acquire(self, host, deadline=None):
+        """
+        Wait until a request may be made to a host, within a Deadline, returning False if the deadline passes first.
+        Each successful call must be followed by a call to release.
+        """
+        with self.condition:
+            state = self._host(host)
+            while True:
+                wait = None
+                if state.in_flight < int(state.limit):
+                    wait = state.bucket.wait_time() if state.bucket else 0
+                    if wait == 0:
+                        state.in_flight += 1
+                        return True
+                if deadline is not None:
+                    if deadline.expired():
+                        return False
+                    wait = deadline.limit(wait) if wait is not None else deadline.remaining()
+                self.condition.wait(wait)
+
+    def release(self, host, latency, overloaded=False, label=None, measured=True):
+        """
+        Record the outcome of a request, adjusting the host's limit. Its latency is compared with the lowest seen for
+        requests with the same label, such as their method and path template, as some requests take far longer than
+        others. Latencies which were not measured to the end of the response, such as those of streamed responses,
+        are not compared.
+        """
+        with self.condition:
+            state = self._host(host)
+            state.in_flight -= 1
+            spike = False
+            if measured:
+                baseline = state.baselines.get(label)
+                if not overloaded and latency >= MIN_BASELINE:
+                    baseline = latency if baseline is None else min(baseline, latency)
+                    state.baselines[label] = baseline
+                spike = baseline is not None and latency > baseline * self.tolerance
+            now = time.monotonic()
+            if overloaded or spike:
+                # Only back off once for the requests which were already in flight when the overload was seen
+                if now - state.last_decrease > latency:
+                    state.limit = max(state.limit * self.backoff, 1)
+                    state.decreases += 1
+                    state.last_decrease = now
+            else:
+                state.limit = min(state.limit + 1 / state.limit, self.maximum)
+            state.lowest = min(state.lowest, int(state.limit))
+            state.highest = max(state.highest, int(state.limit))
+            self.condition.notify_all()
+
+    def cancel(self, host):
+        """Give up a request which was allowed by acquire but not made, without adjusting the host's limit"""
+        with self.condition:
+            self._host(host).in_flight -= 1
+            self.condition.notify_all()
+
+    def report(self):
+        """Get the final, lowest and highest limit, number of decreases and rate cap of each host"""
+        with self.condition:
+            return {host: state.report() for host, state in self.hosts.items()}
@@ -0,0 +1,161 @@
+# Copyright (C) 2018 British Broadcasting Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# NMOS Testing Tool configuration
+# Edit the values below to adjust the behaviour of the testing tool
+
+# Port on which the testing tool is served, and the number of worker processes to serve it from. With more than one
+# worker, mock registry state is held in a separate store process shared by all of them.
+SERVER_PORT = 5000
+SERVER_WORKERS = 1
+
+# Number of test runs whose results are kept for viewing, and the number of results shown per page
+RESULT_HISTORY = 20
+RESULT_PAGE_SIZE = 500
+
+# File in which named test selection profiles are saved
+PROFILE_PATH = "profiles.json"
+
+# Number of tests within a test suite which may run at once. Tests only run alongside each other where they declare
+# the resources they read and mutate and these do not conflict. Set to 1 to run every test on its own.
+TEST_WORKERS = 4
+
+# Request timeouts in seconds for connecting to and reading from the API under test, and the number of times to retry
+# idempotent requests which fail to connect or time out, waiting a random time of up to REQUEST_RETRY_BACKOFF seconds,
+# doubling with each attempt, in between
+REQUEST_CONNECT_TIMEOUT = 5
+REQUEST_READ_TIMEOUT = 10
+REQUEST_RETRIES = 2
+REQUEST_RETRY_BACKOFF = 0.5
+
+# Time budgets in seconds for each test and for a whole test suite, or None for no limit. Requests are limited to the
+# time left, and tests which overrun, or cannot start before the test suite runs out of time, are marked as timed out.
+TEST_TIMEOUT = 300
+SUITE_TIMEOUT = 3600
+
+# Number of consecutive failures to connect to a host under test after which further requests to it fail without being
+# made, and the time in seconds after which a request is let through to try it again
+CIRCUIT_BREAKER_THRESHOLD = 3
+CIRCUIT_BREAKER_RESET = 30
+
+# Adaptive limit on the number of requests in flight to each host under test: the limit to start from and the most to
+# allow, the multiple of the lowest latency seen for the same method and path above which a response is taken as a
+# sign of overload, and the factor the limit is cut by on overload, 5xx responses or timeouts. The limit grows by one
+# for each limit's worth of requests answered in time.
+CONCURRENCY_INITIAL = 2
+CONCURRENCY_MAX = 32
+CONCURRENCY_LATENCY_TOLERANCE = 4
+CONCURRENCY_BACKOFF = 0.5
+
+# Cap on the rate of requests to each host under test in requests per second, or None for no cap, and the number of
+# requests which may be made at once within the cap
+RATE_LIMIT = None
+RATE_LIMIT_BURST = 10
+
+# Responsiveness report: p95 latency SLOs in milliseconds for the requests made to the APIs under test, which are
+# checked as extra test results. Requests are grouped by method and RAML path template, e.g.
+# "GET /x-nmos/node/v1.2/devices/{deviceId}", and each SLO applies to the groups matching its glob pattern, with the
+# most specific pattern taking precedence, e.g. {"*": 1000, "GET */senders": 200}. Empty for no SLOs.
+LATENCY_SLOS = {}
+
+# Requests taking longer than their SLO, or this many milliseconds, have their full request and response kept in the
+# slow request log, which holds the SLOW_REQUEST_LOG_SIZE slowest. None to log only requests exceeding an SLO.
+SLOW_REQUEST_MS = 1000
+SLOW_REQUEST_LOG_SIZE = 20
+
+# Validation of large JSON array responses: the number of items after which the rest of an array is validated in a
+# pool of worker processes, so that it does not hold up other test runs, the number of items sent to a worker at a time,
+# and the number of worker processes, or None for one per CPU. Set SCHEMA_POOL_WORKERS to 0 to validate in-thread.
+SCHEMA_POOL_MIN_ITEMS = 1000
+SCHEMA_POOL_CHUNK_SIZE = 250
+SCHEMA_POOL_WORKERS = None
+
+# Port on which to run an in-memory stand-in Registration and Query API, for self-testing and benchmarking the
+# IS-04-02 tests without an external registry. Set to None to disable.
+STANDIN_REGISTRY_PORT = None
+
+# Port for the stand-in registry's Query API WebSocket subscriptions. 0 selects an ephemeral port.
+STANDIN_REGISTRY_WS_PORT = 0
+
+# Number of seconds without a heartbeat before the stand-in registry expires a Node and its sub-resources
+STANDIN_REGISTRY_EXPIRY = 12
+
+# Maximum time in seconds to wait for an mDNS announcement to be discovered
+DNS_SD_TIMEOUT = 5
+
+# Mock registry heartbeat analysis (IS-04-01): the longest time in seconds to observe a Node's heartbeats for, the
+# minimum number of heartbeat intervals to observe, and the 95% confidence interval half-width in seconds on the mean
+# interval at which observation stops early. At most HEARTBEAT_HISTORY heartbeats are retained for inspection.
+HEARTBEAT_WINDOW = 60
+HEARTBEAT_MIN_INTERVALS = 4
+HEARTBEAT_PRECISION = 0.1
+HEARTBEAT_HISTORY = 1000
+
+# Mock registry fault injection (IS-04-01): how long in seconds registrations fail for after a heartbeat is rejected
+# with a 404, the status code returned (None for latency or dropped connections only), any latency added in
+# milliseconds, whether connections are dropped, the time in seconds allowed for the Node to re-register once the
+# fault clears, and the mean time in seconds between registration attempts during the fault below which a Node is
+# judged to be hammering the registry
+FAULT_DURATION = 30
+FAULT_STATUS = 500
+FAULT_LATENCY_MS = 0
+FAULT_DROP_CONNECTIONS = False
+FAULT_RECOVERY_TIMEOUT = 30
+FAULT_MIN_RETRY_INTERVAL = 1
+
+# Virtual Node fleet mode (IS-04-02): number of simulated Nodes, how long to run for in seconds and how many
+# concurrent HTTP requests to allow
+FLEET_NODE_COUNT = 1000
+FLEET_DURATION = 60
+FLEET_WORKERS = 64
+
+# Registration API capacity search mode (IS-04-02): the p99 latency SLO in milliseconds, the request rate to start
+# ramping from and the maximum to try in requests per second, and the duration of each rate step in seconds
+CAPACITY_SLO_MS = 100
+CAPACITY_START_RATE = 50
+CAPACITY_MAX_RATE = 10000
+CAPACITY_STEP_DURATION = 5
+CAPACITY_WORKERS = 64
+
+# Node API load mode (IS-04-01): number of concurrent clients polling the Node API read endpoints, how long to run
+# for in seconds, and how many responses from each endpoint to check against its schema and its response before the
+# load
+NODE_LOAD_CONCURRENCY = 16
+NODE_LOAD_DURATION = 60
+NODE_LOAD_SAMPLES = 20
+
+# Query API benchmark mode (IS-04-02): number of synthetic resources to seed, depth of the Source and Flow parent
+# chains used for ancestry queries, and number of times to repeat each query shape
+QUERY_BENCH_RESOURCES = 10000
+QUERY_BENCH_TREE_DEPTH = 10
+QUERY_BENCH_REPEATS = 20
+
+# Query API subscription mode (IS-04-02): number of Source registrations to push through each subscription and the
+# rate to push them at in registrations per second, the delivery latency allowed beyond each subscription's
+# max_update_rate_ms in milliseconds, and the largest number of concurrent subscriptions to try
+SUBSCRIPTION_UPDATES = 200
+SUBSCRIPTION_UPDATE_RATE = 50
+SUBSCRIPTION_SLO_MS = 500
+SUBSCRIPTION_MAX_COUNT = 500
+
+# Connection API stress mode (IS-05-01): the numbers of concurrent clients to step through while changing staged
+# parameters, and the duration of each step in seconds
+PATCH_STRESS_CONCURRENCY = [1, 2, 4, 8, 16, 32]
+PATCH_STRESS_STEP_DURATION = 10
+
+# Registry priority failover (IS-04-01): the 'pri' values to advertise a mock registry at, each on its own ephemeral
+# port, and the time in seconds allowed for a Node to register with an alternative registry when its registry fails.
+# Failures use FAULT_STATUS and FAULT_DROP_CONNECTIONS.
+FAILOVER_PRIORITIES = [10, 20, 30]
+FAILOVER_TIMEOUT = 30
@@ -0,0 +1,40 @@
+# Copyright (C) 2018 British Broadcasting Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+
+
+class Deadline(object):
+    """
+    A time budget which shrinks as time is spent, optionally within the budget of a parent, such as a test within its
+    test suite. A budget of None is unlimited.
+    """
+    def __init__(self, seconds=None, parent=None):
+        self.expiry = None if seconds is None else time.monotonic() + seconds
+        if parent is not None and parent.expiry is not None:
+            self.expiry = parent.expiry if self.expiry is None else min(self.expiry, parent.expiry)
+
+    def remaining(self):
+        """Get the time left in seconds, or None if the budget is unlimited"""
+        if self.expiry is None:
+            return None
+        return max(self.expiry - time.monotonic(), 0)
+
+    def expired(self):
+        return self.expiry is not None and time.monotonic() >= self.expiry
+
+    def limit(self, timeout):
+        """Limit a timeout in seconds to the time left"""
+        remaining = self.remaining()
+        return timeout if remaining is None else min(timeout, remaining)
@@ -0,0 +1,87 @@
+# Copyright (C) 2018 British Broadcasting Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+from collections import deque
+
+# Mock registry endpoints which faults can be injected into
+ENDPOINTS = ["resource", "heartbeat"]
+
+
+class Fault(object):
+    """
+    A fault to apply to requests to an endpoint: an added latency in seconds, followed by either an error status code,
+    a dropped connection, or normal handling if neither is set. A fault may be limited to a number of requests and to
+    a period of time.
+    """
+    def __init__(self, endpoint, status=None, latency=0, drop=False, count=None, until=None):
+        if endpoint not in ENDPOINTS:
+            raise ValueError("Unknown mock registry endpoint: {}".format(endpoint))
+        self.endpoint = endpoint
+        self.status = status
+        self.latency = latency
+        self.drop = drop
+        self.count = count
+        self.until = until
+
+    def expired(self, now):
+        return (self.count is not None and self.count <= 0) or (self.until is not None and now >= self.until)
+
+
+class FaultInjector(object):
+    """Holds the faults configured for a mock registry, and a log of every request made to it"""
+    def __init__(self, history=10000):
+        self.lock = threading.Lock()
+        self.faults = []
+        self.log = deque(maxlen=history)
+
+    def inject(self, endpoint, status=None, latency=0, drop=False, count=None, duration=None):
+        """Add a fault to an endpoint. Faults are applied in the order they were added."""
+        until = time.monotonic() + duration if duration is not None else None
+        fault = Fault(endpoint, status, latency, drop, count, until)
+        with self.lock:
+            self.faults.append(fault)
+        return fault
+
+    def clear(self, endpoint=None):
+        with self.lock:
+            self.faults = [fault for fault in self.faults if endpoint is not None and fault.endpoint != endpoint]
+
+    def reset(self):
+        with self.lock:
+            self.faults = []
+            self.log.clear()
+
+    def next_fault(self, endpoint, arrival):
+        """Get the fault to apply to a request arriving at an endpoint, or None to handle it normally"""
+        with self.lock:
+            self.faults = [fault for fault in self.faults if not fault.expired(arrival)]
+            for fault in self.faults:
+                if fault.endpoint == endpoint:
+                    if fault.count is not None:
+                        fault.count -= 1
+                    return fault
+        return None
+
+    def record(self, arrival, endpoint, outcome):
+        """Log a request, with the status code returned or 'dropped'"""
+        with self.lock:
+            self.log.append((arrival, endpoint, outcome))
+
+    def requests(self, endpoint=None, since=None, until=None):
+        """Get the logged requests as (arrival, endpoint, outcome), optionally filtered by endpoint and time"""
+        with self.lock:
+            return [entry for entry in self.log if (endpoint is None or entry[1] == endpoint) and
+                    (since is None or entry[0] >= since) and (until is None or entry[0] < until)]
@@ -13,17 +13,49 @@
 # limitations under the License.
 
 import os
+import hashlib
 import json
+import random
+import socket
+import threading
+import time
 import requests
 import git
 import jsonschema
+from urllib.parse import urlsplit
 
 from Specification import Specification
 from TestResult import Test
+from Deadline import Deadline
+from CircuitBreaker import CircuitBreaker
+from ConcurrencyLimiter import ConcurrencyLimiter
+from LatencyReport import LatencyReport
+from JsonResponse import JsonResponse
+from PagedWalker import PagedWalker, PagingError, iter_json_array, CHUNK_SIZE
+from SchemaPool import SCHEMA_POOL, ValidationTimeout
+from TestSelection import BASICS, declared_tests, parse_selection, resolve_selection
+from TestScheduler import TestScheduler
+
+import Config
 
 # TODO: Consider whether to set Accept headers? If we don't set them we expect APIs to default to application/json
 # unless told otherwise. Is this part of the spec?
 
+# Serialises checkouts of the specification repositories, which concurrent test runs share
+SPEC_LOCK = threading.Lock()
+
+# Requests which may safely be retried
+IDEMPOTENT_METHODS = ["GET", "HEAD", "OPTIONS"]
+
+# Number of sub-resource IDs kept from each streamed list response, of which only the first is used for testing
+MAX_STREAMED_SUBRESOURCES = 10
+
+# ID of the results of the checks made on the APIs under test before a test suite is run
+PREFLIGHT = "preflight"
+
+# ID of the results of the latency SLO checks made once a test suite has run
+LATENCY = "latency"
+
 
 class GenericTest(object):
     """
@@ -44,28 +76,42 @@ class GenericTest(object):
 
         self.major_version, self.minor_version = self._parse_version(self.test_version)
 
-        repo = git.Repo(self.spec_path)
         self.result = list()
 
-        # List remote branches and check there is a v#.#.x or v#.#-dev
-        branches = repo.git.branch('-a')
-        spec_branch = None
-        branch_names = [self.test_version + ".x", self.test_version + "-dev"]
-        print("branches", branches)
-        if "06" in str(repo):
-            branch_names += ["master"]
-
-        for branch in branch_names:
-            if "remotes/origin/" + branch in branches:
-                spec_branch = branch
-                break
+        # The Deadline of the test being run by each thread
+        self.test_context = threading.local()
+
+        self.breaker = CircuitBreaker(Config.CIRCUIT_BREAKER_THRESHOLD, Config.CIRCUIT_BREAKER_RESET)
+        self.limiter = ConcurrencyLimiter(Config.CONCURRENCY_INITIAL, Config.CONCURRENCY_MAX,
+                                          Config.CONCURRENCY_LATENCY_TOLERANCE, Config.CONCURRENCY_BACKOFF,
+                                          Config.RATE_LIMIT, Config.RATE_LIMIT_BURST)
+        self.preflight_failures = None
+
+        with SPEC_LOCK:
+            repo = git.Repo(self.spec_path)
+
+            # List remote branches and check there is a v#.#.x or v#.#-dev
+            branches = repo.git.branch('-a')
+            spec_branch = None
+            branch_names = [self.test_version + ".x", self.test_version + "-dev"]
+            print("branches", branches)
+            if "06" in str(repo):
+                branch_names += ["master"]
+
+            for branch in branch_names:
+                if "remotes/origin/" + branch in branches:
+                    spec_branch = branch
+                    break
+
+            if not spec_branch:
+                raise Exception("No branch matching the expected patterns was found in the Git repository")
 
-        if not spec_branch:
-            raise Exception("No branch matching the expected patterns was found in the Git repository")
+            repo.git.reset('--hard')
+            repo.git.checkout(spec_branch)
+            self.parse_RAML()
 
-        repo.git.reset('--hard')
-        repo.git.checkout(spec_branch)
-        self.parse_RAML()
+        self.latency = LatencyReport(self.apis, Config.LATENCY_SLOS, Config.SLOW_REQUEST_MS,
+                                     Config.SLOW_REQUEST_LOG_SIZE)
 
     def _parse_version(self, version):
         """Parse a string based API version into its major and minor numbers"""
@@ -77,22 +123,108 @@ class GenericTest(object):
         for api in self.apis:
             self.apis[api]["spec"] = Specification(os.path.join(self.spec_path + '/APIs/' + self.apis[api]["raml"]))
 
-    def execute_tests(self):
-        """Perform all tests defined within this class"""
-        print(" * Running basic API tests")
-        self.result += self.basics()
-        for method_name in dir(self):
-            if method_name.startswith("test_"):
-                method = getattr(self, method_name)
-                if callable(method):
-                    print(" * Running " + method_name)
-                    self.result.append(method())
-
-    def run_tests(self):
+    def execute_tests(self, selection=None):
+        """
+        Perform the tests defined within this class, or only those selected and the tests they depend on. Tests
+        which do not conflict are run in parallel, but their results are recorded in the order the tests are defined.
+        """
+        tests = declared_tests(type(self))
+        test_ids = resolve_selection(selection, tests) if parse_selection(selection) else list(tests)
+        if self.preflight():
+            for test_id in test_ids:
+                self.add_result(test_id, Test(tests[test_id]["description"]).FAIL(
+                    "Not run as the APIs under test failed their pre-flight check"))
+            return
+        suite_deadline = Deadline(Config.SUITE_TIMEOUT)
+
+        def timed_out(test_id, detail):
+            return [Test(tests[test_id]["description"]).TIMEOUT(detail)]
+
+        scheduler = TestScheduler(tests, Config.TEST_WORKERS)
+        results = scheduler.run(test_ids, self.execute_test, timed_out, Config.TEST_TIMEOUT, suite_deadline)
+        for test_id in test_ids:
+            for result in results[test_id]:
+                self.add_result(test_id, result)
+        for result in self.latency.slo_results():
+            self.add_result(LATENCY, result)
+
+    def execute_test(self, test_id, deadline=None):
+        """Perform a single test within a Deadline, returning its results as a list"""
+        self.test_context.deadline = deadline
+        try:
+            if test_id == BASICS:
+                print(" * Running basic API tests")
+                return self.basics()
+            print(" * Running " + test_id)
+            return [getattr(self, test_id)()]
+        finally:
+            self.test_context.deadline = None
+
+    def execute_mode(self, mode):
+        """Perform an additional mode of testing, such as load generation, defined by a 'mode_' method"""
+        method = getattr(self, "mode_" + mode, None)
+        if not callable(method):
+            raise Exception("Test mode '{}' is not supported by this test suite".format(mode))
+        if self.preflight():
+            return
+        print(" * Running " + mode + " mode")
+        for result in method():
+            self.add_result(mode, result)
+
+    def add_result(self, test_id, result):
+        """Record a result of the form [description, status, detail], tagged with the ID of the test producing it"""
+        self.result.append(result + [test_id])
+
+    def run_metadata(self):
+        """Get details of how a run was made, to be reported alongside its results"""
+        return {"concurrency": self.limiter.report(), "latency": self.latency.summary(),
+                "slow_requests": self.latency.slow_requests()}
+
+    def run_tests(self, mode="conformance", selection=None):
         """Perform tests and return the results as a list"""
-        self.execute_tests()
+        if mode == "conformance":
+            self.execute_tests(selection)
+        else:
+            self.execute_mode(mode)
         return self.result
 
+    def preflight(self):
+        """
+        Check that each API under test accepts connections and serves its API root, the first time this is called,
+        recording any failures. Returns the failures. Hosts which cannot be connected to have their circuit breaker
+        opened, so that any further requests to them fail straight away.
+        """
+        if self.preflight_failures is None:
+            self.preflight_failures = []
+            for api in sorted(self.apis):
+                result = self.probe_api(api)
+                if result is not None:
+                    self.preflight_failures.append(result)
+                    self.add_result(PREFLIGHT, result)
+        return self.preflight_failures
+
+    def probe_api(self, api):
+        """Check that an API under test is reachable, returning a failure result if it is not or None if it is"""
+        base_url = self.apis[api]["base_url"]
+        test = Test("Pre-flight check of the {} API at {}".format(api, base_url))
+        host = urlsplit(base_url)
+        try:
+            address = (host.hostname, host.port or 80)
+        except ValueError:
+            return test.FAIL("The API's URL is invalid")
+        try:
+            socket.create_connection(address, Config.REQUEST_CONNECT_TIMEOUT).close()
+        except OSError as e:
+            self.breaker.trip(host.netloc)
+            return test.FAIL("Unable to connect to the API: {}".format(e))
+
+        valid, response = self.do_request("GET", "{}/x-nmos/{}/".format(base_url.rstrip("/"), api))
+        if not valid:
+            return test.FAIL("Unable to get the API root: {}".format(response))
+        elif response.status_code != 200:
+            return test.FAIL("Incorrect response code from the API root: {}".format(response.status_code))
+        return None
+
     def convert_bytes(self, data):
         """Convert bytes which may be contained within a dict or tuple into strings"""
         if isinstance(data, bytes):
@@ -140,7 +272,8 @@ class GenericTest(object):
             return test.FAIL("Incorrect CORS headers: {}".format(req.headers))
         else:
             try:
-                if not isinstance(req.json(), list) or expectation not in req.json():
+                body = req.json()
+                if not isinstance(body, list) or expectation not in body:
                     return test.FAIL("Response is not an array containing '{}'".format(expectation))
                 else:
                     return test.PASS()
@@ -153,36 +286,197 @@ class GenericTest(object):
             return False, "Incorrect CORS headers: {}".format(response.headers)
 
         try:
-            resolver = jsonschema.RefResolver(self.file_prefix + os.path.join(self.spec_path + '/APIs/schemas/'),
-                                              schema)
-            jsonschema.validate(response.json(), schema, resolver=resolver)
+            base_uri = self.file_prefix + os.path.join(self.spec_path + '/APIs/schemas/')
+            resolver = jsonschema.RefResolver(base_uri, schema)
+            body = response.json()
+            if self.use_schema_pool(schema, body):
+                # Check the array as a whole here, and leave its items to the pool
+                array_schema = {key: value for key, value in schema.items() if key != "items"}
+                jsonschema.validate(body, array_schema, resolver=resolver)
+                validation = SCHEMA_POOL.validation(schema, base_uri, self.test_deadline())
+                for offset in range(0, len(body), Config.SCHEMA_POOL_CHUNK_SIZE):
+                    validation.submit(offset, body[offset:offset + Config.SCHEMA_POOL_CHUNK_SIZE])
+                invalid = validation.invalid_items()
+                if invalid:
+                    return False, self.invalid_items_message(invalid)
+            else:
+                jsonschema.validate(body, schema, resolver=resolver)
         except jsonschema.ValidationError:
             return False, "Response schema validation error"
+        except ValidationTimeout:
+            return False, "Test time budget exceeded while validating the response"
         except json.decoder.JSONDecodeError:
             return False, "Invalid JSON received"
 
         return True, ""
 
-    def do_request(self, method, url, data=None):
-        """Perform a basic HTTP request with appropriate error handling"""
+    def use_schema_pool(self, schema, body):
+        """Check whether the items of a JSON array are numerous enough to validate in the SCHEMA_POOL"""
+        return SCHEMA_POOL.available() and isinstance(body, list) and len(body) >= Config.SCHEMA_POOL_MIN_ITEMS and \
+            schema.get("type") == "array" and isinstance(schema.get("items"), dict)
+
+    def invalid_items_message(self, invalid):
+        """Describe the invalid items of a JSON array by their indexes"""
+        shown = ", ".join(str(index) for index in invalid[:10])
+        if len(invalid) > 10:
+            shown += " and {} more".format(len(invalid) - 10)
+        return "Response schema validation error in item{} {}".format("s" if len(invalid) > 1 else "", shown)
+
+    def check_array_response(self, path, schema, method, response):
+        """
+        Confirm that a JSON array response conforms to an array schema, validating each item as it is parsed so that
+        large responses are never held in memory in full. Once SCHEMA_POOL_MIN_ITEMS items have been validated, the
+        rest are validated in the SCHEMA_POOL a chunk at a time. The array's own minItems, maxItems and uniqueItems are
+        checked against the number of items and a digest of each item seen so far. The IDs of the first few
+        sub-resources are saved along the way.
+        """
+        if not self.validate_CORS(method, response):
+            return False, "Incorrect CORS headers: {}".format(response.headers)
+
+        base_uri = self.file_prefix + os.path.join(self.spec_path + '/APIs/schemas/')
+        resolver = jsonschema.RefResolver(base_uri, schema)
+        validator = jsonschema.validators.validator_for(schema)(schema["items"], resolver=resolver)
+        subresources = list()
+        index = 0
+        count = 0
+        validation = None
+        chunk = []
+        # Keep a digest of the canonical form of each item seen where items must be unique, rather than the items
+        seen = set() if schema.get("uniqueItems") else None
         try:
-            s = requests.Session()
-            req = None
-            if data is not None:
-                req = requests.Request(method, url, json=data)
-            else:
-                req = requests.Request(method, url)
-            prepped = req.prepare()
-            r = s.send(prepped)
-            return True, r
-        except requests.exceptions.Timeout:
-            return False, "Connection timeout"
-        except requests.exceptions.TooManyRedirects:
-            return False, "Too many redirects"
-        except requests.exceptions.ConnectionError as e:
-            return False, str(e)
-        except requests.exceptions.RequestException as e:
-            return False, str(e)
+            for index, entry in enumerate(iter_json_array(response.iter_content(CHUNK_SIZE))):
+                count += 1
+                if seen is not None:
+                    digest = hashlib.sha1(json.dumps(entry, sort_keys=True).encode("utf-8")).digest()
+                    if digest in seen:
+                        return False, "Response schema validation error: item {} is not unique".format(index)
+                    seen.add(digest)
+                if validation is not None:
+                    chunk.append(entry)
+                    if len(chunk) == Config.SCHEMA_POOL_CHUNK_SIZE:
+                        validation.submit(index + 1 - len(chunk), chunk)
+                        chunk = []
+                else:
+                    validator.validate(entry)
+                    if index + 1 >= Config.SCHEMA_POOL_MIN_ITEMS and SCHEMA_POOL.available():
+                        validation = SCHEMA_POOL.validation(schema, base_uri, self.test_deadline())
+                if len(subresources) < MAX_STREAMED_SUBRESOURCES:
+                    res_id = self.get_subresource_id(entry)
+                    if res_id is not None:
+                        subresources.append(res_id)
+            if validation is not None:
+                if chunk:
+                    validation.submit(index + 1 - len(chunk), chunk)
+                invalid = validation.invalid_items()
+                if invalid:
+                    return False, self.invalid_items_message(invalid)
+            if count < schema.get("minItems", 0):
+                return False, "Response schema validation error: {} items, fewer than the minimum of {}".format(
+                    count, schema["minItems"])
+            if "maxItems" in schema and count > schema["maxItems"]:
+                return False, "Response schema validation error: {} items, more than the maximum of {}".format(
+                    count, schema["maxItems"])
+        except jsonschema.ValidationError:
+            return False, "Response schema validation error in item {}".format(index)
+        except ValidationTimeout:
+            return False, "Test time budget exceeded while validating the response"
+        except json.decoder.JSONDecodeError:
+            return False, "Invalid JSON received"
+        except ValueError:
+            return False, "Response schema validation error"
+        finally:
+            self.save_subresource_ids(path, subresources)
+
+        return True, ""
+
+    def test_deadline(self):
+        """Get the Deadline of the test being run by this thread, or None if there is none"""
+        return getattr(self.test_context, "deadline", None)
+
+    def request_timeout(self):
+        """Get the connect and read timeouts for a request, limited to the time left for the test being run"""
+        timeout = (Config.REQUEST_CONNECT_TIMEOUT, Config.REQUEST_READ_TIMEOUT)
+        deadline = self.test_deadline()
+        if deadline is None:
+            return timeout
+        return tuple(deadline.limit(part) for part in timeout)
+
+    def do_request(self, method, url, data=None, stream=False):
+        """
+        Perform a basic HTTP request with appropriate error handling. Idempotent requests which fail to connect or
+        time out are retried, after a random backoff, while the test has time left. Requests to a host whose circuit
+        breaker is open fail without being made, and requests wait for the host's concurrency limit to allow them.
+        """
+        retries = Config.REQUEST_RETRIES if method.upper() in IDEMPOTENT_METHODS else 0
+        host = urlsplit(url).netloc
+        label = self.latency.label(method, url)
+        error = None
+        for attempt in range(retries + 1):
+            deadline = self.test_deadline()
+            if attempt > 0:
+                backoff = random.uniform(0, Config.REQUEST_RETRY_BACKOFF * 2 ** (attempt - 1))
+                time.sleep(backoff if deadline is None else deadline.limit(backoff))
+            if deadline is not None and deadline.expired():
+                break
+            if not self.breaker.allow(host):
+                return False, "Request not made as {} has failed to respond to {} consecutive connections " \
+                              "(circuit breaker open)".format(host, self.breaker.threshold)
+            if not self.limiter.acquire(host, deadline):
+                return False, "Test time budget exceeded while waiting to make the request"
+            # The budget may have run out while waiting, and requests rejects a timeout of 0
+            timeout = self.request_timeout()
+            if min(timeout) <= 0:
+                self.limiter.cancel(host)
+                break
+            start = time.monotonic()
+            overloaded = True
+            try:
+                s = requests.Session()
+                req = None
+                if data is not None:
+                    req = requests.Request(method, url, json=data)
+                else:
+                    req = requests.Request(method, url)
+                prepped = req.prepare()
+                r = s.send(prepped, stream=stream, timeout=timeout)
+                if stream:
+                    r = self.latency.timed(r)
+                else:
+                    self.latency.record(r)
+                overloaded = r.status_code >= 500
+                self.breaker.record_success(host)
+                return True, JsonResponse(r)
+            except requests.exceptions.Timeout:
+                self.breaker.record_failure(host)
+                self.latency.record_error(method, url)
+                error = "Connection timeout"
+            except requests.exceptions.TooManyRedirects:
+                overloaded = False
+                return False, "Too many redirects"
+            except requests.exceptions.ConnectionError as e:
+                self.breaker.record_failure(host)
+                self.latency.record_error(method, url)
+                error = str(e)
+            except requests.exceptions.RequestException as e:
+                overloaded = False
+                return False, str(e)
+            finally:
+                # Streamed responses are released once their headers arrive, before their time is fully known
+                self.limiter.release(host, time.monotonic() - start, overloaded, label, measured=not stream)
+        else:
+            return False, error
+        if error is None:
+            return False, "Test time budget exceeded before the request could be made"
+        return False, "Test time budget exceeded before the request could be retried; last error: {}".format(error)
+
+    def walk(self, url, page_limit=None, max_pages=None):
+        """Get a PagedWalker which streams the JSON array at a URL, following any pagination"""
+        def get(page_url):
+            valid, response = self.do_request("GET", page_url, stream=True)
+            if not valid:
+                raise PagingError(response)
+            return response
+        return PagedWalker(url, page_limit=page_limit, get=get, max_pages=max_pages)
 
     def basics(self):
         """Perform basic API read requests (GET etc.) relevant to all API definitions"""
@@ -242,44 +536,63 @@ class GenericTest(object):
         else:
             return None
 
-        status, response = self.do_request(resource[1]['method'], url)
+        status, response = self.do_request(resource[1]['method'], url, stream=True)
         if not status:
             return test.FAIL(response)
 
-        if response.status_code != response_code:
-            return test.FAIL("Incorrect response code: {}".format(response.status_code))
+        # The response is streamed, so its connection is only released once it is read to the end or closed
+        try:
+            if response.status_code != response_code:
+                return test.FAIL("Incorrect response code: {}".format(response.status_code))
 
-        # Gather IDs of sub-resources for testing of parameterised URLs...
-        self.save_subresources(resource[0], response)
+            schema = self.get_schema(api, resource[1]["method"], resource[0], response.status_code)
 
-        schema = self.get_schema(api, resource[1]["method"], resource[0], response.status_code)
+            if schema and schema.get("type") == "array" and isinstance(schema.get("items"), dict) and \
+                    resource[1]["method"].upper() == "GET":
+                # Stream list responses, which may be very large, gathering IDs of sub-resources along the way
+                valid, message = self.check_array_response(resource[0], schema, resource[1]["method"], response)
+            else:
+                # Gather IDs of sub-resources for testing of parameterised URLs...
+                self.save_subresources(resource[0], response)
 
-        if not schema:
-            return test.MANUAL("Test suite unable to locate schema")
+                if not schema:
+                    return test.MANUAL("Test suite unable to locate schema")
 
-        valid, message = self.check_response(schema, resource[1]["method"], response)
+                valid, message = self.check_response(schema, resource[1]["method"], response)
+        finally:
+            response.close()
 
         if valid:
             return test.PASS()
         else:
             return test.FAIL(message)
 
+    def get_subresource_id(self, entry):
+        """Get the ID of a sub-resource from an entry in an array JSON response, or None if it has none"""
+        # In general, lists return fully fledged objects which each have an ID
+        if isinstance(entry, dict) and "id" in entry:
+            return entry["id"]
+        # In some cases lists contain strings which indicate the path to each resource
+        elif isinstance(entry, str) and entry.endswith("/"):
+            return entry.rstrip("/")
+        return None
+
     def save_subresources(self, path, response):
         """Get IDs contained within an array JSON response such that they can be interrogated individually"""
         subresources = list()
         try:
-            if isinstance(response.json(), list):
-                for entry in response.json():
-                    # In general, lists return fully fledged objects which each have an ID
-                    if isinstance(entry, dict) and "id" in entry:
-                        subresources.append(entry["id"])
-                    # In some cases lists contain strings which indicate the path to each resource
-                    elif isinstance(entry, str) and entry.endswith("/"):
-                        res_id = entry.rstrip("/")
+            body = response.json()
+            if isinstance(body, list):
+                for entry in body:
+                    res_id = self.get_subresource_id(entry)
+                    if res_id is not None:
                         subresources.append(res_id)
         except json.decoder.JSONDecodeError:
             pass
+        self.save_subresource_ids(path, subresources)
 
+    def save_subresource_ids(self, path, subresources):
+        """Record IDs of sub-resources found under a path"""
         if len(subresources) > 0:
             if path not in self.saved_entities:
                 self.saved_entities[path] = subresources
@@ -0,0 +1,140 @@
+# Copyright (C) 2018 British Broadcasting Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import array
+import math
+import threading
+
+import TestHelper
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# z-score for the two-sided 95% confidence interval used to decide when an estimate has settled
+CONFIDENCE_Z = 1.96
+
+
+class IntervalBuffer(object):
+    """A fixed capacity ring buffer of floats, backed by a NumPy array where available"""
+    def __init__(self, capacity):
+        self.capacity = capacity
+        if numpy is not None:
+            self.values = numpy.zeros(capacity)
+        else:
+            self.values = array.array("d", [0.0]) * capacity
+        self.count = 0
+
+    def append(self, value):
+        self.values[self.count % self.capacity] = value
+        self.count += 1
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def percentile(self, pct):
+        if len(self) == 0:
+            return None
+        if numpy is not None:
+            return float(numpy.percentile(self.values[:len(self)], pct))
+        return TestHelper.percentile(self.values[:len(self)], pct)
+
+
+class HeartbeatAnalyser(object):
+    """
+    Analyses the timing of a Node's heartbeats, given their arrival times on a monotonic clock. Mean interval, jitter
+    and drift are maintained as running sums over every heartbeat, so a soak of any length uses constant memory, while
+    percentiles are taken over the most recent 'capacity' intervals.
+    """
+    def __init__(self, expected_interval=5, capacity=4096, min_intervals=4, precision=0.1):
+        self.expected_interval = expected_interval
+        self.min_intervals = min_intervals
+        self.precision = precision
+        self.lock = threading.Lock()
+        self.intervals = IntervalBuffer(capacity)
+        self.first = None
+        self.last = None
+        self.count = 0
+        # Welford's running mean and sum of squared deviations of the intervals
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min_interval = None
+        self.max_interval = None
+        # Running sums for a least squares fit of arrival time against heartbeat number
+        self.sum_n = 0.0
+        self.sum_nn = 0.0
+        self.sum_t = 0.0
+        self.sum_nt = 0.0
+
+    def add(self, arrival):
+        """Record a heartbeat arriving at a time given by time.monotonic()"""
+        with self.lock:
+            if self.first is None:
+                self.first = arrival
+            else:
+                interval = arrival - self.last
+                self.intervals.append(interval)
+                n = self.intervals.count
+                delta = interval - self.mean
+                self.mean += delta / n
+                self.m2 += delta * (interval - self.mean)
+                self.min_interval = interval if self.min_interval is None else min(self.min_interval, interval)
+                self.max_interval = interval if self.max_interval is None else max(self.max_interval, interval)
+            elapsed = arrival - self.first
+            self.sum_n += self.count
+            self.sum_nn += self.count * self.count
+            self.sum_t += elapsed
+            self.sum_nt += self.count * elapsed
+            self.count += 1
+            self.last = arrival
+
+    def jitter(self):
+        """Standard deviation of the heartbeat intervals"""
+        n = self.intervals.count
+        return math.sqrt(self.m2 / (n - 1)) if n > 1 else None
+
+    def period(self):
+        """Heartbeat period from a least squares fit, which unlike the mean interval is not skewed by single outliers"""
+        n = self.count
+        denominator = n * self.sum_nn - self.sum_n * self.sum_n
+        if n < 2 or denominator == 0:
+            return None
+        return (n * self.sum_nt - self.sum_n * self.sum_t) / denominator
+
+    def margin(self):
+        """Half-width of the 95% confidence interval on the mean interval"""
+        jitter = self.jitter()
+        return CONFIDENCE_Z * jitter / math.sqrt(self.intervals.count) if jitter is not None else None
+
+    def confident(self):
+        """Whether enough heartbeats have been seen to estimate the mean interval to the required precision"""
+        with self.lock:
+            margin = self.margin()
+            return self.intervals.count >= self.min_intervals and margin is not None and margin <= self.precision
+
+    def summary(self):
+        with self.lock:
+            period = self.period()
+            return {"heartbeats": self.count,
+                    "intervals": self.intervals.count,
+                    "mean": self.mean if self.intervals.count else None,
+                    "jitter": self.jitter(),
+                    "margin": self.margin(),
+                    "period": period,
+                    "drift": period - self.expected_interval if period is not None else None,
+                    "min": self.min_interval,
+                    "max": self.max_interval,
+                    "p99": self.intervals.percentile(99),
+                    "duration": self.last - self.first if self.count else 0}
@@ -14,16 +14,23 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import requests
-from time import sleep
-import time
 import socket
-import netifaces
-
-from zeroconf import ServiceBrowser, ServiceInfo, Zeroconf
-from MdnsListener import MdnsListener
+import time
+import uuid
+from urllib.parse import urlsplit
+
+from zeroconf import Zeroconf
+from MdnsDiscovery import DISCOVERY, matches_url
+from Registry import ROUTER
+from RegistryPool import RegistryPool, default_address, registration_service_info
+from BackoffAnalyser import BackoffAnalyser
+from NodeLoad import NodeLoad
 from TestResult import Test
 from GenericTest import GenericTest
+from TestSelection import depends, resources, tags
+
+import Config
+import TestHelper
 
 # TODO: Worth checking PTP etc too, and reachability of Node API on all endpoints, plus endpoint matching the one under
 #       test
@@ -33,17 +40,39 @@ class IS0401Test(GenericTest):
     """
     Runs IS-04-01-Test
     """
-    def __init__(self, apis, spec_versions, test_version, spec_path, registry):
+    def __init__(self, apis, spec_versions, test_version, spec_path, registry, router=ROUTER):
         GenericTest.__init__(self, apis, spec_versions, test_version, spec_path)
         self.registry = registry
+        self.router = router
+        self.registry_port = None
+        self.run_id = uuid.uuid4().hex[:8]
         self.node_url = self.apis["node"]["url"]
         self.query_api_url = None
 
-    def execute_tests(self):
-        self.registry.enable()
-        super(IS0401Test, self).execute_tests()
-        self.registry.disable()
+    def execute_tests(self, selection=None):
+        # Each run serves its own mock registry, and claims the Node's address so that its records are kept separate
+        # from those of any other run in progress
+        node_address = self.get_node_address()
+        self.router.add(node_address, self.registry)
+        try:
+            self.registry_port = self.registry.start(router=self.router)
+            self.registry.enable()
+            super(IS0401Test, self).execute_tests(selection)
+        finally:
+            self.registry.disable()
+            self.registry.stop()
+            self.router.remove(node_address)
+
+    def get_node_address(self):
+        """Get the IP address which the Node under test is expected to make registry requests from"""
+        hostname = urlsplit(self.node_url).hostname
+        try:
+            return socket.gethostbyname(hostname)
+        except socket.error:
+            return hostname
 
+    @tags("mdns", "registration")
+    @resources(reads=["mdns"], mutates=["registry"])
     def test_01(self):
         """Node can discover network registration service via mDNS"""
 
@@ -51,30 +80,58 @@ class IS0401Test(GenericTest):
 
         self.registry.reset()
 
-        default_gw_interface = netifaces.gateways()['default'][netifaces.AF_INET][1]
-        default_ip = netifaces.ifaddresses(default_gw_interface)[netifaces.AF_INET][0]['addr']
-
-        # TODO: Set api_ver to just the version under test. Later test support for parsing CSV string
-        txt = {'api_ver': self.test_version, 'api_proto': 'http', 'pri': '0'}
-        info = ServiceInfo("_nmos-registration._tcp.local.",
-                           "NMOS Test Suite._nmos-registration._tcp.local.",
-                           socket.inet_aton(default_ip), 5000, 0, 0,
-                           txt, "nmos-test.local.")
+        info = registration_service_info("NMOS Test Suite {}".format(self.run_id), default_address(),
+                                         self.registry_port, self.test_version, 0)
 
         zeroconf = Zeroconf()
+        self.registry.timeline.advertise()
         zeroconf.register_service(info)
 
-        while (time.time() - self.registry.last_time) < 5:  # Ensure we allow 5 seconds to get at least one heartbeat
+        # Ensure we allow 5 seconds to get at least one heartbeat
+        while (time.monotonic() - self.registry.last_time) < 5:
             time.sleep(1)
 
         zeroconf.unregister_service(info)
         zeroconf.close()
 
         if len(self.registry.get_data()) > 0:
-            return test.PASS()
+            return test.PASS(self.registration_timeline())
 
         return test.FAIL("Node did not attempt to register with the advertised registry.")
 
+    def registration_timeline(self):
+        """Describe how quickly each Node registered after the mock registry was advertised, as a waterfall"""
+        timeline = self.registry.timeline
+        expected_ids = self.get_node_api_ids()
+        reports = []
+        for node_id in timeline.node_ids():
+            # The full resource set is only known for the Node under test
+            node_expected = expected_ids if expected_ids and node_id in expected_ids else None
+            summary = timeline.summary(node_id, node_expected)
+            if summary["complete"] is not None:
+                complete = "{:.0f} ms".format(summary["complete"] * 1000)
+            else:
+                complete = "not reached ({} resources missing)".format(len(summary["missing"]))
+            reports.append("Node {}: time to first registration {:.0f} ms, time to complete registration {}. {}"
+                           .format(node_id, summary["first"] * 1000, complete,
+                                   timeline.waterfall(node_id, node_expected)))
+        return " ".join(reports)
+
+    def get_node_api_ids(self):
+        """Get the IDs of every resource listed by the Node API, or None if they cannot be retrieved"""
+        ids = set()
+        for path in ["self", "devices", "sources", "flows", "senders", "receivers"]:
+            valid, r = self.do_request("GET", self.node_url + path)
+            if not valid or r.status_code != 200:
+                return None
+            try:
+                ids.update(self.get_node_resources(r.json()).keys())
+            except (ValueError, KeyError, TypeError):
+                return None
+        return ids
+
+    @tags("dns", "registration")
+    @resources()
     def test_02(self):
         """Node can discover network registration service via unicast DNS"""
 
@@ -82,6 +139,9 @@ class IS0401Test(GenericTest):
         test = Test("Node can discover network registration service via unicast DNS")
         return test.MANUAL()
 
+    @depends("test_01")
+    @tags("registration")
+    @resources(reads=["registry"])
     def test_03(self):
         """Registration API interactions use the correct Content-Type"""
 
@@ -133,36 +193,38 @@ class IS0401Test(GenericTest):
             url = "{}self".format(self.node_url)
         else:
             url = "{}{}s".format(self.node_url, res_type)
-        try:
-            # Get data from node itself
-            r = requests.get(url)
-            if r.status_code == 200:
-                try:
-                    reg_resources = self.get_registry_resources(res_type)
-                    node_resources = self.get_node_resources(r.json())
-
-                    if len(reg_resources) != len(node_resources):
-                        return test.FAIL("One or more {} registrations were not found in either "
-                                         "the Node or the registry.".format(res_type.title()))
-
-                    if len(node_resources) == 0:
-                        return test.NA("No {} resources were found on the Node.".format(res_type.title()))
-
-                    for resource in node_resources:
-                        if resource not in reg_resources:
-                            test.FAIL("{} {} was not found in the registry.".format(res_type.title(), resource))
-                        elif reg_resources[resource] != node_resources[resource]:
-                            return test.FAIL("Node API JSON does not match data in registry for "
-                                             "{} {}.".format(res_type.title(), resource))
-
-                    return test.PASS()
-                except ValueError:
-                    return test.FAIL("Invalid JSON received!")
-            else:
-                return test.FAIL("Could not reach Node!")
-        except requests.ConnectionError:
-            return test.FAIL("Connection error for {}".format(url))
+        # Get data from node itself
+        valid, r = self.do_request("GET", url)
+        if not valid:
+            return test.FAIL("Connection error for {}: {}".format(url, r))
+        if r.status_code == 200:
+            try:
+                reg_resources = self.get_registry_resources(res_type)
+                node_resources = self.get_node_resources(r.json())
+
+                if len(reg_resources) != len(node_resources):
+                    return test.FAIL("One or more {} registrations were not found in either "
+                                     "the Node or the registry.".format(res_type.title()))
+
+                if len(node_resources) == 0:
+                    return test.NA("No {} resources were found on the Node.".format(res_type.title()))
+
+                for resource in node_resources:
+                    if resource not in reg_resources:
+                        test.FAIL("{} {} was not found in the registry.".format(res_type.title(), resource))
+                    elif reg_resources[resource] != node_resources[resource]:
+                        return test.FAIL("Node API JSON does not match data in registry for "
+                                         "{} {}.".format(res_type.title(), resource))
+
+                return test.PASS()
+            except ValueError:
+                return test.FAIL("Invalid JSON received!")
+        else:
+            return test.FAIL("Could not reach Node!")
 
+    @depends("test_01")
+    @tags("registration")
+    @resources(reads=["registry"])
     def test_04(self):
         """Node can register a valid Node resource with the network registration service,
         matching its Node API self resource"""
@@ -171,49 +233,126 @@ class IS0401Test(GenericTest):
                     "matching its Node API self resource")
         return self.check_matching_resource(test, "node")
 
+    @depends("test_01")
+    @tags("heartbeat")
+    @resources(reads=["registry"])
     def test_05(self):
         """Node maintains itself in the registry via periodic calls to the health resource"""
 
         test = Test("Node maintains itself in the registry via periodic calls to the health resource")
 
+        # Observe heartbeats until the mean interval is known precisely enough, or the observation window ends
+        analyser = self.registry.heartbeat_analyser
+        deadline = (analyser.first or time.monotonic()) + Config.HEARTBEAT_WINDOW
+        while not analyser.confident() and time.monotonic() < deadline:
+            time.sleep(0.5)
+
         if len(self.registry.get_heartbeats()) < 2:
             return test.FAIL("Not enough heartbeats were made in the time period.")
 
-        last_hb = None
-        for heartbeat in self.registry.get_heartbeats():
-            if last_hb:
-                # Check frequency of heartbeats matches the defaults
-                time_diff = heartbeat[0] - last_hb[0]
-                if time_diff > 5.5:
-                    return test.FAIL("Heartbeats are not frequent enough.")
-                elif time_diff < 4.5:
-                    return test.FAIL("Heartbeats are too frequent.")
-            else:
-                # For first heartbeat, check against Node registration
-                initial_node = self.registry.get_data()[0]
-                if (heartbeat[0] - initial_node[0]) > 5.5:
-                    return test.FAIL("First heartbeat occurred too long after initial Node registration.")
+        initial_node = self.registry.get_data()[0]
+        first_hb = self.registry.get_heartbeats()[0]
+        if analyser.count == len(self.registry.get_heartbeats()):
+            # For first heartbeat, check against Node registration, unless it has since been discarded
+            if (first_hb[0] - initial_node[0]) > 5.5:
+                return test.FAIL("First heartbeat occurred too long after initial Node registration.")
 
-                # Ensure the Node ID for heartbeats matches the registrations
-                if heartbeat[1]["node_id"] != initial_node[1]["payload"]["data"]["id"]:
-                    return test.FAIL("Heartbeats matched a different Node ID to the initial registration.")
+        for heartbeat in self.registry.get_heartbeats():
+            # Ensure the Node ID for heartbeats matches the registrations
+            if heartbeat[1]["node_id"] != initial_node[1]["payload"]["data"]["id"]:
+                return test.FAIL("Heartbeats matched a different Node ID to the initial registration.")
 
             # Ensure the heartbeat request body is empty
             if heartbeat[1]["payload"] is not None:
                 return test.FAIL("Heartbeat POST contained a payload body.")
 
-            last_hb = heartbeat
-
-        return test.PASS()
-
+        # Check frequency of heartbeats matches the defaults
+        stats = analyser.summary()
+        detail = "{} intervals over {:.1f} s: mean {:.3f} s (+/- {:.3f} s), jitter {:.3f} s, drift {:+.3f} s per " \
+                 "heartbeat, p99 {:.3f} s".format(stats["intervals"], stats["duration"], stats["mean"],
+                                                  stats["margin"] or 0, stats["jitter"] or 0, stats["drift"] or 0,
+                                                  stats["p99"])
+        if stats["mean"] > 5.5 or stats["p99"] > 5.5:
+            return test.FAIL("Heartbeats are not frequent enough. {}".format(detail))
+        elif stats["mean"] < 4.5:
+            return test.FAIL("Heartbeats are too frequent. {}".format(detail))
+
+        return test.PASS(detail)
+
+    @depends("test_01")
+    @tags("registration", "errors")
+    @resources(mutates=["registry"])
     def test_06(self):
         """Node correctly handles HTTP 4XX and 5XX codes from the registry,
         re-registering or trying alternative Registration APIs as required"""
 
         test = Test("Node correctly handles HTTP 4XX and 5XX codes from the registry, "
                     "re-registering or trying alternative Registration APIs as required")
-        return test.MANUAL()
 
+        if len(self.registry.get_data()) == 0:
+            return test.FAIL("No registrations found")
+
+        # A 404 in response to a heartbeat obliges the Node to re-register, which then fails for the fault period
+        faults = self.registry.faults
+        fault_start = time.monotonic()
+        faults.inject("heartbeat", status=404, count=1)
+        faults.inject("resource", status=Config.FAULT_STATUS, latency=Config.FAULT_LATENCY_MS / 1000.0,
+                      drop=Config.FAULT_DROP_CONNECTIONS, duration=Config.FAULT_DURATION)
+        time.sleep(Config.FAULT_DURATION)
+        faults.clear()
+        fault_end = time.monotonic()
+
+        expected_ids = self.get_node_api_ids()
+        recovery = None
+        while recovery is None and time.monotonic() < fault_end + Config.FAULT_RECOVERY_TIMEOUT:
+            time.sleep(0.5)
+            recovery = self.get_recovery_time(expected_ids, fault_end)
+
+        rejected_heartbeats = [entry[0] for entry in faults.requests("heartbeat", since=fault_start)
+                               if entry[2] == 404]
+        if not rejected_heartbeats:
+            return test.FAIL("Node did not heartbeat during the {} s fault period.".format(Config.FAULT_DURATION))
+        retries = [entry[0] for entry in faults.requests("resource", since=rejected_heartbeats[0], until=fault_end)]
+        if not retries:
+            return test.FAIL("Node did not attempt to re-register after a 404 response to a heartbeat.")
+
+        backoff = BackoffAnalyser(retries).summary()
+        detail = "{} registration attempts in the {} s fault period".format(backoff["attempts"], Config.FAULT_DURATION)
+        if backoff["median"] is not None:
+            detail += ", retry interval min {:.2f} s, median {:.2f} s, max {:.2f} s, backoff {}".format(
+                backoff["min"], backoff["median"], backoff["max"], backoff["shape"] or "undetermined")
+        # Judge the overall retry rate, so that an exponential backoff from a short initial delay is not penalised
+        window = fault_end - rejected_heartbeats[0]
+        if backoff["attempts"] > 1 and window / backoff["attempts"] < Config.FAULT_MIN_RETRY_INTERVAL:
+            return test.FAIL("Node retried failed registrations too frequently: {}".format(detail))
+        if recovery is None:
+            return test.FAIL("Node did not complete re-registration within {} s of the registry recovering: {}"
+                             .format(Config.FAULT_RECOVERY_TIMEOUT, detail))
+
+        return test.PASS("{}; full registration recovered {:.2f} s after the fault cleared".format(detail, recovery))
+
+    def get_recovery_time(self, expected_ids, since, registry=None):
+        """
+        Get the time after 'since' at which the Node had registered every resource listed by its Node API again, or
+        just its Node resource if these are unknown. Returns None if re-registration is not yet complete. The mock
+        registry under test is checked unless another is given.
+        """
+        registered = {}
+        for arrival, resource in (registry or self.registry).get_data():
+            if arrival >= since:
+                try:
+                    registered.setdefault(resource["payload"]["data"]["id"], arrival)
+                    if resource["payload"]["type"] == "node" and expected_ids is None:
+                        return arrival - since
+                except (KeyError, TypeError):
+                    pass
+        if expected_ids and all(res_id in registered for res_id in expected_ids):
+            return max(registered[res_id] for res_id in expected_ids) - since
+        return None
+
+    @depends("test_01")
+    @tags("registration")
+    @resources(reads=["registry"])
     def test_07(self):
         """Node can register a valid Device resource with the network registration service, matching its
         Node API Device resource"""
@@ -222,6 +361,9 @@ class IS0401Test(GenericTest):
                     "matching its Node API Device resource")
         return self.check_matching_resource(test, "device")
 
+    @depends("test_01")
+    @tags("registration")
+    @resources(reads=["registry"])
     def test_08(self):
         """Node can register a valid Source resource with the network
         registration service, matching its Node API Source resource"""
@@ -230,6 +372,9 @@ class IS0401Test(GenericTest):
                     "matching its Node API Source resource")
         return self.check_matching_resource(test, "source")
 
+    @depends("test_01")
+    @tags("registration")
+    @resources(reads=["registry"])
     def test_09(self):
         """Node can register a valid Flow resource with the network
         registration service, matching its Node API Flow resource"""
@@ -238,6 +383,9 @@ class IS0401Test(GenericTest):
                     "matching its Node API Flow resource")
         return self.check_matching_resource(test, "flow")
 
+    @depends("test_01")
+    @tags("registration")
+    @resources(reads=["registry"])
     def test_10(self):
         """Node can register a valid Sender resource with the network
         registration service, matching its Node API Sender resource"""
@@ -246,6 +394,9 @@ class IS0401Test(GenericTest):
                     "matching its Node API Sender resource")
         return self.check_matching_resource(test, "sender")
 
+    @depends("test_01")
+    @tags("registration")
+    @resources(reads=["registry"])
     def test_11(self):
         """Node can register a valid Receiver resource with the network
         registration service, matching its Node API Receiver resource"""
@@ -254,28 +405,28 @@ class IS0401Test(GenericTest):
                     "matching its Node API Receiver resource")
         return self.check_matching_resource(test, "receiver")
 
+    @depends("test_01")
+    @tags("mdns")
+    @resources(reads=["mdns", "registry"])
     def test_12(self):
         """Node advertises a Node type mDNS announcement with no ver_* TXT records
         in the presence of a Registration API"""
         test = Test("Node advertises a Node type mDNS announcement with no ver_* TXT records in the presence "
                     "of a Registration API")
-        zeroconf = Zeroconf()
-        listener = MdnsListener()
-        browser = ServiceBrowser(zeroconf, "_nmos-node._tcp.local.", listener)
-        sleep(5)
-        zeroconf.close()
-        node_list = listener.get_service_list()
-        for node in node_list:
-            address = socket.inet_ntoa(node.address)
-            port = node.port
-            if address in self.node_url and ":{}".format(port) in self.node_url:
-                properties_raw = node.properties
-                for prop in properties_raw:
-                    if "ver_" in prop.decode('ascii'):
-                        return test.FAIL("Found 'ver_'-txt record while node is registered.")
-                return test.PASS()
+        # The Node may update its TXT records once registered, so wait for an announcement without ver_* records
+        node_match = matches_url(self.node_url)
+
+        def registered_match(info):
+            return node_match(info) and not any(prop.decode('ascii').startswith("ver_") for prop in info.properties)
+
+        if DISCOVERY.wait_for("_nmos-node._tcp.local.", registered_match, Config.DNS_SD_TIMEOUT) is not None:
+            return test.PASS()
+        elif DISCOVERY.wait_for("_nmos-node._tcp.local.", node_match, 0) is not None:
+            return test.FAIL("Found 'ver_'-txt record while node is registered.")
         return test.FAIL("No matching mdns announcement found for node.")
 
+    @tags("connection")
+    @resources()
     def test_13(self):
         """PUTing to a Receiver target resource with a Sender resource payload is accepted
         and connects the Receiver to a stream"""
@@ -284,6 +435,8 @@ class IS0401Test(GenericTest):
                     "is accepted and connects the Receiver to a stream")
         return test.MANUAL()
 
+    @tags("connection")
+    @resources()
     def test_14(self):
         """Receiver resource (in Node API and registry) is correctly updated to match the subscribed
         Sender ID upon subscription"""
@@ -292,6 +445,8 @@ class IS0401Test(GenericTest):
                     "the subscribed Sender ID upon subscription")
         return test.MANUAL()
 
+    @tags("connection")
+    @resources()
     def test_15(self):
         """PUTing to a Receiver target resource with an empty JSON object payload is accepted and
         disconnects the Receiver from a stream"""
@@ -300,8 +455,156 @@ class IS0401Test(GenericTest):
                     "is accepted and disconnects the Receiver from a stream")
         return test.MANUAL()
 
+    @depends("test_01")
+    @tags("mdns", "failover")
+    @resources(reads=["mdns"], mutates=["registry"])
     def test_16(self):
         """Node correctly selects a Registration API based on advertised priorities"""
 
         test = Test("Node correctly selects a Registration API based on advertised priorities")
-        return test.MANUAL()
+
+        if len(Config.FAILOVER_PRIORITIES) < 2:
+            return test.MANUAL("At least two registry priorities must be configured to test failover")
+
+        expected_ids = self.get_node_api_ids()
+        pool = RegistryPool(Config.FAILOVER_PRIORITIES, self.test_version, self.run_id)
+        try:
+            pool.start()
+            for info in pool.services:
+                if DISCOVERY.wait_for(info.type, lambda found: found.name == info.name, Config.DNS_SD_TIMEOUT) is None:
+                    return test.FAIL("Mock registry advertisement {} was not seen via mDNS within {} s."
+                                     .format(info.name, Config.DNS_SD_TIMEOUT))
+
+            # Make the registry the Node is using fail, so that it has to choose between the advertised alternatives
+            start = time.monotonic()
+            self.inject_failover_fault(self.registry)
+            selected = self.wait_for_failover(pool, expected_ids, start)
+            if selected is None:
+                return test.FAIL("Node did not register with any of the advertised registries within {} s of its "
+                                 "registry failing.".format(Config.FAILOVER_TIMEOUT))
+            pri, first, complete = selected
+            detail = "Node selected the pri {} registry after {:.2f} s, complete registration after {:.2f} s" \
+                .format(pri, first, complete)
+            if pri != pool.priorities[0]:
+                return test.FAIL("Node did not select the highest priority registry (pri {}): {}"
+                                 .format(pool.priorities[0], detail))
+
+            # Fail the active registry and time how long the Node takes to move to the next priority
+            start = time.monotonic()
+            self.inject_failover_fault(pool.registries[pri])
+            failover = self.wait_for_failover(pool, expected_ids, start, exclude=[pri])
+            if failover is None:
+                return test.FAIL("Node did not fail over to another registry within {} s: {}"
+                                 .format(Config.FAILOVER_TIMEOUT, detail))
+            next_pri, first, complete = failover
+            detail += "; failed over to the pri {} registry after {:.2f} s, complete registration after {:.2f} s" \
+                .format(next_pri, first, complete)
+            if next_pri != pool.priorities[1]:
+                return test.FAIL("Node did not fail over to the next highest priority registry (pri {}): {}"
+                                 .format(pool.priorities[1], detail))
+            return test.PASS(detail)
+        finally:
+            pool.stop()
+            self.registry.faults.clear()
+
+    def inject_failover_fault(self, registry):
+        """Make every request to a mock registry fail until the faults are cleared"""
+        for endpoint in ["heartbeat", "resource"]:
+            registry.faults.inject(endpoint, status=Config.FAULT_STATUS or 500, drop=Config.FAULT_DROP_CONNECTIONS)
+
+    def wait_for_failover(self, pool, expected_ids, since, exclude=None):
+        """
+        Wait for the Node to register with one of a pool of registries after 'since'. Returns the priority of the
+        registry chosen with the times to its first and complete registration, or None on timeout.
+        """
+        deadline = since + Config.FAILOVER_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(0.5)
+            first = pool.first_registration(since, exclude)
+            if first is None:
+                continue
+            arrival, pri = first
+            complete = self.get_recovery_time(expected_ids, since, pool.registries[pri])
+            if complete is not None:
+                return pri, arrival - since, complete
+        return None
+
+    def mode_load(self):
+        """Poll every Node API read endpoint from many concurrent clients, as several controllers would"""
+
+        test = Test("Node API sustains {} concurrent clients for {} s".format(Config.NODE_LOAD_CONCURRENCY,
+                                                                              Config.NODE_LOAD_DURATION))
+
+        targets, schemas = self.load_targets()
+        if not targets:
+            return [test.FAIL("None of the Node API read endpoints responded before the load was applied")]
+
+        def check(name, response):
+            if schemas[name] is None:
+                return True, ""
+            return self.check_response(schemas[name], "GET", response)
+
+        load = NodeLoad(targets, Config.NODE_LOAD_CONCURRENCY, Config.NODE_LOAD_DURATION,
+                        samples=Config.NODE_LOAD_SAMPLES, check=check, timeout=self.request_timeout())
+        report = load.run()
+
+        detail = "{} requests at {:.1f} requests/s; {}".format(
+            report["requests"], report["throughput"], TestHelper.summarise_latency(report["latency"]))
+        if report["requests"] == 0:
+            results = [test.FAIL("No requests were completed")]
+        elif report["errors"] > 0:
+            results = [test.FAIL("{} errors; {}".format(report["errors"], detail))]
+        else:
+            results = [test.PASS(detail)]
+
+        for endpoint in report["endpoints"]:
+            results.append(self.load_result(Test("Node API under load: {}".format(endpoint["name"])), endpoint))
+        return results
+
+    def load_targets(self):
+        """
+        Get the URL of every Node API GET endpoint, filling in the parameterised ones with the first ID listed by
+        their collection, along with the schema of each
+        """
+        api = self.apis["node"]
+        targets = []
+        schemas = {}
+        for resource, method_def in api["spec"].get_reads():
+            if method_def["method"] != "get" or 200 not in method_def["responses"] or resource in self.omit_paths:
+                continue
+            url_param = resource
+            if method_def["params"]:
+                path = resource.split("{")[0].rstrip("/")
+                if len(method_def["params"]) != 1 or path not in self.saved_entities:
+                    continue
+                url_param = resource.format(**{method_def["params"][0].name: self.saved_entities[path][0]})
+            url = "{}{}".format(api["url"].rstrip("/"), url_param)
+
+            # Collections are listed before their members, so their IDs are saved in time to fill in members' URLs
+            valid, response = self.do_request("GET", url)
+            if not valid or response.status_code != 200:
+                continue
+            if not method_def["params"]:
+                self.save_subresources(resource, response)
+            name = "GET /x-nmos/node/{}{}".format(self.test_version, url_param.rstrip("/"))
+            targets.append((name, url))
+            schemas[name] = self.get_schema("node", "GET", resource, 200)
+        return targets, schemas
+
+    def load_result(self, test, endpoint):
+        """Convert a NodeLoad report for one endpoint into a test result"""
+        detail = "{} requests at {:.1f} requests/s; {}; {} responses checked".format(
+            endpoint["requests"], endpoint["throughput"], TestHelper.summarise_latency(endpoint["latency"]),
+            endpoint["checked"])
+        if endpoint["requests"] == 0:
+            return test.FAIL("No requests were completed")
+        elif endpoint["errors"] > 0:
+            return test.FAIL("{} errors, the first after {:.1f} s (last: {}); {}".format(
+                endpoint["errors"], endpoint["first_error"], endpoint["error"], detail))
+        elif endpoint["invalid"] > 0:
+            return test.FAIL("{} of {} checked responses were invalid ({}); {}".format(
+                endpoint["invalid"], endpoint["checked"], endpoint["invalid_message"], detail))
+        elif endpoint["changed"] > 0:
+            return test.FAIL("{} of {} checked responses differed from the response before the load ({}); {}"
+                             .format(endpoint["changed"], endpoint["checked"], endpoint["change"], detail))
+        return test.PASS(detail)
@@ -12,15 +12,21 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from time import sleep
-import socket
 import uuid
 import json
 
-from zeroconf import ServiceBrowser, Zeroconf
-from MdnsListener import MdnsListener
+from MdnsDiscovery import DISCOVERY, matches_url
+from NodeFleet import NodeFleet
+from CapacitySearch import CapacitySearch
+from QueryBenchmark import QueryBenchmark
+from SubscriptionBenchmark import SubscriptionBenchmark
+from PagedWalker import PagingError
 from TestResult import Test
 from GenericTest import GenericTest
+from TestSelection import depends, resources, tags
+
+import Config
+import TestHelper
 
 
 class IS0402Test(GenericTest):
@@ -36,102 +42,86 @@ class IS0402Test(GenericTest):
         self.reg_url = self.apis["registration"]["url"]
         self.query_url = self.apis["query"]["url"]
 
-    def execute_tests(self):
-        self.init_zeroconf()
-        super(IS0402Test, self).execute_tests()
-        self.close_zeroconf()
-
-    def init_zeroconf(self):
-        self.zc = Zeroconf()
-        self.zc_listener = MdnsListener()
-
-    def close_zeroconf(self):
-        if self.zc:
-            self.zc.close()
-            self.zc = None
-
+    @tags("mdns", "registration")
+    @resources(reads=["mdns"])
     def test_01(self):
         """Registration API advertises correctly via mDNS"""
 
         test = Test("Registration API advertises correctly via mDNS")
 
-        browser = ServiceBrowser(self.zc, "_nmos-registration._tcp.local.", self.zc_listener)
-        sleep(2)
-        serv_list = self.zc_listener.get_service_list()
-        for api in serv_list:
-            address = socket.inet_ntoa(api.address)
-            port = api.port
-            if address in self.reg_url and ":{}".format(port) in self.reg_url:
-                properties = self.convert_bytes(api.properties)
-                if "pri" not in properties:
-                    return test.FAIL("No 'pri' TXT record found in Registration API advertisement.")
-                try:
-                    priority = int(properties["pri"])
-                    if priority < 0:
-                        return test.FAIL("Priority ('pri') TXT record must be greater than zero.")
-                    elif priority >= 100:
-                        return test.FAIL("Priority ('pri') TXT record must be less than 100 for a production instance.")
-                except Exception as e:
-                    return test.FAIL("Priority ('pri') TXT record is not an integer.")
-
-                # Other TXT records only came in for IS-04 v1.1+
-                if self.major_version > 1 or (self.major_version == 1 and self.minor_version > 0):
-                    if "api_ver" not in properties:
-                        return test.FAIL("No 'api_ver' TXT record found in Registration API advertisement.")
-                    elif "v{}.{}".format(self.major_version,
-                                         self.minor_version) not in properties["api_ver"].split(","):
-                        return test.FAIL("Registry does not claim to support version under test.")
-
-                    if "api_proto" not in properties:
-                        return test.FAIL("No 'api_proto' TXT record found in Registration API advertisement.")
-                    elif properties["api_proto"] != "http":
-                        return test.FAIL("API protocol is not advertised as 'http'. "
-                                         "This test suite does not currently support 'https'.")
+        api = DISCOVERY.wait_for("_nmos-registration._tcp.local.", matches_url(self.reg_url), Config.DNS_SD_TIMEOUT)
+        if api is None:
+            return test.FAIL("No matching mDNS announcement found for Registration API.")
 
-                return test.PASS()
-        return test.FAIL("No matching mDNS announcement found for Registration API.")
+        properties = self.convert_bytes(api.properties)
+        if "pri" not in properties:
+            return test.FAIL("No 'pri' TXT record found in Registration API advertisement.")
+        try:
+            priority = int(properties["pri"])
+            if priority < 0:
+                return test.FAIL("Priority ('pri') TXT record must be greater than zero.")
+            elif priority >= 100:
+                return test.FAIL("Priority ('pri') TXT record must be less than 100 for a production instance.")
+        except Exception as e:
+            return test.FAIL("Priority ('pri') TXT record is not an integer.")
+
+        # Other TXT records only came in for IS-04 v1.1+
+        if self.major_version > 1 or (self.major_version == 1 and self.minor_version > 0):
+            if "api_ver" not in properties:
+                return test.FAIL("No 'api_ver' TXT record found in Registration API advertisement.")
+            elif "v{}.{}".format(self.major_version,
+                                 self.minor_version) not in properties["api_ver"].split(","):
+                return test.FAIL("Registry does not claim to support version under test.")
+
+            if "api_proto" not in properties:
+                return test.FAIL("No 'api_proto' TXT record found in Registration API advertisement.")
+            elif properties["api_proto"] != "http":
+                return test.FAIL("API protocol is not advertised as 'http'. "
+                                 "This test suite does not currently support 'https'.")
 
+        return test.PASS()
+
+    @tags("mdns", "query")
+    @resources(reads=["mdns"])
     def test_02(self):
         """Query API advertises correctly via mDNS"""
 
         test = Test("Query API advertises correctly via mDNS")
 
-        browser = ServiceBrowser(self.zc, "_nmos-query._tcp.local.", self.zc_listener)
-        sleep(2)
-        serv_list = self.zc_listener.get_service_list()
-        for api in serv_list:
-            address = socket.inet_ntoa(api.address)
-            port = api.port
-            if address in self.query_url and ":{}".format(port) in self.query_url:
-                properties = self.convert_bytes(api.properties)
-                if "pri" not in properties:
-                    return test.FAIL("No 'pri' TXT record found in Query API advertisement.")
-                try:
-                    priority = int(properties["pri"])
-                    if priority < 0:
-                        return test.FAIL("Priority ('pri') TXT record must be greater than zero.")
-                    elif priority >= 100:
-                        return test.FAIL("Priority ('pri') TXT record must be less than 100 for a production instance.")
-                except Exception as e:
-                    return test.FAIL("Priority ('pri') TXT record is not an integer.")
-
-                # Other TXT records only came in for IS-04 v1.1+
-                if self.major_version > 1 or (self.major_version == 1 and self.minor_version > 0):
-                    if "api_ver" not in properties:
-                        return test.FAIL("No 'api_ver' TXT record found in Query API advertisement.")
-                    elif "v{}.{}".format(self.major_version,
-                                         self.minor_version) not in properties["api_ver"].split(","):
-                        return test.FAIL("Registry does not claim to support version under test.")
-
-                    if "api_proto" not in properties:
-                        return test.FAIL("No 'api_proto' TXT record found in Query API advertisement.")
-                    elif properties["api_proto"] != "http":
-                        return test.FAIL("API protocol is not advertised as 'http'. "
-                                         "This test suite does not currently support 'https'.")
+        api = DISCOVERY.wait_for("_nmos-query._tcp.local.", matches_url(self.query_url), Config.DNS_SD_TIMEOUT)
+        if api is None:
+            return test.FAIL("No matching mDNS announcement found for Query API.")
 
-                return test.PASS()
-        return test.FAIL("No matching mDNS announcement found for Query API.")
+        properties = self.convert_bytes(api.properties)
+        if "pri" not in properties:
+            return test.FAIL("No 'pri' TXT record found in Query API advertisement.")
+        try:
+            priority = int(properties["pri"])
+            if priority < 0:
+                return test.FAIL("Priority ('pri') TXT record must be greater than zero.")
+            elif priority >= 100:
+                return test.FAIL("Priority ('pri') TXT record must be less than 100 for a production instance.")
+        except Exception as e:
+            return test.FAIL("Priority ('pri') TXT record is not an integer.")
+
+        # Other TXT records only came in for IS-04 v1.1+
+        if self.major_version > 1 or (self.major_version == 1 and self.minor_version > 0):
+            if "api_ver" not in properties:
+                return test.FAIL("No 'api_ver' TXT record found in Query API advertisement.")
+            elif "v{}.{}".format(self.major_version,
+                                 self.minor_version) not in properties["api_ver"].split(","):
+                return test.FAIL("Registry does not claim to support version under test.")
+
+            if "api_proto" not in properties:
+                return test.FAIL("No 'api_proto' TXT record found in Query API advertisement.")
+            elif properties["api_proto"] != "http":
+                return test.FAIL("API protocol is not advertised as 'http'. "
+                                 "This test suite does not currently support 'https'.")
 
+        return test.PASS()
+
+    @tags("registration")
+    @resources(mutates=["registry"])
     def test_03(self):
         """Registration API accepts and stores a valid Node resource"""
 
@@ -154,6 +144,8 @@ class IS0402Test(GenericTest):
 
         return test.FAIL("An unknown error occurred")
 
+    @tags("registration", "invalid")
+    @resources(reads=["registry"])
     def test_04(self):
         """Registration API rejects an invalid Node resource with a 400 HTTP code"""
 
@@ -162,6 +154,9 @@ class IS0402Test(GenericTest):
         bad_json = {"notanode": True}
         return self.do_400_check(test, "node", bad_json)
 
+    @depends("test_03")
+    @tags("registration")
+    @resources(mutates=["registry"])
     def test_05(self):
         """Registration API accepts and stores a valid Device resource"""
 
@@ -184,6 +179,8 @@ class IS0402Test(GenericTest):
 
         return test.FAIL("An unknown error occurred")
 
+    @tags("registration", "invalid")
+    @resources(reads=["registry"])
     def test_06(self):
         """Registration API rejects an invalid Device resource with a 400 HTTP code"""
 
@@ -192,6 +189,9 @@ class IS0402Test(GenericTest):
         bad_json = {"notadevice": True}
         return self.do_400_check(test, "device", bad_json)
 
+    @depends("test_05")
+    @tags("registration")
+    @resources(mutates=["registry"])
     def test_07(self):
         """Registration API accepts and stores a valid Source resource"""
 
@@ -214,6 +214,8 @@ class IS0402Test(GenericTest):
 
         return test.FAIL("An unknown error occurred")
 
+    @tags("registration", "invalid")
+    @resources(reads=["registry"])
     def test_08(self):
         """Registration API rejects an invalid Source resource with a 400 HTTP code"""
 
@@ -222,6 +224,9 @@ class IS0402Test(GenericTest):
         bad_json = {"notasource": True}
         return self.do_400_check(test, "source", bad_json)
 
+    @depends("test_07")
+    @tags("registration")
+    @resources(mutates=["registry"])
     def test_09(self):
         """Registration API accepts and stores a valid Flow resource"""
 
@@ -244,6 +249,8 @@ class IS0402Test(GenericTest):
 
         return test.FAIL("An unknown error occurred")
 
+    @tags("registration", "invalid")
+    @resources(reads=["registry"])
     def test_10(self):
         """Registration API rejects an invalid Flow resource with a 400 HTTP code"""
 
@@ -252,6 +259,9 @@ class IS0402Test(GenericTest):
         bad_json = {"notaflow": True}
         return self.do_400_check(test, "flow", bad_json)
 
+    @depends("test_05")
+    @tags("registration")
+    @resources(mutates=["registry"])
     def test_11(self):
         """Registration API accepts and stores a valid Sender resource"""
 
@@ -274,6 +284,8 @@ class IS0402Test(GenericTest):
 
         return test.FAIL("An unknown error occurred")
 
+    @tags("registration", "invalid")
+    @resources(reads=["registry"])
     def test_12(self):
         """Registration API rejects an invalid Sender resource with a 400 HTTP code"""
 
@@ -282,6 +294,9 @@ class IS0402Test(GenericTest):
         bad_json = {"notasender": True}
         return self.do_400_check(test, "sender", bad_json)
 
+    @depends("test_05")
+    @tags("registration")
+    @resources(mutates=["registry"])
     def test_13(self):
         """Registration API accepts and stores a valid Receiver resource"""
 
@@ -304,6 +319,8 @@ class IS0402Test(GenericTest):
 
         return test.FAIL("An unknown error occurred")
 
+    @tags("registration", "invalid")
+    @resources(reads=["registry"])
     def test_14(self):
         """Registration API rejects an invalid Receiver resource with a 400 HTTP code"""
 
@@ -312,6 +329,8 @@ class IS0402Test(GenericTest):
         bad_json = {"notareceiver": True}
         return self.do_400_check(test, "receiver", bad_json)
 
+    @tags("query")
+    @resources(reads=["registry"])
     def test_15(self):
         """Query API implements pagination"""
 
@@ -322,6 +341,8 @@ class IS0402Test(GenericTest):
 
         return test.MANUAL()
 
+    @tags("query")
+    @resources(reads=["registry"])
     def test_16(self):
         """Query API implements downgrade queries"""
 
@@ -332,30 +353,28 @@ class IS0402Test(GenericTest):
 
         return test.MANUAL()
 
+    @tags("query")
+    @resources(reads=["registry"])
     def test_17(self):
         """Query API implements basic query parameters"""
 
         test = Test("Query API implements basic query parameters")
 
         try:
-            valid, r = self.do_request("GET", self.query_url + "nodes")
-            if not valid:
-                return test.FAIL("Query API failed to respond to query")
-            elif len(r.json()) == 0:
+            if not self.has_results(self.query_url + "nodes"):
                 return test.NA("No Nodes found in registry. Test cannot proceed.")
-        except json.decoder.JSONDecodeError:
-            return test.FAIL("Non-JSON response returned")
 
-        random_label = uuid.uuid4()
-        query_string = "?label=" + str(random_label)
-        valid, r = self.do_request("GET", self.query_url + "nodes" + query_string)
-        if not valid:
-            return test.FAIL("Query API failed to respond to query")
-        elif len(r.json()) > 0:
-            return test.FAIL("Query API returned more records than expected for query: {}".format(query_string))
+            random_label = uuid.uuid4()
+            query_string = "?label=" + str(random_label)
+            if self.has_results(self.query_url + "nodes" + query_string):
+                return test.FAIL("Query API returned more records than expected for query: {}".format(query_string))
+        except PagingError as e:
+            return test.FAIL("Query API failed to respond to query: {}".format(e))
 
         return test.PASS()
 
+    @tags("query")
+    @resources(reads=["registry"])
     def test_18(self):
         """Query API implements RQL"""
 
@@ -365,26 +384,22 @@ class IS0402Test(GenericTest):
             return test.NA("This test does not apply to v1.0")
 
         try:
-            valid, r = self.do_request("GET", self.query_url + "nodes")
-            if not valid:
-                return test.FAIL("Query API failed to respond to query")
-            elif len(r.json()) == 0:
+            if not self.has_results(self.query_url + "nodes"):
                 return test.NA("No Nodes found in registry. Test cannot proceed.")
-        except json.decoder.JSONDecodeError:
-            return test.FAIL("Non-JSON response returned")
 
-        random_label = uuid.uuid4()
-        query_string = "?query.rql=eq(label," + str(random_label) + ")"
-        valid, r = self.do_request("GET", self.query_url + "nodes" + query_string)
-        if not valid:
-            return test.FAIL("Query API failed to respond to query")
-        elif r.status_code == 501:
-            return test.NA("Query API signalled that it does not support RQL queries")
-        elif len(r.json()) > 0:
-            return test.FAIL("Query API returned more records than expected for query: {}".format(query_string))
+            random_label = uuid.uuid4()
+            query_string = "?query.rql=eq(label," + str(random_label) + ")"
+            if self.has_results(self.query_url + "nodes" + query_string):
+                return test.FAIL("Query API returned more records than expected for query: {}".format(query_string))
+        except PagingError as e:
+            if e.status_code == 501:
+                return test.NA("Query API signalled that it does not support RQL queries")
+            return test.FAIL("Query API failed to respond to query: {}".format(e))
 
         return test.PASS()
 
+    @tags("query")
+    @resources(reads=["registry"])
     def test_19(self):
         """Query API implements ancestry queries"""
 
@@ -394,26 +409,26 @@ class IS0402Test(GenericTest):
             return test.NA("This test does not apply to v1.0")
 
         try:
-            valid, r = self.do_request("GET", self.query_url + "sources")
-            if not valid:
-                return test.FAIL("Query API failed to respond to query")
-            elif len(r.json()) == 0:
+            if not self.has_results(self.query_url + "sources"):
                 return test.NA("No Sources found in registry. Test cannot proceed.")
-        except json.decoder.JSONDecodeError:
-            return test.FAIL("Non-JSON response returned")
 
-        random_label = uuid.uuid4()
-        query_string = "?query.ancestry_id=" + str(random_label) + "&query.ancestry_type=children"
-        valid, r = self.do_request("GET", self.query_url + "sources" + query_string)
-        if not valid:
-            return test.FAIL("Query API failed to respond to query")
-        elif r.status_code == 501:
-            return test.NA("Query API signalled that it does not support ancestry queries")
-        elif len(r.json()) > 0:
-            return test.FAIL("Query API returned more records than expected for query: {}".format(query_string))
+            random_label = uuid.uuid4()
+            query_string = "?query.ancestry_id=" + str(random_label) + "&query.ancestry_type=children"
+            if self.has_results(self.query_url + "sources" + query_string):
+                return test.FAIL("Query API returned more records than expected for query: {}".format(query_string))
+        except PagingError as e:
+            if e.status_code == 501:
+                return test.NA("Query API signalled that it does not support ancestry queries")
+            return test.FAIL("Query API failed to respond to query: {}".format(e))
 
         return test.PASS()
 
+    def has_results(self, url):
+        """Check whether a Query API request returns any resources, parsing no more of the response than required"""
+        for resource in self.walk(url, max_pages=1):
+            return True
+        return False
+
     def do_400_check(self, test, resource_type, data):
         valid, r = self.do_request("POST", self.reg_url + "resource", data={"type": resource_type, "data": data})
 
@@ -430,3 +445,188 @@ class IS0402Test(GenericTest):
             return test.PASS()
         else:
             return test.FAIL(message)
+
+    def mode_fleet(self):
+        """Simulate a fleet of Nodes registering and heartbeating against the Registration API"""
+
+        test = Test("Registration API sustains a fleet of {} Nodes".format(Config.FLEET_NODE_COUNT))
+
+        if self.test_version != "v1.2":
+            return [test.MANUAL("This mode cannot currently be performed for API versions other than v1.2")]
+
+        fleet = NodeFleet(self.reg_url, Config.FLEET_NODE_COUNT, Config.FLEET_DURATION, workers=Config.FLEET_WORKERS)
+        report = fleet.run()
+        return self.fleet_results(report)
+
+    def fleet_results(self, report):
+        """Convert a NodeFleet report into test results"""
+        results = []
+
+        for kind in ["registration", "heartbeat"]:
+            test = Test("Fleet {} latency".format(kind))
+            detail = "{}; {} errors in {} requests".format(
+                TestHelper.summarise_latency(report[kind + "_latency"]), report["errors"][kind],
+                report["requests"][kind])
+            if report["requests"][kind] == 0:
+                results.append(test.FAIL("No {} requests were completed".format(kind)))
+            elif report["errors"][kind] > 0:
+                results.append(test.FAIL(detail))
+            else:
+                results.append(test.PASS(detail))
+
+        test = Test("Fleet Nodes are retained by the registry")
+        if report["drops"]:
+            elapsed, registered = report["drops"][0]
+            results.append(test.FAIL("Registry started dropping Nodes after {:.1f} s with {} Nodes registered; "
+                                     "{} Nodes dropped in total".format(elapsed, registered, len(report["drops"]))))
+        else:
+            results.append(test.PASS("{} of {} Nodes registered at the end of the run".format(report["registered"],
+                                                                                              report["nodes"])))
+
+        # If the load generator itself falls behind, the figures above understate the load actually requested
+        test = Test("Fleet load generator kept to its heartbeat schedule")
+        lag = TestHelper.percentile(report["schedule_lag"], 99)
+        if lag is not None and lag > 1.0:
+            results.append(test.FAIL("p99 scheduling lag was {:.2f} s; reduce FLEET_NODE_COUNT or increase "
+                                     "FLEET_WORKERS".format(lag)))
+        else:
+            results.append(test.PASS("p99 scheduling lag was {:.3f} s".format(lag or 0)))
+
+        return results
+
+    def mode_capacity(self):
+        """Find the maximum sustainable registration rate of the Registration API"""
+
+        test = Test("Registration API maximum sustainable registration rate")
+
+        if self.test_version != "v1.2":
+            return [test.MANUAL("This mode cannot currently be performed for API versions other than v1.2")]
+
+        search = CapacitySearch(self.reg_url, Config.CAPACITY_SLO_MS / 1000.0, start_rate=Config.CAPACITY_START_RATE,
+                                max_rate=Config.CAPACITY_MAX_RATE, step_duration=Config.CAPACITY_STEP_DURATION,
+                                workers=Config.CAPACITY_WORKERS)
+        try:
+            report = search.run()
+        except Exception as e:
+            return [test.FAIL("Unable to set up capacity search: {}".format(e))]
+
+        results = []
+        if report["max_rate"] is None:
+            results.append(test.FAIL("Registry could not sustain the starting rate of {} requests/s within a p99 of "
+                                     "{} ms".format(Config.CAPACITY_START_RATE, Config.CAPACITY_SLO_MS)))
+        elif report["knee"] is None:
+            results.append(test.PASS("At least {:.0f} requests/s; the configured maximum rate was reached without "
+                                     "finding a knee".format(report["max_rate"])))
+        else:
+            results.append(test.PASS("{:.0f} requests/s within a p99 of {} ms; knee found at {:.0f} requests/s"
+                                     .format(report["max_rate"], Config.CAPACITY_SLO_MS, report["knee"])))
+
+        # Report the latency curve, one result per rate step
+        for step in report["curve"]:
+            test = Test("Registration latency at {:.0f} requests/s".format(step["rate"]))
+            detail = "achieved {:.0f} requests/s; {}; {} errors; up to {} requests in flight".format(
+                step["achieved"], TestHelper.summarise_latency(step["latency"]), step["errors"],
+                step["max_in_flight"])
+            results.append(test.PASS(detail) if step["ok"] else test.FAIL(detail))
+
+        return results
+
+    def mode_query_bench(self):
+        """Measure Query API latency for a range of query shapes against a seeded registry"""
+
+        test = Test("Query API benchmark seeding of {} resources".format(Config.QUERY_BENCH_RESOURCES))
+
+        if self.test_version != "v1.2":
+            return [test.MANUAL("This mode cannot currently be performed for API versions other than v1.2")]
+
+        benchmark = QueryBenchmark(self.reg_url, self.query_url, Config.QUERY_BENCH_RESOURCES,
+                                   tree_depth=Config.QUERY_BENCH_TREE_DEPTH, repeats=Config.QUERY_BENCH_REPEATS)
+        try:
+            seed_time, measurements = benchmark.run(downgrade_version="v1.0")
+        except Exception as e:
+            return [test.FAIL("Unable to seed the registry: {}".format(e))]
+
+        results = [test.PASS("Seeded in {:.1f} s".format(seed_time))]
+        for name, measurement in measurements:
+            test = Test("Query API latency: {}".format(name))
+            if measurement["status"] == 501:
+                results.append(test.NA("Query API signalled that it does not support this query"))
+            elif measurement["errors"] > 0:
+                results.append(test.FAIL("{} failed requests; last status code {}".format(
+                    measurement["errors"], measurement["status"])))
+            elif "count" in measurement:
+                results.append(test.PASS("{} resources in {} pages over {:.2f} s; page {}".format(
+                    measurement["count"], len(measurement["latency"]), measurement["duration"],
+                    TestHelper.summarise_latency(measurement["latency"]))))
+            else:
+                elapsed = sum(measurement["latency"])
+                throughput = len(measurement["latency"]) / elapsed if elapsed else 0
+                results.append(test.PASS("{}; {:.1f} queries/s".format(
+                    TestHelper.summarise_latency(measurement["latency"]), throughput)))
+
+        return results
+
+    def mode_subscriptions(self):
+        """Measure Query API WebSocket subscription delivery and the number of subscriptions sustained"""
+
+        test = Test("Query API sustains concurrent WebSocket subscriptions")
+
+        if self.test_version != "v1.2":
+            return [test.MANUAL("This mode cannot currently be performed for API versions other than v1.2")]
+
+        benchmark = SubscriptionBenchmark(self.reg_url, self.query_url, update_count=Config.SUBSCRIPTION_UPDATES,
+                                          update_rate=Config.SUBSCRIPTION_UPDATE_RATE,
+                                          slo=Config.SUBSCRIPTION_SLO_MS / 1000.0,
+                                          max_subscriptions=Config.SUBSCRIPTION_MAX_COUNT)
+        try:
+            report = benchmark.run()
+        except Exception as e:
+            return [test.FAIL("Unable to set up subscription benchmark: {}".format(e))]
+
+        results = []
+        for name, body, measurement in report["configurations"]:
+            results.append(self.subscription_result(Test("Subscription delivery: {}".format(name)), body,
+                                                    measurement))
+
+        if report["max_subscriptions"] is None:
+            results.append(test.FAIL("Registry could not deliver to {} subscriptions within {} ms".format(
+                report["scale"][0]["subscriptions"] if report["scale"] else 0, Config.SUBSCRIPTION_SLO_MS)))
+        elif report["max_subscriptions"] == Config.SUBSCRIPTION_MAX_COUNT:
+            results.append(test.PASS("At least {} subscriptions; the configured maximum was reached".format(
+                report["max_subscriptions"])))
+        else:
+            results.append(test.PASS("{} subscriptions sustained within {} ms of each max_update_rate_ms".format(
+                report["max_subscriptions"], Config.SUBSCRIPTION_SLO_MS)))
+
+        for step in report["scale"]:
+            test = Test("Subscription delivery with {} concurrent subscriptions".format(step["subscriptions"]))
+            detail = "{} connected; {}; {} updates dropped".format(
+                step["connected"], TestHelper.summarise_latency(step["latency"]), step["dropped"])
+            if step["error"] is not None:
+                detail += "; {}".format(step["error"])
+            results.append(test.PASS(detail) if step["ok"] else test.FAIL(detail))
+
+        return results
+
+    def subscription_result(self, test, body, measurement):
+        """Convert a SubscriptionBenchmark measurement of a single subscription into a test result"""
+        if "error" in measurement:
+            return test.FAIL(measurement["error"])
+
+        batches = measurement["events_per_grain"]
+        detail = "{} of {} expected updates in {} grains ({:.1f} per grain, max {}); {}".format(
+            measurement["expected"] - measurement["dropped"], measurement["expected"], measurement["grains"],
+            sum(batches) / len(batches) if batches else 0, max(batches) if batches else 0,
+            TestHelper.summarise_latency(measurement["latency"]))
+        if measurement["sent"] == 0:
+            return test.FAIL("No registrations were completed")
+        elif measurement["dropped"] > 0:
+            return test.FAIL("{} updates dropped; {}".format(measurement["dropped"], detail))
+        elif measurement["unexpected"] > 0:
+            return test.FAIL("{} updates delivered which do not match the subscription; {}".format(
+                measurement["unexpected"], detail))
+        elif measurement["rate_violations"] > 0:
+            return test.FAIL("{} grains sent sooner than max_update_rate_ms={} (minimum interval {:.0f} ms); {}"
+                             .format(measurement["rate_violations"], body["max_update_rate_ms"],
+                                     measurement["min_interval"] * 1000, detail))
+        return test.PASS(detail)
@@ -15,7 +15,6 @@
 # limitations under the License.
 
 
-import requests
 import uuid
 import os
 import re
@@ -23,9 +22,12 @@ import time
 from jsonschema import ValidationError, SchemaError, RefResolver, Draft4Validator
 from random import randint
 
+import Config
 import TestHelper
+from PatchStress import PatchStress
 from TestResult import Test
 from GenericTest import GenericTest
+from TestSelection import resources, tags
 
 
 class IS0501Test(GenericTest):
@@ -40,9 +42,16 @@ class IS0501Test(GenericTest):
         ]
         GenericTest.__init__(self, apis, spec_versions, test_version, spec_path, omit_paths)
         self.url = self.apis["connection"]["url"]
-        self.senders = self.get_senders()
-        self.receivers = self.get_receivers()
+        # Check the API is reachable before listing its Senders and Receivers, so that an unreachable API fails fast
+        if self.preflight():
+            self.senders = []
+            self.receivers = []
+        else:
+            self.senders = self.get_senders()
+            self.receivers = self.get_receivers()
 
+    @tags("root")
+    @resources(reads=["root"])
     def test_01(self):
         """Api root matches the spec"""
         test = Test("Api root matches the spec")
@@ -59,6 +68,8 @@ class IS0501Test(GenericTest):
         else:
             return test.FAIL(result)
 
+    @tags("root")
+    @resources(reads=["root"])
     def test_02(self):
         """Single endpoint root matches the spec"""
         test = Test("Single endpoint root matches the spec")
@@ -75,6 +86,8 @@ class IS0501Test(GenericTest):
         else:
             return test.FAIL(result)
 
+    @tags("senders")
+    @resources(reads=["senders/index"])
     def test_03(self):
         """Root of /single/senders/ matches the spec"""
         test = Test("Root of /single/senders/ matches the spec")
@@ -104,6 +117,8 @@ class IS0501Test(GenericTest):
         else:
             return test.FAIL(response)
 
+    @tags("receivers")
+    @resources(reads=["receivers/index"])
     def test_04(self):
         """Root of /single/receivers/ matches the spec"""
         test = Test("Root of /single/receivers/ matches the spec")
@@ -133,6 +148,8 @@ class IS0501Test(GenericTest):
         else:
             return test.FAIL(response)
 
+    @tags("senders")
+    @resources(reads=["senders/index"])
     def test_05(self):
         """Index of /single/senders/<uuid>/ matches the spec"""
         test = Test("Index of /single/senders/<uuid>/ matches the spec")
@@ -158,6 +175,8 @@ class IS0501Test(GenericTest):
         else:
             return test.NA("Not tested. No resources found.")
 
+    @tags("receivers")
+    @resources(reads=["receivers/index"])
     def test_06(self):
         """Index of /single/receivers/<uuid>/ matches the spec"""
         test = Test("Index of /single/receivers/<uuid>/ matches the spec")
@@ -182,6 +201,8 @@ class IS0501Test(GenericTest):
         else:
             return test.NA("Not tested. No resources found.")
 
+    @tags("senders", "constraints")
+    @resources(reads=["senders/constraints"])
     def test_07(self):
         """Return of /single/senders/<uuid>/constraints/ meets the schema"""
         test = Test("Return of /single/senders/<uuid>/constraints/ meets the schema")
@@ -198,6 +219,8 @@ class IS0501Test(GenericTest):
         else:
             return test.NA("Not tested. No resources found.")
 
+    @tags("receivers", "constraints")
+    @resources(reads=["receivers/constraints"])
     def test_08(self):
         """Return of /single/receivers/<uuid>/constraints/ meets the schema"""
         test = Test("Return of /single/receivers/<uuid>/constraints/ meets the schema")
@@ -214,6 +237,8 @@ class IS0501Test(GenericTest):
         else:
             return test.NA("Not tested. No resources found.")
 
+    @tags("senders", "constraints")
+    @resources(reads=["senders"])
     def test_09(self):
         """All params listed in /single/senders/<uuid>/constraints/ matches /staged/ and /active/"""
         test = Test("All params listed in /single/senders/<uuid>/constraints/ matches /staged/ and /active/")
@@ -229,6 +254,8 @@ class IS0501Test(GenericTest):
         else:
             return test.NA("Not tested. No resources found.")
 
+    @tags("receivers", "constraints")
+    @resources(reads=["receivers"])
     def test_10(self):
         """All params listed in /single/receivers/<uuid>/constraints/ matches /staged/ and /active/"""
         test = Test("All params listed in /single/receivers/<uuid>/constraints/ matches /staged/ and /active/")
@@ -244,6 +271,8 @@ class IS0501Test(GenericTest):
         else:
             return test.NA("Not tested. No resources found.")
 
+    @tags("senders", "constraints")
+    @resources(reads=["senders"])
     def test_11(self):
         """Senders are using valid combination of parameters"""
         test = Test("Senders are using valid combination of parameters")
@@ -288,6 +317,8 @@ class IS0501Test(GenericTest):
         else:
             return test.NA("Not tested. No resources found.")
 
+    @tags("receivers", "constraints")
+    @resources(reads=["receivers"])
     def test_12(self):
         """Receiver are using valid combination of parameters"""
         test = Test("Receiver are using valid combination of parameters")
@@ -330,6 +361,8 @@ class IS0501Test(GenericTest):
         else:
             return test.NA("Not tested. No resources found.")
 
+    @tags("senders", "staged")
+    @resources(reads=["senders/staged"])
     def test_13(self):
         """Return of /single/senders/<uuid>/staged/ meets the schema"""
         test = Test("Return of /single/senders/<uuid>/staged/ meets the schema")
@@ -346,6 +379,8 @@ class IS0501Test(GenericTest):
         else:
             return test.NA("Not tested. No resources found.")
 
+    @tags("receivers", "staged")
+    @resources(reads=["receivers/staged"])
     def test_14(self):
         """Return of /single/receivers/<uuid>/staged/ meets the schema"""
         test = Test("Return of /single/receivers/<uuid>/staged/ meets the schema")
@@ -362,6 +397,8 @@ class IS0501Test(GenericTest):
         else:
             return test.NA("Not tested. No resources found.")
 
+    @tags("senders", "staged", "constraints")
+    @resources(reads=["senders/staged", "senders/constraints"])
     def test_15(self):
         """Staged parameters for senders comply with constraints"""
         test = Test("Staged parameters for senders comply with constraints")
@@ -374,6 +411,8 @@ class IS0501Test(GenericTest):
         else:
             return test.NA("Not tested. No resources found.")
 
+    @tags("receivers", "staged", "constraints")
+    @resources(reads=["receivers/staged", "receivers/constraints"])
     def test_16(self):
         """Staged parameters for receivers comply with constraints"""
         test = Test("Staged parameters for receivers comply with constraints")
@@ -386,6 +425,8 @@ class IS0501Test(GenericTest):
         else:
             return test.NA("Not tested. No resources found.")
 
+    @tags("senders", "staged")
+    @resources(reads=["senders/staged"])
     def test_17(self):
         """Sender patch response schema is valid"""
         test = Test("Sender patch response schema is valid")
@@ -398,6 +439,8 @@ class IS0501Test(GenericTest):
         else:
             return test.NA("Not tested. No resources found.")
 
+    @tags("receivers", "staged")
+    @resources(reads=["receivers/staged"])
     def test_18(self):
         """Receiver patch response schema is valid"""
         test = Test("Receiver patch response schema is valid")
@@ -410,6 +453,8 @@ class IS0501Test(GenericTest):
         else:
             return test.NA("Not tested. No resources found.")
 
+    @tags("senders", "staged")
+    @resources(reads=["senders/staged"])
     def test_19(self):
         """Sender invalid patch is refused"""
         test = Test("Sender invalid patch is refused")
@@ -422,6 +467,8 @@ class IS0501Test(GenericTest):
         else:
             return test.NA("Not tested. No resources found.")
 
+    @tags("receivers", "staged")
+    @resources(reads=["receivers/staged"])
     def test_20(self):
         """Receiver invalid patch is refused"""
         test = Test("Receiver invalid patch is refused")
@@ -434,6 +481,8 @@ class IS0501Test(GenericTest):
         else:
             return test.NA("Not tested. No resources found.")
 
+    @tags("receivers", "staged")
+    @resources(mutates=["receivers/staged"])
     def test_21(self):
         """Sender id on staged receiver is changeable"""
         test = Test("Sender id on staged receiver is changeable")
@@ -463,6 +512,8 @@ class IS0501Test(GenericTest):
         else:
             return test.NA("Not tested. No resources found.")
 
+    @tags("senders", "staged")
+    @resources(mutates=["senders/staged"])
     def test_22(self):
         """Receiver id on staged sender is changeable"""
         test = Test("Receiver id on staged sender is changeable")
@@ -492,6 +543,8 @@ class IS0501Test(GenericTest):
         else:
             return test.NA("Not tested. No resources found.")
 
+    @tags("senders", "staged")
+    @resources(mutates=["senders/staged"])
     def test_23(self):
         """Sender transport parameters are changeable"""
         test = Test("Sender transport parameters are changeable")
@@ -511,6 +564,8 @@ class IS0501Test(GenericTest):
         else:
             return test.NA("Not tested. No resources found.")
 
+    @tags("receivers", "staged")
+    @resources(mutates=["receivers/staged"])
     def test_24(self):
         """Receiver transport parameters are changeable"""
         test = Test("Receiver transport parameters are changeable")
@@ -530,6 +585,8 @@ class IS0501Test(GenericTest):
         else:
             return test.NA("Not tested. No resources found.")
 
+    @tags("senders", "activation")
+    @resources(mutates=["senders/staged", "senders/active"])
     def test_25(self):
         """Immediate activation of a sender is possible"""
         test = Test("Immediate activation of a sender is possible")
@@ -544,6 +601,8 @@ class IS0501Test(GenericTest):
         else:
             return test.NA("Not tested. No resources found.")
 
+    @tags("receivers", "activation")
+    @resources(mutates=["receivers/staged", "receivers/active"])
     def test_26(self):
         """Immediate activation of a receiver is possible"""
         test = Test("Immediate activation of a receiver is possible")
@@ -558,6 +617,8 @@ class IS0501Test(GenericTest):
         else:
             return test.NA("Not tested. No resources found.")
 
+    @tags("senders", "activation")
+    @resources(mutates=["senders/staged", "senders/active"])
     def test_27(self):
         """Relative activation of a sender is possible"""
         test = Test("Relative activation of a sender is possible")
@@ -572,6 +633,8 @@ class IS0501Test(GenericTest):
         else:
             return test.NA("Not tested. No resources found.")
 
+    @tags("receivers", "activation")
+    @resources(mutates=["receivers/staged", "receivers/active"])
     def test_28(self):
         """Relative activation of a receiver is possible"""
         test = Test("Relative activation of a receiver is possible")
@@ -587,6 +650,8 @@ class IS0501Test(GenericTest):
         else:
             return test.NA("Not tested. No resources found.")
 
+    @tags("senders", "activation")
+    @resources(mutates=["senders/staged", "senders/active"])
     def test_29(self):
         """Absolute activation of a sender is possible"""
         test = Test("Absolute activation of a sender is possible")
@@ -601,6 +666,8 @@ class IS0501Test(GenericTest):
         else:
             return test.NA("Not tested. No resources found.")
 
+    @tags("receivers", "activation")
+    @resources(mutates=["receivers/staged", "receivers/active"])
     def test_30(self):
         """Absolute activation of a receiver is possible"""
         test = Test("Absolute activation of a receiver is possible")
@@ -616,6 +683,8 @@ class IS0501Test(GenericTest):
         else:
             return test.NA("Not tested. No resources found.")
 
+    @tags("senders", "active")
+    @resources(reads=["senders/active"])
     def test_31(self):
         """Sender active response schema is valid"""
         test = Test("Sender active response schema is valid")
@@ -632,6 +701,8 @@ class IS0501Test(GenericTest):
         else:
             return test.NA("Not tested. No resources found.")
 
+    @tags("receivers", "active")
+    @resources(reads=["receivers/active"])
     def test_32(self):
         """Receiver active response schema is valid"""
         test = Test("Receiver active response schema is valid")
@@ -648,6 +719,8 @@ class IS0501Test(GenericTest):
         else:
             return test.NA("Not tested. No resources found.")
 
+    @tags("bulk")
+    @resources(reads=["bulk"])
     def test_33(self):
         """/bulk/ endpoint returns correct JSON"""
         test = Test("/bulk/ endpoint returns correct JSON")
@@ -663,6 +736,8 @@ class IS0501Test(GenericTest):
         else:
             return test.FAIL(response)
 
+    @tags("bulk", "senders")
+    @resources(reads=["bulk"])
     def test_34(self):
         """GET on /bulk/senders returns 405"""
         test = Test("GET on /bulk/senders returns 405")
@@ -673,6 +748,8 @@ class IS0501Test(GenericTest):
         else:
             return test.FAIL(response)
 
+    @tags("bulk", "receivers")
+    @resources(reads=["bulk"])
     def test_35(self):
         """GET on /bulk/receivers returns 405"""
         test = Test("GET on /bulk/receivers returns 405")
@@ -683,6 +760,8 @@ class IS0501Test(GenericTest):
         else:
             return test.FAIL(response)
 
+    @tags("bulk", "senders")
+    @resources(mutates=["senders/staged"])
     def test_36(self):
         """Bulk interface can be used to change destination port on all senders"""
         test = Test("Bulk interface can be used to change destination port on all senders")
@@ -695,6 +774,8 @@ class IS0501Test(GenericTest):
         else:
             return test.NA("Not tested. No resources found.")
 
+    @tags("bulk", "receivers")
+    @resources(mutates=["receivers/staged"])
     def test_37(self):
         """Bulk interface can be used to change destination port on all receivers"""
         test = Test("Bulk interface can be used to change destination port on all receivers")
@@ -707,6 +788,8 @@ class IS0501Test(GenericTest):
         else:
             return test.NA("Not tested. No resources found.")
 
+    @tags("senders", "constraints", "staged", "active")
+    @resources(reads=["senders"])
     def test_38(self):
         """Number of legs matches on constraints, staged and active endpoint for senders"""
         test = Test("Number of legs matches on constraints, staged and active endpoint for senders")
@@ -722,6 +805,8 @@ class IS0501Test(GenericTest):
         else:
             return test.NA("Not tested. No resources found.")
 
+    @tags("receivers", "constraints", "staged", "active")
+    @resources(reads=["receivers"])
     def test_39(self):
         """Number of legs matches on constraints, staged and active endpoint for receivers"""
         test = Test("Number of legs matches on constraints, staged and active endpoint for receivers")
@@ -737,6 +822,62 @@ class IS0501Test(GenericTest):
         else:
             return test.NA("Not tested. No resources found.")
 
+    def mode_stress(self):
+        """Change staged parameters from many concurrent clients, including conflicting writes to the same port"""
+
+        test = Test("Connection API sustains concurrent changes to staged parameters")
+
+        ports = {"sender": self.senders, "receiver": self.receivers}
+        constraints = {}
+        for port, portList in ports.items():
+            for portId in portList:
+                url = "single/" + port + "s/" + portId + "/constraints/"
+                valid, response = self.checkCleanRequestJSON("GET", url)
+                if not valid:
+                    return [test.FAIL(response)]
+                constraints[(port, portId)] = response
+        if not constraints:
+            return [test.NA("Not tested. No resources found.")]
+
+        def choose(port, portId):
+            return self.pick_destination_ports(constraints[(port, portId)])
+
+        stress = PatchStress(self.url, ports, choose, Config.PATCH_STRESS_CONCURRENCY,
+                             Config.PATCH_STRESS_STEP_DURATION, timeout=self.request_timeout())
+        report = stress.run()
+
+        results = []
+        if report["failed_at"] is None:
+            results.append(test.PASS("No errors or lost updates with up to {} concurrent clients".format(
+                report["steps"][-1]["concurrency"])))
+        elif report["failed_at"] == report["steps"][0]["concurrency"]:
+            results.append(test.FAIL("Errors or inconsistent state with {} concurrent clients".format(
+                report["failed_at"])))
+        else:
+            results.append(test.FAIL("Errors or inconsistent state from {} concurrent clients; none with {}".format(
+                report["failed_at"], report["steps"][-2]["concurrency"])))
+
+        for step in report["steps"]:
+            results.append(self.stress_result(Test("Staged parameter changes from {} concurrent clients".format(
+                step["concurrency"])), step))
+        return results
+
+    def stress_result(self, test, step):
+        """Convert a PatchStress measurement of one step into a test result"""
+        detail = "{} requests at {:.1f} requests/s; {}; {} writes".format(
+            step["requests"], step["throughput"], TestHelper.summarise_latency(step["latency"]), step["writes"])
+        problems = []
+        if step["errors"] > 0:
+            problems.append("{} errors (first: {})".format(step["errors"], step["error"]))
+        if step["inconsistent"] > 0:
+            problems.append("{} PATCH responses did not show the parameters written (last: {})".format(
+                step["inconsistent"], step["inconsistency"]))
+        if step["lost"] > 0:
+            problems.append("{} ports lost an update ({})".format(step["lost"], "; ".join(step["lost_examples"])))
+        if problems:
+            return test.FAIL("; ".join(problems + [detail]))
+        return test.PASS(detail)
+
     def check_num_legs(self, url, type, uuid):
         """Checks the number of legs present on a given sender/receiver"""
         max = 2
@@ -814,15 +955,14 @@ class IS0501Test(GenericTest):
                 data.append(toAdd)
             else:
                 return False, response
-        try:
-            r = requests.post(url, json=data)
-            msg = "Expected a 200 response from {}, got {}".format(url, r.status_code)
-            if r.status_code == 200:
-                pass
-            else:
-                return False, msg
-        except requests.exceptions.RequestException as e:
-            return False, str(e)
+        valid, r = self.do_request("POST", url, data=data)
+        if not valid:
+            return False, r
+        msg = "Expected a 200 response from {}, got {}".format(url, r.status_code)
+        if r.status_code == 200:
+            pass
+        else:
+            return False, msg
 
         schema = self.get_schema("connection", "POST", "/bulk/" + port + "s", 200)
         try:
@@ -1163,29 +1303,33 @@ class IS0501Test(GenericTest):
         url = "single/" + port + "s/" + portId + "/constraints/"
         valid, constraints = self.checkCleanRequestJSON("GET", url)
         if valid:
-            toReturn = []
             try:
-                for entry in constraints:
-                    if "enum" in entry['destination_port']:
-                        values = entry['destination_port']['enum']
-                        toReturn.append(values[randint(0, len(values) - 1)])
-                    else:
-                        if "minimum" in entry['destination_port']:
-                            min = entry['destination_port']['minimum']
-                        else:
-                            min = 5000
-                        if "maximum" in entry['destination_port']:
-                            max = entry['destination_port']['maximum']
-                        else:
-                            max = 49151
-                        toReturn.append(randint(min, max))
-                return True, toReturn
+                return True, self.pick_destination_ports(constraints)
             except TypeError:
                 return False, "Expected a dict to be returned from {}, got a {}: {}".format(url, type(constraints),
                                                                                             constraints)
         else:
             return False, constraints
 
+    def pick_destination_ports(self, constraints):
+        """Pick a destination port for each leg of a port which is allowed by its constraints"""
+        toReturn = []
+        for entry in constraints:
+            if "enum" in entry['destination_port']:
+                values = entry['destination_port']['enum']
+                toReturn.append(values[randint(0, len(values) - 1)])
+            else:
+                if "minimum" in entry['destination_port']:
+                    min = entry['destination_port']['minimum']
+                else:
+                    min = 5000
+                if "maximum" in entry['destination_port']:
+                    max = entry['destination_port']['maximum']
+                else:
+                    max = 49151
+                toReturn.append(randint(min, max))
+        return toReturn
+
     def check_change_transport_param(self, port, portList, paramName, paramValues, myPort):
         """Check that we can update a transport parameter"""
         url = "single/" + port + "s/" + myPort + "/staged"
@@ -1367,43 +1511,34 @@ class IS0501Test(GenericTest):
 
     def get_senders(self):
         """Gets a list of the available senders on the API"""
-        toReturn = []
-        try:
-            r = requests.get(self.url + "single/senders/")
-            try:
-                for value in r.json():
-                    toReturn.append(value[:-1])
-            except ValueError:
-                pass
-        except requests.exceptions.RequestException:
-            pass
-        return toReturn
+        return self.get_port_list("senders")
 
     def get_receivers(self):
         """Gets a list of the available receivers on the API"""
+        return self.get_port_list("receivers")
+
+    def get_port_list(self, port):
+        """Gets a list of the IDs of the available senders or receivers on the API"""
         toReturn = []
-        try:
-            r = requests.get(self.url + "single/receivers/")
+        valid, r = self.do_request("GET", self.url + "single/" + port + "/")
+        if valid:
             try:
                 for value in r.json():
                     toReturn.append(value[:-1])
             except ValueError:
                 pass
-        except requests.exceptions.RequestException:
-            pass
         return toReturn
 
     def get_num_paths(self, port, portType):
         """Returns the number or redundant paths on a port"""
         url = self.url + "single/" + portType + "s/" + port + "/constraints/"
+        valid, r = self.do_request("GET", url)
+        if not valid:
+            return 0
         try:
-            r = requests.get(url)
-            try:
-                rjson = r.json()
-                return len(rjson)
-            except ValueError:
-                return 0
-        except requests.exceptions.RequestException:
+            rjson = r.json()
+            return len(rjson)
+        except ValueError:
             return 0
 
     def compare_to_schema(self, schema, endpoint, status_code=200):
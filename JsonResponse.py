@@ -0,0 +1,87 @@
+# Copyright (C) 2018 British Broadcasting Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _orjson_loads(data):
+    # orjson.JSONDecodeError is a subclass of json.JSONDecodeError, so callers need not know which backend is in use
+    return orjson.loads(data)
+
+
+def _stdlib_loads(data):
+    # json.loads detects the encoding of bytes itself, but invalid bytes raise a UnicodeDecodeError, which callers
+    # handling json.JSONDecodeError would not expect
+    try:
+        return json.loads(data)
+    except UnicodeDecodeError as e:
+        raise json.JSONDecodeError("Invalid {} in response body: {}".format(e.encoding, e.reason),
+                                   data.decode("utf-8", "replace"), e.start)
+
+
+_loads = _orjson_loads if orjson is not None else _stdlib_loads
+
+
+def set_json_backend(loads):
+    """
+    Select the function used to decode response bodies. It is passed the raw body as bytes and must raise
+    json.JSONDecodeError for invalid JSON. None restores the default backend.
+    """
+    global _loads
+    if loads is None:
+        loads = _orjson_loads if orjson is not None else _stdlib_loads
+    _loads = loads
+
+
+def json_backend():
+    """Get the name of the JSON backend currently in use"""
+    if _loads is _orjson_loads:
+        return "orjson"
+    elif _loads is _stdlib_loads:
+        return "json"
+    return getattr(_loads, "__module__", None) or repr(_loads)
+
+
+class JsonResponse(object):
+    """
+    Wraps a Requests response so that its body is decoded as JSON at most once. The parsed value, or the decode
+    error, is cached and returned by every subsequent call to json(). All other attributes are those of the response.
+    """
+    def __init__(self, response):
+        self.response = response
+        self._json = None
+        self._json_error = None
+        self._decoded = False
+
+    def json(self):
+        if not self._decoded:
+            try:
+                self._json = _loads(self.response.content)
+            except json.decoder.JSONDecodeError as e:
+                self._json_error = e
+            self._decoded = True
+        if self._json_error is not None:
+            raise self._json_error
+        return self._json
+
+    def __getattr__(self, name):
+        return getattr(self.response, name)
+
+    def __repr__(self):
+        return repr(self.response)
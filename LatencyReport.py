@@ -0,0 +1,215 @@
+# Copyright (C) 2018 British Broadcasting Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+from urllib.parse import urlsplit
+
+from TestResult import Test
+import TestHelper
+
+# Longest request or response body, in characters, kept for each request in the slow request log
+BODY_LIMIT = 4096
+
+
+def _template_pattern(template):
+    """Compile a RAML path template such as /devices/{deviceId} into a regular expression matching its paths"""
+    parts = re.split(r"(\{[^}]+\})", template.rstrip("/"))
+    return re.compile("^" + "".join("[^/]+" if part.startswith("{") else re.escape(part) for part in parts) + "/?$")
+
+
+def _body(body, size=None):
+    """Shorten a body for the slow request log, where 'size' is the full size in bytes if only its start is given"""
+    if body is None:
+        return None
+    if isinstance(body, bytes):
+        body = body.decode("utf-8", "replace")
+    if size is not None and size > BODY_LIMIT:
+        return body[:BODY_LIMIT] + "... ({} bytes)".format(size)
+    return body if len(body) <= BODY_LIMIT else body[:BODY_LIMIT] + "... ({} characters)".format(len(body))
+
+
+class TimedResponse(object):
+    """
+    Wraps a streamed Requests response so that it is recorded in a LatencyReport once it has been read to the end or
+    closed, timing the transfer of the whole body and keeping its first BODY_LIMIT bytes for the slow request log. All
+    other attributes are those of the response.
+    """
+    def __init__(self, report, response):
+        self.report = report
+        self.response = response
+        self.received = time.monotonic()
+        self.size = 0
+        self.head = b""
+        self._content = None
+        self.recorded = False
+
+    def iter_content(self, chunk_size=1):
+        try:
+            for chunk in self.response.iter_content(chunk_size):
+                self.size += len(chunk)
+                if len(self.head) < BODY_LIMIT:
+                    self.head += chunk[:BODY_LIMIT - len(self.head)]
+                yield chunk
+        finally:
+            self._record()
+
+    @property
+    def content(self):
+        if self._content is None:
+            self._content = b"".join(self.iter_content(65536))
+        return self._content
+
+    def close(self):
+        self._record()
+        self.response.close()
+
+    def _record(self):
+        if not self.recorded:
+            self.recorded = True
+            latency = self.response.elapsed.total_seconds() + time.monotonic() - self.received
+            self.report.record(self.response, latency, self.size, self.head)
+
+    def __getattr__(self, name):
+        return getattr(self.response, name)
+
+    def __repr__(self):
+        return repr(self.response)
+
+
+class LatencyReport(object):
+    """
+    Times the requests made to the APIs under test, grouped by method and RAML path template, and keeps the full
+    exchange of the slowest requests which took longer than their SLO or 'slow_ms'
+    """
+    def __init__(self, apis, slos=None, slow_ms=None, slow_log_size=20):
+        self.slos = slos or {}
+        self.slow_ms = slow_ms
+        self.slow_log_size = slow_log_size
+        self.lock = threading.Lock()
+        self.groups = OrderedDict()
+        self.slow = []
+
+        # The path of each API's base URL, and its path templates, longest first so that the most specific matches
+        self.templates = []
+        for api in apis:
+            base = urlsplit(apis[api]["url"])
+            spec = apis[api].get("spec")
+            paths = sorted(spec.data, key=len, reverse=True) if spec is not None else []
+            self.templates.append((base.netloc, base.path.rstrip("/"),
+                                   [(path.rstrip("/") or "/", _template_pattern(path)) for path in paths]))
+
+    def label(self, method, url):
+        """Get the group of a request, as its method and the RAML path template of its URL where there is one"""
+        parts = urlsplit(url)
+        for netloc, base_path, templates in self.templates:
+            if parts.netloc == netloc and (parts.path + "/").startswith(base_path + "/"):
+                for template, pattern in templates:
+                    if pattern.match(parts.path[len(base_path):] or "/"):
+                        return "{} {}{}".format(method.upper(), base_path, template)
+        return "{} {}".format(method.upper(), parts.path.rstrip("/") or "/")
+
+    def slo(self, label):
+        """Get the p95 latency SLO in milliseconds for a group, from the most specific matching pattern, or None"""
+        matches = [pattern for pattern in self.slos if fnmatchcase(label, pattern)]
+        return self.slos[max(matches, key=len)] if matches else None
+
+    def record(self, response, latency=None, size=None, body=None):
+        """
+        Record the time to a Requests response and its size. A streamed response is instead recorded by its
+        TimedResponse, with the time to the end of its body, the number of bytes read and the start of the body.
+        """
+        request = response.request
+        label = self.label(request.method, request.url)
+        if latency is None:
+            latency = response.elapsed.total_seconds()
+        received = size
+        if "Content-Length" in response.headers:
+            size = int(response.headers["Content-Length"])
+        elif size is None:
+            size = len(response.content)
+        with self.lock:
+            group = self._group(label)
+            group["latency"].append(latency)
+            group["bytes"] += size
+
+        threshold = self.slo(label) or self.slow_ms
+        if threshold is not None and latency * 1000 > threshold:
+            if body is None:
+                response_body = _body(response.content)
+            else:
+                response_body = _body(body, received)
+            self._log_slow(label, latency, request, response, response_body)
+
+    def timed(self, response):
+        """Wrap a streamed Requests response so that it is recorded once its body has been read"""
+        return TimedResponse(self, response)
+
+    def record_error(self, method, url):
+        """Record a request which failed to get a response"""
+        with self.lock:
+            self._group(self.label(method, url))["errors"] += 1
+
+    def _group(self, label):
+        if label not in self.groups:
+            self.groups[label] = {"latency": [], "bytes": 0, "errors": 0}
+        return self.groups[label]
+
+    def _log_slow(self, label, latency, request, response, response_body):
+        exchange = {"path": label, "latency_ms": round(latency * 1000, 1), "method": request.method,
+                    "url": request.url, "request_headers": dict(request.headers), "request_body": _body(request.body),
+                    "status": response.status_code, "response_headers": dict(response.headers),
+                    "response_body": response_body}
+        with self.lock:
+            self.slow.append(exchange)
+            self.slow.sort(key=lambda entry: entry["latency_ms"], reverse=True)
+            del self.slow[self.slow_log_size:]
+
+    def summary(self):
+        """Get the count, error count, p50, p95 and maximum latency in milliseconds, and bytes received, per group"""
+        report = []
+        with self.lock:
+            groups = [(label, list(group["latency"]), group["bytes"], group["errors"])
+                      for label, group in self.groups.items()]
+        for label, latency, size, errors in sorted(groups):
+            report.append({"path": label, "count": len(latency), "errors": errors,
+                           "p50_ms": self._ms(TestHelper.percentile(latency, 50)),
+                           "p95_ms": self._ms(TestHelper.percentile(latency, 95)),
+                           "max_ms": self._ms(max(latency) if latency else None),
+                           "bytes": size, "slo_ms": self.slo(label)})
+        return report
+
+    def _ms(self, seconds):
+        return None if seconds is None else round(seconds * 1000, 1)
+
+    def slow_requests(self):
+        with self.lock:
+            return list(self.slow)
+
+    def slo_results(self):
+        """Check the p95 latency of each group with an SLO, returning a test result for each"""
+        results = []
+        for group in self.summary():
+            if group["slo_ms"] is None or group["count"] == 0:
+                continue
+            test = Test("95th percentile latency of {} is within {} ms".format(group["path"], group["slo_ms"]))
+            detail = "p50={p50_ms} ms, p95={p95_ms} ms, max={max_ms} ms over {count} requests".format(**group)
+            if group["p95_ms"] <= group["slo_ms"]:
+                results.append(test.PASS(detail))
+            else:
+                results.append(test.FAIL(detail))
+        return results
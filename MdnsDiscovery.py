@@ -0,0 +1,206 @@
+# Copyright (C) 2018 British Broadcasting Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import queue
+import socket
+import threading
+import time
+from urllib.parse import urlsplit
+
+from zeroconf import ServiceBrowser, ServiceInfo, Zeroconf, _TYPE_SRV, _TYPE_TXT
+
+# Service types browsed from start-up, so that their announcements are already cached when tests need them
+NMOS_SERVICE_TYPES = ["_nmos-registration._tcp.local.", "_nmos-query._tcp.local.", "_nmos-node._tcp.local."]
+
+# Time in milliseconds allowed for the records making up a service's info to be resolved
+RESOLVE_TIMEOUT = 3000
+
+
+def service_address(info):
+    """Get the (address, port) of a service, or None if it has no IPv4 address"""
+    if info.address is None:
+        return None
+    return socket.inet_ntoa(info.address), info.port
+
+
+def matches_url(url):
+    """Get a predicate which matches services whose address and port are those of a URL"""
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    try:
+        address = socket.gethostbyname(parts.hostname)
+    except (socket.error, TypeError):
+        address = parts.hostname
+    return lambda info: service_address(info) == (address, port)
+
+
+class MdnsDiscovery(object):
+    """
+    A long-lived mDNS browser shared by all tests. Services are indexed by type and by (address, port), and kept up
+    to date as they are added, updated and removed, so tests can wait for an announcement rather than sleeping.
+    """
+    def __init__(self):
+        self.zeroconf = None
+        self.browsers = {}
+        self.services = {}
+        self.addresses = {}
+        self.condition = threading.Condition()
+        self.refresh_queue = queue.Queue()
+        self.pending = set()
+
+    def start(self, service_types=None):
+        """Start browsing for the given service types, creating the shared Zeroconf instance if required"""
+        with self.condition:
+            if self.zeroconf is None:
+                self.zeroconf = Zeroconf()
+                # Listen to every record so that changes to a known service's TXT or SRV records are picked up
+                self.zeroconf.add_listener(self, None)
+                threading.Thread(target=self._refresh, daemon=True).start()
+        for service_type in service_types or []:
+            self.browse(service_type)
+
+    def browse(self, service_type):
+        self.start()
+        with self.condition:
+            if service_type not in self.browsers:
+                self.services.setdefault(service_type, {})
+                self.browsers[service_type] = ServiceBrowser(self.zeroconf, service_type, self)
+
+    def close(self):
+        with self.condition:
+            if self.zeroconf is None:
+                return
+            zeroconf = self.zeroconf
+            self.zeroconf = None
+            self.browsers = {}
+            self.services = {}
+            self.addresses = {}
+        self.refresh_queue.put(None)
+        zeroconf.close()
+
+    # ServiceBrowser listener interface
+
+    def add_service(self, zeroconf, service_type, name):
+        self._enqueue(service_type, name)
+
+    def remove_service(self, zeroconf, service_type, name):
+        with self.condition:
+            self._unindex(service_type, name)
+            self.condition.notify_all()
+
+    def update_record(self, zeroconf, now, record):
+        """Called by Zeroconf for every record received. This runs on Zeroconf's own thread, so must not block."""
+        if record.type not in [_TYPE_TXT, _TYPE_SRV] or record.is_expired(now):
+            return
+        name = record.name.lower()
+        with self.condition:
+            for service_type, services in self.services.items():
+                for service_name, info in list(services.items()):
+                    if service_name.lower() == name and self._changed(info, record):
+                        # Zeroconf's cache keeps superseded records alongside new ones, so apply the change directly
+                        self._unindex(service_type, service_name)
+                        self._index(service_type, service_name, self._updated(info, record))
+                        self.condition.notify_all()
+
+    def _changed(self, info, record):
+        if record.type == _TYPE_TXT:
+            return record.text != info.text
+        return (record.port, record.server) != (info.port, info.server)
+
+    def _updated(self, info, record):
+        text = record.text if record.type == _TYPE_TXT else info.text
+        port, server = (record.port, record.server) if record.type == _TYPE_SRV else (info.port, info.server)
+        updated = ServiceInfo(info.type, info.name, info.address, port, info.weight, info.priority, server=server)
+        updated._set_text(text)
+        return updated
+
+    # Index maintenance
+
+    def _enqueue(self, service_type, name):
+        with self.condition:
+            if (service_type, name) in self.pending:
+                return
+            self.pending.add((service_type, name))
+        self.refresh_queue.put((service_type, name))
+
+    def _refresh(self):
+        """Resolve services on a worker thread, as resolution may need to wait for further responses"""
+        while True:
+            key = self.refresh_queue.get()
+            if key is None:
+                return
+            service_type, name = key
+            with self.condition:
+                self.pending.discard(key)
+                zeroconf = self.zeroconf
+                browsing = service_type in self.browsers
+            if zeroconf is None or not browsing:
+                continue
+            info = zeroconf.get_service_info(service_type, name, RESOLVE_TIMEOUT)
+            if info is None:
+                continue
+            with self.condition:
+                # The service may have been removed while it was being resolved
+                browser = self.browsers.get(service_type)
+                if browser is not None and name.lower() in browser.services:
+                    self._unindex(service_type, name)
+                    self._index(service_type, name, info)
+                    self.condition.notify_all()
+
+    def _index(self, service_type, name, info):
+        self.services[service_type][name] = info
+        address = service_address(info)
+        if address is not None:
+            self.addresses.setdefault(address, set()).add((service_type, name))
+
+    def _unindex(self, service_type, name):
+        info = self.services.get(service_type, {}).pop(name, None)
+        if info is None:
+            return
+        address = service_address(info)
+        if address in self.addresses:
+            self.addresses[address].discard((service_type, name))
+            if not self.addresses[address]:
+                del self.addresses[address]
+
+    # Queries
+
+    def get_services(self, service_type):
+        """Get the services currently known of a given type"""
+        self.browse(service_type)
+        with self.condition:
+            return list(self.services[service_type].values())
+
+    def get_services_at(self, address, port):
+        """Get the services currently known at an (address, port), of any type being browsed"""
+        with self.condition:
+            return [self.services[service_type][name]
+                    for service_type, name in self.addresses.get((address, port), set())]
+
+    def wait_for(self, service_type, predicate=None, timeout=5):
+        """Wait for a service of the given type which satisfies a predicate, returning its info or None on timeout"""
+        self.browse(service_type)
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while True:
+                for info in self.services.get(service_type, {}).values():
+                    if predicate is None or predicate(info):
+                        return info
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+
+
+DISCOVERY = MdnsDiscovery()
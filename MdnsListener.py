@@ -1,28 +0,0 @@
-# Copyright (C) 2018 Riedel Communications GmbH & Co. KG
-#
-# Modifications Copyright 2018 British Broadcasting Corporation
-#
-# Licensed under the Apache License, Version 2.0 (the "License");
-# you may not use this file except in compliance with the License.
-# You may obtain a copy of the License at
-#
-#     http://www.apache.org/licenses/LICENSE-2.0
-#
-# Unless required by applicable law or agreed to in writing, software
-# distributed under the License is distributed on an "AS IS" BASIS,
-# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
-# See the License for the specific language governing permissions and
-# limitations under the License.
-
-
-class MdnsListener(object):
-    def __init__(self):
-        self.services = list()
-
-    def add_service(self, zeroconf, type, name):
-        info = zeroconf.get_service_info(type, name)
-        if info is not None:
-            self.services.append(info)
-
-    def get_service_list(self):
-        return self.services
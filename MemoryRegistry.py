@@ -0,0 +1,1181 @@
+# Copyright (C) 2018 British Broadcasting Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import base64
+import bisect
+import hashlib
+import heapq
+import json
+import re
+import socket
+import socketserver
+import struct
+import threading
+import time
+import uuid
+from urllib.parse import unquote, urlencode
+
+from flask import Flask, request, jsonify
+from werkzeug.serving import make_server
+
+import TestHelper
+
+RESOURCE_TYPES = ["node", "device", "source", "flow", "sender", "receiver"]
+API_VERSIONS = ["v1.0", "v1.1", "v1.2", "v1.3"]
+
+# Keys used to find the registered parent of each resource type, in order of preference
+PARENT_KEYS = {
+    "device": [("node", "node_id")],
+    "source": [("device", "device_id")],
+    "flow": [("device", "device_id"), ("source", "source_id")],
+    "sender": [("device", "device_id")],
+    "receiver": [("device", "device_id")]
+}
+
+# Fields which are indexed for equality matching in basic and RQL queries
+INDEXED_FIELDS = ["id", "label", "node_id", "device_id", "source_id", "flow_id", "format", "transport"]
+
+# Keys introduced at each API version, which are removed when a resource is downgraded below that version.
+# This is a best-effort subset of the schema differences rather than a full schema-driven downgrade.
+DOWNGRADE_KEYS = {
+    "v1.1": {
+        "node": ["description", "tags", "api", "clocks"],
+        "device": ["description", "tags", "controls"],
+        "source": ["grain_rate", "channels", "clock_name"],
+        "flow": ["grain_rate", "device_id", "media_type", "sample_rate", "bit_depth", "DID_SDID", "frame_width",
+                 "frame_height", "interlace_mode", "colorspace", "transfer_characteristic", "components"],
+        "sender": [],
+        "receiver": []
+    },
+    "v1.2": {
+        "node": ["interfaces"],
+        "device": [],
+        "source": [],
+        "flow": [],
+        "sender": ["interface_bindings", "subscription"],
+        "receiver": ["interface_bindings", "subscription.active"]
+    },
+    "v1.3": {
+        "node": ["attached_network_device", "authorization"],
+        "device": [],
+        "source": ["event_type"],
+        "flow": ["event_type"],
+        "sender": [],
+        "receiver": []
+    }
+}
+
+DEFAULT_PAGING_LIMIT = 100
+MAX_PAGING_LIMIT = 1000
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+# Seconds a WebSocket client may stop reading for before a send to it fails and the connection is dropped
+WS_SEND_TIMEOUT = 5
+
+
+class RegistryError(Exception):
+    """An error to be returned to the API client with the given HTTP status code"""
+    def __init__(self, code, message):
+        Exception.__init__(self, message)
+        self.code = code
+        self.message = message
+
+
+def parse_version(version):
+    """Parse a string based API version into a tuple which can be compared"""
+    try:
+        version_parts = version.strip("v").split(".")
+        return int(version_parts[0]), int(version_parts[1])
+    except (ValueError, IndexError, AttributeError):
+        raise RegistryError(400, "Invalid API version: {}".format(version))
+
+
+def stamp_to_str(stamp):
+    """Convert an integer nanosecond TAI timestamp into a 'secs:nanos' string"""
+    return "{}:{}".format(stamp // 1000000000, stamp % 1000000000)
+
+
+def str_to_stamp(value):
+    """Convert a 'secs:nanos' string into an integer nanosecond TAI timestamp"""
+    match = re.match(r"^([0-9]+):([0-9]+)$", value)
+    if not match or int(match.group(2)) >= 1000000000:
+        raise RegistryError(400, "Invalid timestamp: {}".format(value))
+    return int(match.group(1)) * 1000000000 + int(match.group(2))
+
+
+def lookup(data, field):
+    """Find all values at a dot-separated path within a resource, flattening any arrays along the way"""
+    values = [data]
+    for part in field.split("."):
+        found = []
+        for value in values:
+            if isinstance(value, dict) and part in value:
+                item = value[part]
+                if isinstance(item, list):
+                    found += item
+                else:
+                    found.append(item)
+        values = found
+    return values
+
+
+def query_string(value):
+    """Represent a JSON value in the form used by basic query parameters"""
+    if isinstance(value, str):
+        return value
+    return json.dumps(value)
+
+
+class RQLParser(object):
+    """Parses Resource Query Language expressions into (operator, args) tuples"""
+    TOKENS = re.compile(r"\s*([(),])\s*|([^(),]+)")
+
+    def parse(self, text):
+        self.tokens = [match.group(1) or match.group(2) for match in self.TOKENS.finditer(text)]
+        self.pos = 0
+        node = self._expression()
+        if self.pos != len(self.tokens):
+            raise RegistryError(400, "Unexpected trailing content in RQL expression")
+        return node
+
+    def _peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _take(self, expected=None):
+        token = self._peek()
+        if token is None or (expected is not None and token != expected):
+            raise RegistryError(400, "Malformed RQL expression")
+        self.pos += 1
+        return token
+
+    def _expression(self):
+        name = self._take()
+        if name in "(),":
+            raise RegistryError(400, "Malformed RQL expression")
+        self._take("(")
+        args = []
+        while self._peek() != ")":
+            args.append(self._argument())
+            if self._peek() == ",":
+                self._take(",")
+        self._take(")")
+        return name.strip(), args
+
+    def _argument(self):
+        if self._peek() == "(":
+            # Array of values, as used by in() and out()
+            self._take("(")
+            values = []
+            while self._peek() != ")":
+                values.append(self._value(self._take()))
+                if self._peek() == ",":
+                    self._take(",")
+            self._take(")")
+            return values
+        if self.pos + 1 < len(self.tokens) and self.tokens[self.pos + 1] == "(":
+            return self._expression()
+        return self._value(self._take())
+
+    def _value(self, token):
+        token = unquote(token.strip())
+        if token.startswith("string:"):
+            return token[len("string:"):]
+        elif token.startswith("number:"):
+            try:
+                return float(token[len("number:"):])
+            except ValueError:
+                raise RegistryError(400, "Invalid RQL number: {}".format(token))
+        elif token.startswith("boolean:"):
+            return token[len("boolean:"):] == "true"
+        elif token == "null":
+            return None
+        return token
+
+
+def _coerce(value, arg):
+    """Convert an RQL argument to be comparable with a resource value, or return None if they cannot be compared"""
+    if isinstance(value, bool) or isinstance(arg, bool):
+        return query_string(arg) if isinstance(value, str) else arg
+    if isinstance(value, (int, float)):
+        try:
+            return float(arg)
+        except (TypeError, ValueError):
+            return None
+    if isinstance(value, str):
+        return query_string(arg) if arg is not None else None
+    return arg
+
+
+def _compare(op, value, arg):
+    arg = _coerce(value, arg)
+    if op == "eq":
+        return value == arg
+    elif op == "ne":
+        return value != arg
+    if arg is None or type(arg) is bool or value is None:
+        return False
+    try:
+        if op == "lt":
+            return value < arg
+        elif op == "le":
+            return value <= arg
+        elif op == "gt":
+            return value > arg
+        elif op == "ge":
+            return value >= arg
+    except TypeError:
+        return False
+    return False
+
+
+def rql_match(node, data):
+    """Evaluate a parsed RQL expression against a resource"""
+    op, args = node
+    if op == "and":
+        return all(rql_match(arg, data) for arg in args)
+    elif op == "or":
+        return any(rql_match(arg, data) for arg in args)
+    elif op == "not":
+        return not rql_match(args[0], data)
+    if len(args) != 2 or not isinstance(args[0], str):
+        raise RegistryError(400, "RQL operator '{}' requires a property and a value".format(op))
+    values = lookup(data, args[0])
+    if op == "ne":
+        return not any(_compare("eq", value, args[1]) for value in values)
+    elif op in ["eq", "lt", "le", "gt", "ge"]:
+        return any(_compare(op, value, args[1]) for value in values)
+    elif op in ["in", "out"]:
+        options = args[1] if isinstance(args[1], list) else [args[1]]
+        found = any(_compare("eq", value, option) for value in values for option in options)
+        return found if op == "in" else not found
+    elif op == "matches":
+        try:
+            pattern = re.compile(query_string(args[1]))
+        except re.error:
+            raise RegistryError(400, "Invalid regular expression in RQL matches()")
+        return any(isinstance(value, str) and pattern.search(value) for value in values)
+    raise RegistryError(501, "RQL operator '{}' is not supported".format(op))
+
+
+def rql_validate(node):
+    """Check every operator in a parsed RQL expression is supported"""
+    op, args = node
+    if op in ["and", "or", "not"]:
+        for arg in args:
+            if not isinstance(arg, tuple):
+                raise RegistryError(400, "RQL operator '{}' requires expressions as arguments".format(op))
+            rql_validate(arg)
+    elif op not in ["eq", "ne", "lt", "le", "gt", "ge", "in", "out", "matches"]:
+        raise RegistryError(501, "RQL operator '{}' is not supported".format(op))
+
+
+class TimeIndex(object):
+    """Resource IDs ordered by timestamp, supporting the range scans needed for cursor pagination"""
+    def __init__(self):
+        self.stamps = []
+        self.ids = []
+        self.live = {}
+
+    def insert(self, res_id, stamp):
+        # Timestamps are issued in increasing order, so appending keeps the index sorted. Any earlier entry for the
+        # same ID is left in place and skipped until the index is next compacted.
+        self.live[res_id] = stamp
+        self.stamps.append(stamp)
+        self.ids.append(res_id)
+        self._compact()
+
+    def remove(self, res_id):
+        self.live.pop(res_id, None)
+        self._compact()
+
+    def _compact(self):
+        if len(self.stamps) > 2 * len(self.live) + 64:
+            entries = [(stamp, res_id) for stamp, res_id in zip(self.stamps, self.ids)
+                       if self.live.get(res_id) == stamp]
+            self.stamps = [entry[0] for entry in entries]
+            self.ids = [entry[1] for entry in entries]
+
+    def scan(self, since, until, ascending):
+        """Yield (stamp, id) for live entries where since < stamp <= until"""
+        lower = bisect.bisect_right(self.stamps, since)
+        upper = bisect.bisect_right(self.stamps, until)
+        positions = range(lower, upper) if ascending else range(upper - 1, lower - 1, -1)
+        for pos in positions:
+            res_id = self.ids[pos]
+            if self.live.get(res_id) == self.stamps[pos]:
+                yield self.stamps[pos], res_id
+
+
+class Record(object):
+    __slots__ = ["type", "id", "data", "api_version", "created", "updated", "node_id"]
+
+    def __init__(self, res_type, data, api_version, created, updated, node_id):
+        self.type = res_type
+        self.id = data["id"]
+        self.data = data
+        self.api_version = api_version
+        self.created = created
+        self.updated = updated
+        self.node_id = node_id
+
+
+class Subscription(object):
+    def __init__(self, sub_id, api_version, resource_path, params, max_update_rate_ms, persist, secure):
+        self.id = sub_id
+        self.api_version = api_version
+        self.resource_path = resource_path
+        self.params = params
+        self.max_update_rate_ms = max_update_rate_ms
+        self.persist = persist
+        self.secure = secure
+        self.ws_href = None
+        self.connections = []
+        self.pending = []
+        self.last_sent = 0
+        self.scheduled = False
+        self.selector = None
+
+    def json(self):
+        return {"id": self.id,
+                "ws_href": self.ws_href,
+                "max_update_rate_ms": self.max_update_rate_ms,
+                "persist": self.persist,
+                "secure": self.secure,
+                "resource_path": self.resource_path,
+                "params": self.params}
+
+
+class Selector(object):
+    """A compiled set of Query API filters which can be applied to resources"""
+    def __init__(self, args, api_version):
+        self.api_version = api_version
+        self.downgrade = args.get("query.downgrade")
+        if self.downgrade is not None:
+            if parse_version(self.downgrade) > parse_version(api_version):
+                raise RegistryError(400, "Downgrade version must not be greater than the API version")
+        self.basic = {key: value for key, value in args.items()
+                      if not key.startswith("query.") and not key.startswith("paging.")}
+        self.rql = None
+        if "query.rql" in args:
+            self.rql = RQLParser().parse(args["query.rql"])
+            rql_validate(self.rql)
+
+    def version_permitted(self, record_version):
+        """Check whether a resource registered at the given version may be returned by this query"""
+        if self.downgrade is None:
+            return record_version == self.api_version
+        return parse_version(self.downgrade) <= parse_version(record_version) <= parse_version(self.api_version)
+
+    def present(self, res_type, record):
+        """Return the resource data as it should be presented to this query"""
+        if self.downgrade is None or record.api_version == self.downgrade:
+            return record.data
+        return downgrade(res_type, record.data, record.api_version, self.downgrade)
+
+    def matches_data(self, data):
+        for field, expected in self.basic.items():
+            if not any(query_string(value) == expected for value in lookup(data, field)):
+                return False
+        if self.rql is not None and not rql_match(self.rql, data):
+            return False
+        return True
+
+    def matches(self, res_type, record):
+        if not self.version_permitted(record.api_version):
+            return False
+        return self.matches_data(self.present(res_type, record))
+
+    def candidates(self, index):
+        """Use the equality indexes to narrow down the set of IDs which might match, or None if all might"""
+        result = None
+        for field, expected in self.basic.items():
+            if field in index:
+                found = index[field].get(expected, set())
+                result = found if result is None else result & found
+        if self.rql is not None:
+            found = self._rql_candidates(self.rql, index)
+            if found is not None:
+                result = found if result is None else result & found
+        return result
+
+    def _rql_candidates(self, node, index):
+        op, args = node
+        if op == "eq" and isinstance(args[0], str) and args[0] in index and isinstance(args[1], str):
+            return index[args[0]].get(args[1], set())
+        elif op == "and":
+            result = None
+            for arg in args:
+                found = self._rql_candidates(arg, index)
+                if found is not None:
+                    result = found if result is None else result & found
+            return result
+        elif op == "or":
+            result = set()
+            for arg in args:
+                found = self._rql_candidates(arg, index)
+                if found is None:
+                    return None
+                result = result | found
+            return result
+        return None
+
+
+def downgrade(res_type, data, from_version, to_version):
+    """Remove the keys from a resource which were introduced after the version being downgraded to"""
+    data = json.loads(json.dumps(data))
+    for version in API_VERSIONS:
+        if parse_version(to_version) < parse_version(version) <= parse_version(from_version):
+            for key in DOWNGRADE_KEYS[version][res_type]:
+                parts = key.split(".")
+                parent = data
+                for part in parts[:-1]:
+                    parent = parent.get(part) if isinstance(parent, dict) else None
+                if isinstance(parent, dict):
+                    parent.pop(parts[-1], None)
+    return data
+
+
+class MemoryRegistry(object):
+    """
+    In-memory stand-in for an IS-04 Registration and Query API.
+    Intended for self-testing and benchmarking the IS-04-02 tests without an external registry.
+    """
+    def __init__(self, expiry_interval=12):
+        self.expiry_interval = expiry_interval
+        self.source_id = str(uuid.uuid4())
+        self.ws_port = None
+        self.lock = threading.RLock()
+        self.timers = threading.Condition(self.lock)
+        self.running = False
+        self.server = None
+        self.ws_server = None
+        self.threads = []
+        self.reset()
+
+    def reset(self):
+        """Remove all resources and subscriptions"""
+        with self.lock:
+            self.resources = {res_type: {} for res_type in RESOURCE_TYPES}
+            self.updated = {res_type: TimeIndex() for res_type in RESOURCE_TYPES}
+            self.created = {res_type: TimeIndex() for res_type in RESOURCE_TYPES}
+            self.index = {res_type: {field: {} for field in INDEXED_FIELDS} for res_type in RESOURCE_TYPES}
+            self.children = {"source": {}, "flow": {}}
+            self.owned = {}
+            self.health = {}
+            self.expiry_heap = []
+            self.send_heap = []
+            self.subscriptions = {}
+            self.last_stamp = 0
+
+    def next_stamp(self):
+        """Get a unique, increasing TAI timestamp in nanoseconds"""
+        secs, nanos = TestHelper.from_UTC(*divmod(time.time_ns(), 1000000000))
+        stamp = max(secs * 1000000000 + nanos, self.last_stamp + 1)
+        self.last_stamp = stamp
+        return stamp
+
+    def count(self):
+        with self.lock:
+            return sum(len(self.resources[res_type]) for res_type in RESOURCE_TYPES)
+
+    # Storage and indexing
+
+    def _find_owner(self, res_type, data):
+        if res_type == "node":
+            return data["id"]
+        for parent_type, key in PARENT_KEYS[res_type]:
+            parent = self.resources[parent_type].get(data.get(key))
+            if parent is not None:
+                return parent.node_id
+        return None
+
+    def _add_to_index(self, record):
+        for field in INDEXED_FIELDS:
+            for value in lookup(record.data, field):
+                if not isinstance(value, (dict, list)):
+                    self.index[record.type][field].setdefault(query_string(value), set()).add(record.id)
+        if record.type in self.children:
+            for parent_id in record.data.get("parents", []):
+                self.children[record.type].setdefault(parent_id, set()).add(record.id)
+        self.owned.setdefault(record.node_id, set()).add((record.type, record.id))
+
+    def _remove_from_index(self, record):
+        for field in INDEXED_FIELDS:
+            for value in lookup(record.data, field):
+                if not isinstance(value, (dict, list)):
+                    ids = self.index[record.type][field].get(query_string(value))
+                    if ids is not None:
+                        ids.discard(record.id)
+                        if not ids:
+                            del self.index[record.type][field][query_string(value)]
+        if record.type in self.children:
+            for parent_id in record.data.get("parents", []):
+                ids = self.children[record.type].get(parent_id)
+                if ids is not None:
+                    ids.discard(record.id)
+                    if not ids:
+                        del self.children[record.type][parent_id]
+        owned = self.owned.get(record.node_id)
+        if owned is not None:
+            owned.discard((record.type, record.id))
+
+    def register(self, res_type, data, api_version):
+        """Store a resource, returning True if it was newly created or False if it replaced an existing one"""
+        if res_type not in RESOURCE_TYPES:
+            raise RegistryError(400, "Unknown resource type: {}".format(res_type))
+        if not isinstance(data, dict) or not isinstance(data.get("id"), str):
+            raise RegistryError(400, "Resource data must be an object with a string 'id'")
+        with self.lock:
+            node_id = self._find_owner(res_type, data)
+            if node_id is None:
+                raise RegistryError(400, "Parent of {} {} is not registered".format(res_type, data["id"]))
+            stamp = self.next_stamp()
+            existing = self.resources[res_type].get(data["id"])
+            if existing is not None:
+                self._remove_from_index(existing)
+                record = Record(res_type, data, api_version, existing.created, stamp, node_id)
+            else:
+                record = Record(res_type, data, api_version, stamp, stamp, node_id)
+                self.created[res_type].insert(record.id, stamp)
+            self.resources[res_type][record.id] = record
+            self.updated[res_type].insert(record.id, stamp)
+            self._add_to_index(record)
+            if res_type == "node" and existing is None:
+                self.heartbeat(record.id)
+            self._notify(res_type, existing, record)
+            return existing is None
+
+    def get(self, res_type, res_id):
+        with self.lock:
+            return self.resources.get(res_type, {}).get(res_id)
+
+    def delete(self, res_type, res_id):
+        """Remove a resource, and for Nodes all resources which belong to them. Returns False if not found."""
+        with self.lock:
+            record = self.resources.get(res_type, {}).get(res_id)
+            if record is None:
+                return False
+            if res_type == "node":
+                # Remove sub-resources leaf-first so that subscribers never see an orphan
+                for child_type in reversed(RESOURCE_TYPES[1:]):
+                    for owned_type, owned_id in list(self.owned.get(res_id, [])):
+                        if owned_type == child_type:
+                            self._remove(self.resources[owned_type][owned_id])
+                self.owned.pop(res_id, None)
+                self.health.pop(res_id, None)
+            self._remove(record)
+            return True
+
+    def _remove(self, record):
+        del self.resources[record.type][record.id]
+        self.updated[record.type].remove(record.id)
+        self.created[record.type].remove(record.id)
+        self._remove_from_index(record)
+        self._notify(record.type, record, None)
+
+    # Health and expiry
+
+    def heartbeat(self, node_id):
+        """Update the health of a Node, returning its new health timestamp or None if it is not registered"""
+        with self.lock:
+            if node_id not in self.resources["node"]:
+                return None
+            deadline = time.monotonic() + self.expiry_interval
+            self.health[node_id] = deadline
+            heapq.heappush(self.expiry_heap, (deadline, node_id))
+            if self.expiry_heap[0][1] == node_id:
+                self.timers.notify()
+            return int(time.time())
+
+    def expire(self, now=None):
+        """Remove all Nodes whose health has expired, returning their IDs"""
+        now = time.monotonic() if now is None else now
+        expired = []
+        with self.lock:
+            while self.expiry_heap and self.expiry_heap[0][0] <= now:
+                deadline, node_id = heapq.heappop(self.expiry_heap)
+                # Heap entries superseded by a later heartbeat are stale and simply discarded
+                if self.health.get(node_id) == deadline:
+                    self.delete("node", node_id)
+                    expired.append(node_id)
+        return expired
+
+    # Queries
+
+    def query(self, res_type, api_version, args):
+        """
+        Perform a Query API request for a collection.
+        Returns the list of matching resources and, for paged versions of the API, the paging details.
+        """
+        if res_type not in RESOURCE_TYPES:
+            raise RegistryError(404, "Unknown resource type: {}".format(res_type))
+        selector = Selector(args, api_version)
+        paged = parse_version(api_version) >= (1, 1)
+        with self.lock:
+            candidates = selector.candidates(self.index[res_type])
+            if "query.ancestry_id" in args:
+                ancestry = self._ancestry(res_type, args)
+                candidates = ancestry if candidates is None else candidates & ancestry
+
+            if not paged:
+                records = self.resources[res_type].values()
+                if candidates is not None:
+                    records = [self.resources[res_type][res_id] for res_id in candidates]
+                return [selector.present(res_type, record) for record in records
+                        if selector.matches(res_type, record)], None
+
+            order = args.get("paging.order", "update")
+            if order not in ["update", "create"]:
+                raise RegistryError(400, "Invalid paging.order: {}".format(order))
+            try:
+                limit = int(args.get("paging.limit", DEFAULT_PAGING_LIMIT))
+            except ValueError:
+                raise RegistryError(400, "Invalid paging.limit")
+            limit = max(1, min(limit, MAX_PAGING_LIMIT))
+            since = str_to_stamp(args["paging.since"]) if "paging.since" in args else None
+            until = str_to_stamp(args["paging.until"]) if "paging.until" in args else self.last_stamp
+            time_index = self.updated[res_type] if order == "update" else self.created[res_type]
+
+            # With a 'since' the page begins from the oldest match after it, otherwise it ends at 'until'
+            ascending = since is not None
+            lower = since if since is not None else -1
+            if candidates is not None:
+                entries = sorted(((time_index.live[res_id], res_id) for res_id in candidates
+                                  if res_id in time_index.live), reverse=not ascending)
+                entries = (entry for entry in entries if lower < entry[0] <= until)
+            else:
+                entries = time_index.scan(lower, until, ascending)
+
+            page = []
+            for stamp, res_id in entries:
+                record = self.resources[res_type][res_id]
+                if selector.matches(res_type, record):
+                    page.append((stamp, record))
+                    if len(page) == limit:
+                        break
+            if ascending:
+                page.reverse()
+
+            full = len(page) == limit
+            if ascending:
+                paging_since = since
+                paging_until = page[0][0] if full else until
+            else:
+                paging_since = page[-1][0] - 1 if full else max(lower, 0)
+                paging_until = until
+            paging = {"limit": limit, "since": stamp_to_str(paging_since), "until": stamp_to_str(paging_until),
+                      "latest": stamp_to_str(self.last_stamp)}
+            return [selector.present(res_type, record) for stamp, record in page], paging
+
+    def _ancestry(self, res_type, args):
+        """Find the IDs of resources related to the ancestry_id by their 'parents' attributes"""
+        if res_type not in self.children:
+            raise RegistryError(501, "Ancestry queries are only supported for sources and flows")
+        ancestry_type = args.get("query.ancestry_type")
+        if ancestry_type not in ["children", "parents"]:
+            raise RegistryError(400, "query.ancestry_type must be 'children' or 'parents'")
+        generations = args.get("query.ancestry_generations", "all")
+        try:
+            generations = None if generations == "all" else int(generations)
+        except ValueError:
+            raise RegistryError(400, "Invalid query.ancestry_generations")
+
+        found = set()
+        frontier = [args["query.ancestry_id"]]
+        depth = 0
+        while frontier and (generations is None or depth < generations):
+            next_frontier = []
+            for res_id in frontier:
+                if ancestry_type == "children":
+                    related = self.children[res_type].get(res_id, set())
+                else:
+                    record = self.resources[res_type].get(res_id)
+                    related = record.data.get("parents", []) if record is not None else []
+                for related_id in related:
+                    if related_id not in found and related_id in self.resources[res_type]:
+                        found.add(related_id)
+                        next_frontier.append(related_id)
+            frontier = next_frontier
+            depth += 1
+        return found
+
+    # Subscriptions
+
+    def subscribe(self, api_version, body, ws_host):
+        """Create a subscription, or return a matching existing one. Returns (created, subscription)."""
+        if not isinstance(body, dict):
+            raise RegistryError(400, "Subscription request must be a JSON object")
+        resource_path = body.get("resource_path", "")
+        if resource_path not in [""] + ["/{}s".format(res_type) for res_type in RESOURCE_TYPES]:
+            raise RegistryError(400, "Invalid resource_path: {}".format(resource_path))
+        params = body.get("params", {})
+        if not isinstance(params, dict):
+            raise RegistryError(400, "Subscription params must be an object")
+        max_update_rate_ms = body.get("max_update_rate_ms", 100)
+        if not isinstance(max_update_rate_ms, int) or max_update_rate_ms < 0:
+            raise RegistryError(400, "Invalid max_update_rate_ms")
+        persist = bool(body.get("persist", False))
+        secure = bool(body.get("secure", False))
+        if secure:
+            raise RegistryError(501, "Secure WebSocket subscriptions are not supported")
+        selector = Selector({key: str(value) for key, value in params.items()}, api_version)
+
+        with self.lock:
+            for subscription in self.subscriptions.values():
+                if (subscription.api_version, subscription.resource_path, subscription.params,
+                        subscription.max_update_rate_ms, subscription.persist) == \
+                        (api_version, resource_path, params, max_update_rate_ms, persist):
+                    return False, subscription
+            subscription = Subscription(str(uuid.uuid4()), api_version, resource_path, params,
+                                        max_update_rate_ms, persist, secure)
+            subscription.selector = selector
+            subscription.ws_href = "ws://{}:{}/x-nmos/query/{}/subscriptions/{}".format(
+                ws_host, self.ws_port, api_version, subscription.id)
+            self.subscriptions[subscription.id] = subscription
+            return True, subscription
+
+    def unsubscribe(self, sub_id):
+        with self.lock:
+            subscription = self.subscriptions.pop(sub_id, None)
+            if subscription is None:
+                return False
+            connections = list(subscription.connections)
+        # Closing waits for any send in progress, which must not hold up every other request
+        for connection in connections:
+            connection.close()
+        return True
+
+    def _subscription_type(self, subscription):
+        return subscription.resource_path[1:-1] if subscription.resource_path else None
+
+    def _notify(self, res_type, pre, post):
+        """Queue a change to a resource for delivery to every subscription which it is relevant to"""
+        for subscription in self.subscriptions.values():
+            if self._subscription_type(subscription) not in [None, res_type] or not subscription.connections:
+                continue
+            selector = subscription.selector
+            event = {"path": (pre or post).id}
+            if pre is not None and selector.matches(res_type, pre):
+                event["pre"] = selector.present(res_type, pre)
+            if post is not None and selector.matches(res_type, post):
+                event["post"] = selector.present(res_type, post)
+            if "pre" not in event and "post" not in event:
+                continue
+            subscription.pending.append(event)
+            self._schedule(subscription)
+
+    def _schedule(self, subscription):
+        if subscription.scheduled:
+            return
+        due = max(time.monotonic(), subscription.last_sent + subscription.max_update_rate_ms / 1000.0)
+        subscription.scheduled = True
+        heapq.heappush(self.send_heap, (due, subscription.id))
+        if self.send_heap[0][1] == subscription.id:
+            self.timers.notify()
+
+    def _make_grain(self, subscription, events):
+        stamp = stamp_to_str(self.next_stamp())
+        return {"grain_type": "event",
+                "source_id": self.source_id,
+                "flow_id": subscription.id,
+                "origin_timestamp": stamp,
+                "sync_timestamp": stamp,
+                "creation_timestamp": stamp,
+                "rate": {"numerator": 0, "denominator": 1},
+                "duration": {"numerator": 0, "denominator": 1},
+                "grain": {"type": "urn:x-nmos:format:data.event",
+                          "topic": subscription.resource_path + "/",
+                          "data": events}}
+
+    def connect(self, sub_id, connection):
+        """Attach a WebSocket connection to a subscription and send it the initial sync grain"""
+        with self.lock:
+            subscription = self.subscriptions.get(sub_id)
+            if subscription is None:
+                return False
+            events = []
+            for res_type in RESOURCE_TYPES:
+                if self._subscription_type(subscription) not in [None, res_type]:
+                    continue
+                for record in self.resources[res_type].values():
+                    if subscription.selector.matches(res_type, record):
+                        data = subscription.selector.present(res_type, record)
+                        events.append({"path": record.id, "pre": data, "post": data})
+            grain = json.dumps(self._make_grain(subscription, events))
+            # The connection's send lock is taken before any change can be queued for it, so that the sync grain is
+            # delivered first without holding the registry lock while it is written to a slow client
+            connection.send_lock.acquire()
+            subscription.connections.append(connection)
+        try:
+            connection.write_text(grain)
+        finally:
+            connection.send_lock.release()
+        return True
+
+    def disconnect(self, sub_id, connection):
+        with self.lock:
+            subscription = self.subscriptions.get(sub_id)
+            if subscription is None:
+                return
+            if connection in subscription.connections:
+                subscription.connections.remove(connection)
+            if not subscription.connections and not subscription.persist:
+                del self.subscriptions[sub_id]
+
+    # Background timers for health expiry and rate-limited subscription delivery
+
+    def _run_timers(self):
+        while True:
+            outgoing = []
+            with self.lock:
+                if not self.running:
+                    return
+                self.expire()
+                now = time.monotonic()
+                while self.send_heap and self.send_heap[0][0] <= now:
+                    due, sub_id = heapq.heappop(self.send_heap)
+                    subscription = self.subscriptions.get(sub_id)
+                    if subscription is None:
+                        continue
+                    subscription.scheduled = False
+                    subscription.last_sent = now
+                    if subscription.pending:
+                        grain = json.dumps(self._make_grain(subscription, subscription.pending))
+                        subscription.pending = []
+                        outgoing += [(connection, grain) for connection in subscription.connections]
+                dues = [heap[0][0] for heap in [self.expiry_heap, self.send_heap] if heap]
+                if not outgoing:
+                    self.timers.wait(min(dues) - now if dues else None)
+            for connection, grain in outgoing:
+                connection.send_text(grain)
+
+    # Serving
+
+    def create_app(self):
+        """Create a Flask application serving the Registration and Query APIs from this registry"""
+        app = Flask(__name__)
+        app.url_map.strict_slashes = False
+        registry = self
+
+        def check_version(version):
+            if version not in API_VERSIONS:
+                raise RegistryError(404, "API version {} is not supported".format(version))
+
+        def collection_type(collection):
+            if not collection.endswith("s") or collection[:-1] not in RESOURCE_TYPES:
+                raise RegistryError(404, "Unknown resource type: {}".format(collection))
+            return collection[:-1]
+
+        def query_args():
+            return {key: request.args.get(key) for key in request.args}
+
+        @app.errorhandler(RegistryError)
+        def registry_error(error):
+            response = jsonify({"code": error.code, "error": error.message, "debug": None})
+            response.status_code = error.code
+            return response
+
+        @app.after_request
+        def cors(response):
+            response.headers["Access-Control-Allow-Origin"] = "*"
+            response.headers["Access-Control-Allow-Methods"] = "GET, PUT, POST, PATCH, HEAD, OPTIONS, DELETE"
+            response.headers["Access-Control-Allow-Headers"] = "Content-Type, Accept"
+            response.headers["Access-Control-Max-Age"] = "3600"
+            return response
+
+        @app.route('/', methods=["GET"])
+        def root():
+            return jsonify(["x-nmos/"])
+
+        @app.route('/x-nmos', methods=["GET"])
+        def apis():
+            return jsonify(["query/", "registration/"])
+
+        @app.route('/x-nmos/<api>', methods=["GET"])
+        def versions(api):
+            if api not in ["query", "registration"]:
+                raise RegistryError(404, "Unknown API: {}".format(api))
+            return jsonify([version + "/" for version in API_VERSIONS])
+
+        @app.route('/x-nmos/registration/<version>', methods=["GET"])
+        def registration_root(version):
+            check_version(version)
+            return jsonify(["resource/", "health/"])
+
+        @app.route('/x-nmos/registration/<version>/resource', methods=["POST"])
+        def register(version):
+            check_version(version)
+            body = request.get_json(silent=True)
+            if not isinstance(body, dict) or "type" not in body or "data" not in body:
+                raise RegistryError(400, "Registration must be an object with 'type' and 'data'")
+            created = registry.register(body["type"], body["data"], version)
+            response = jsonify(body["data"])
+            if created:
+                response.status_code = 201
+                response.headers["Location"] = "/x-nmos/registration/{}/resource/{}s/{}".format(
+                    version, body["type"], body["data"]["id"])
+            return response
+
+        @app.route('/x-nmos/registration/<version>/resource/<collection>/<res_id>', methods=["GET", "DELETE"])
+        def registration_resource(version, collection, res_id):
+            check_version(version)
+            res_type = collection_type(collection)
+            if request.method == "DELETE":
+                if not registry.delete(res_type, res_id):
+                    raise RegistryError(404, "Resource not found")
+                return "", 204
+            record = registry.get(res_type, res_id)
+            if record is None:
+                raise RegistryError(404, "Resource not found")
+            return jsonify(record.data)
+
+        @app.route('/x-nmos/registration/<version>/health/nodes/<node_id>', methods=["GET", "POST"])
+        def health(version, node_id):
+            check_version(version)
+            if request.method == "POST":
+                health = registry.heartbeat(node_id)
+            else:
+                with registry.lock:
+                    deadline = registry.health.get(node_id)
+                health = None if deadline is None else \
+                    int(time.time() + deadline - time.monotonic() - registry.expiry_interval)
+            if health is None:
+                raise RegistryError(404, "Node is not registered")
+            return jsonify({"health": health})
+
+        @app.route('/x-nmos/query/<version>', methods=["GET"])
+        def query_root(version):
+            check_version(version)
+            return jsonify(["subscriptions/"] + ["{}s/".format(res_type) for res_type in RESOURCE_TYPES])
+
+        @app.route('/x-nmos/query/<version>/subscriptions', methods=["GET", "POST"])
+        def subscriptions(version):
+            check_version(version)
+            if request.method == "POST":
+                ws_host = request.host.rsplit(":", 1)[0]
+                created, subscription = registry.subscribe(version, request.get_json(silent=True), ws_host)
+                response = jsonify(subscription.json())
+                if created:
+                    response.status_code = 201
+                    response.headers["Location"] = "/x-nmos/query/{}/subscriptions/{}".format(version,
+                                                                                              subscription.id)
+                return response
+            with registry.lock:
+                return jsonify([subscription.json() for subscription in registry.subscriptions.values()
+                                if subscription.api_version == version])
+
+        @app.route('/x-nmos/query/<version>/subscriptions/<sub_id>', methods=["GET", "DELETE"])
+        def subscription(version, sub_id):
+            check_version(version)
+            with registry.lock:
+                subscription = registry.subscriptions.get(sub_id)
+                if subscription is None:
+                    raise RegistryError(404, "Subscription not found")
+                if request.method == "GET":
+                    return jsonify(subscription.json())
+                if not subscription.persist:
+                    raise RegistryError(403, "Non-persistent subscriptions cannot be deleted")
+                registry.unsubscribe(sub_id)
+            return "", 204
+
+        @app.route('/x-nmos/query/<version>/<collection>', methods=["GET"])
+        def query_collection(version, collection):
+            check_version(version)
+            resources, paging = registry.query(collection_type(collection), version, query_args())
+            response = jsonify(resources)
+            if paging is not None:
+                response.headers["X-Paging-Limit"] = str(paging["limit"])
+                response.headers["X-Paging-Since"] = paging["since"]
+                response.headers["X-Paging-Until"] = paging["until"]
+                args = {key: value for key, value in query_args().items() if not key.startswith("paging.")}
+                args["paging.limit"] = paging["limit"]
+                if "paging.order" in request.args:
+                    args["paging.order"] = request.args["paging.order"]
+                links = [("first", {"paging.since": "0:0"}),
+                         ("prev", {"paging.until": paging["since"]}),
+                         ("next", {"paging.since": paging["until"]}),
+                         ("last", {"paging.until": paging["latest"]})]
+                response.headers["Link"] = ", ".join(
+                    '<{}?{}>; rel="{}"'.format(request.base_url, urlencode(dict(args, **params)), rel)
+                    for rel, params in links)
+            return response
+
+        @app.route('/x-nmos/query/<version>/<collection>/<res_id>', methods=["GET"])
+        def query_resource(version, collection, res_id):
+            check_version(version)
+            res_type = collection_type(collection)
+            record = registry.get(res_type, res_id)
+            if record is None:
+                raise RegistryError(404, "Resource not found")
+            if record.api_version != version:
+                raise RegistryError(409, "Resource is registered at API version {}".format(record.api_version))
+            return jsonify(record.data)
+
+        return app
+
+    def start(self, host="0.0.0.0", port=0, ws_port=0):
+        """Serve the APIs on background threads. A port of 0 selects an ephemeral port."""
+        self.ws_server = WebSocketServer((host, ws_port), self)
+        self.ws_port = self.ws_server.server_address[1]
+        self.server = make_server(host, port, self.create_app(), threaded=True)
+        self.running = True
+        self.threads = [threading.Thread(target=target, daemon=True)
+                        for target in [self.server.serve_forever, self.ws_server.serve_forever, self._run_timers]]
+        for thread in self.threads:
+            thread.start()
+        return self.server.server_port
+
+    def stop(self):
+        with self.lock:
+            self.running = False
+            self.timers.notify()
+        for server in [self.server, self.ws_server]:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+        self.server = None
+        self.ws_server = None
+
+
+class WebSocketConnection(object):
+    """A server side WebSocket connection which delivers text messages and answers control frames"""
+    def __init__(self, sock):
+        self.sock = sock
+        # Only sends time out, as clients need not send anything once connected
+        seconds = int(WS_SEND_TIMEOUT)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDTIMEO,
+                        struct.pack("ll", seconds, int((WS_SEND_TIMEOUT - seconds) * 1000000)))
+        self.send_lock = threading.Lock()
+        self.closed = False
+
+    def send_text(self, text):
+        self._send_frame(0x1, text.encode("utf-8"))
+
+    def write_text(self, text):
+        """Send a text message while the caller already holds the send lock"""
+        self._write_frame(0x1, text.encode("utf-8"))
+
+    def _send_frame(self, opcode, payload):
+        with self.send_lock:
+            self._write_frame(opcode, payload)
+
+    def _write_frame(self, opcode, payload):
+        length = len(payload)
+        if length < 126:
+            header = struct.pack("!BB", 0x80 | opcode, length)
+        elif length < 65536:
+            header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+        if self.closed:
+            return
+        try:
+            self.sock.sendall(header + payload)
+        except OSError:
+            # Also end serve, which may be waiting on a client that has stopped reading
+            self.closed = True
+            self._shutdown()
+
+    def _recv_exact(self, count):
+        data = b""
+        while len(data) < count:
+            chunk = self.sock.recv(count - len(data))
+            if not chunk:
+                raise ConnectionError("WebSocket closed")
+            data += chunk
+        return data
+
+    def serve(self):
+        """Read frames from the client until the connection is closed"""
+        try:
+            while not self.closed:
+                first, second = self._recv_exact(2)
+                opcode = first & 0x0F
+                length = second & 0x7F
+                if length == 126:
+                    length = struct.unpack("!H", self._recv_exact(2))[0]
+                elif length == 127:
+                    length = struct.unpack("!Q", self._recv_exact(8))[0]
+                mask = self._recv_exact(4) if second & 0x80 else b"\x00\x00\x00\x00"
+                payload = bytes(byte ^ mask[i % 4] for i, byte in enumerate(self._recv_exact(length)))
+                if opcode == 0x8:
+                    self._send_frame(0x8, payload[:2])
+                    break
+                elif opcode == 0x9:
+                    self._send_frame(0xA, payload)
+        except (ConnectionError, OSError):
+            pass
+        self.close()
+
+    def close(self):
+        with self.send_lock:
+            self.closed = True
+        self._shutdown()
+
+    def _shutdown(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+class WebSocketHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        head = b""
+        while b"\r\n\r\n" not in head and len(head) < 8192:
+            chunk = self.request.recv(1024)
+            if not chunk:
+                return
+            head += chunk
+        lines = head.split(b"\r\n\r\n")[0].decode("latin-1").split("\r\n")
+        try:
+            path = lines[0].split(" ")[1]
+        except IndexError:
+            return
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                key, value = line.split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+
+        sub_id = path.split("?")[0].rstrip("/").split("/")[-1]
+        key = headers.get("sec-websocket-key")
+        if key is None or headers.get("upgrade", "").lower() != "websocket":
+            self.request.sendall(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n")
+            return
+        with self.server.registry.lock:
+            found = sub_id in self.server.registry.subscriptions
+        if not found:
+            self.request.sendall(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n")
+            return
+
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode("ascii")).digest()).decode("ascii")
+        self.request.sendall("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                             "Sec-WebSocket-Accept: {}\r\n\r\n".format(accept).encode("ascii"))
+        connection = WebSocketConnection(self.request)
+        if self.server.registry.connect(sub_id, connection):
+            try:
+                connection.serve()
+            finally:
+                self.server.registry.disconnect(sub_id, connection)
+
+
+class WebSocketServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, registry):
+        self.registry = registry
+        socketserver.TCPServer.__init__(self, address, WebSocketHandler)
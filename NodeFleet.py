@@ -0,0 +1,198 @@
+# Copyright (C) 2018 British Broadcasting Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import copy
+import heapq
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import TestHelper
+
+RESOURCE_ORDER = ["node", "device", "source", "flow", "sender", "receiver"]
+
+
+def load_fixtures(version="v1.2"):
+    """Load the IS-04 resource fixtures used as templates for generated resources"""
+    fixtures = {}
+    for res_type in RESOURCE_ORDER:
+        with open("test_data/IS0402/{}_{}.json".format(version, res_type)) as res_data:
+            fixtures[res_type] = json.load(res_data)
+    return fixtures
+
+
+def make_resource_set(fixtures, label):
+    """Generate a complete Node, Device, Source, Flow, Sender and Receiver with unique, consistent IDs"""
+    resources = {res_type: copy.deepcopy(fixtures[res_type]) for res_type in RESOURCE_ORDER}
+    ids = {res_type: str(uuid.uuid4()) for res_type in RESOURCE_ORDER}
+    version = TestHelper.getTAITime()
+    for res_type in RESOURCE_ORDER:
+        resources[res_type]["id"] = ids[res_type]
+        resources[res_type]["version"] = version
+        resources[res_type]["label"] = "{} {}".format(label, res_type)
+    resources["device"]["node_id"] = ids["node"]
+    resources["device"]["senders"] = [ids["sender"]]
+    resources["device"]["receivers"] = [ids["receiver"]]
+    resources["source"]["device_id"] = ids["device"]
+    resources["flow"]["device_id"] = ids["device"]
+    resources["flow"]["source_id"] = ids["source"]
+    resources["sender"]["device_id"] = ids["device"]
+    resources["sender"]["flow_id"] = ids["flow"]
+    resources["receiver"]["device_id"] = ids["device"]
+    return [(res_type, resources[res_type]) for res_type in RESOURCE_ORDER]
+
+
+class VirtualNode(object):
+    def __init__(self, index, fixtures):
+        self.index = index
+        self.resources = make_resource_set(fixtures, "Virtual Node {}".format(index))
+        self.node_id = self.resources[0][1]["id"]
+        self.registered = False
+
+
+class NodeFleet(object):
+    """
+    Simulates a fleet of Nodes which register with, and heartbeat to, a Registration API.
+    All Nodes share a single scheduler, with HTTP requests made from a pool of worker threads.
+    """
+    def __init__(self, reg_url, node_count, duration, heartbeat_interval=5, workers=64, ramp_time=None):
+        self.reg_url = reg_url
+        self.duration = duration
+        self.heartbeat_interval = heartbeat_interval
+        self.workers = workers
+        # By default registrations are spread over one heartbeat interval to avoid a thundering herd
+        self.ramp_time = heartbeat_interval if ramp_time is None else ramp_time
+        fixtures = load_fixtures()
+        self.nodes = [VirtualNode(index, fixtures) for index in range(node_count)]
+
+        self.local = threading.local()
+        self.lock = threading.Condition()
+        self.schedule = []
+        self.sequence = 0
+        self.start_time = None
+        self.registration_latency = []
+        self.heartbeat_latency = []
+        self.schedule_lag = []
+        self.errors = {"registration": 0, "heartbeat": 0}
+        self.requests = {"registration": 0, "heartbeat": 0}
+        self.drops = []
+
+    def _session(self):
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = requests.Session()
+            self.local.session = session
+        return session
+
+    def _post(self, kind, url, data=None):
+        """Make a POST request, recording its latency and returning the status code or None on failure"""
+        start = time.monotonic()
+        try:
+            response = self._session().post(url, json=data, timeout=self.heartbeat_interval)
+            status = response.status_code
+        except requests.exceptions.RequestException:
+            status = None
+        latency = time.monotonic() - start
+        with self.lock:
+            self.requests[kind] += 1
+            if status is None or status >= 300:
+                # A 404 heartbeat is a dropped Node rather than an error, and is recorded separately
+                if not (kind == "heartbeat" and status == 404):
+                    self.errors[kind] += 1
+            else:
+                getattr(self, kind + "_latency").append(latency)
+        return status
+
+    def _enqueue(self, due, node):
+        with self.lock:
+            self.sequence += 1
+            heapq.heappush(self.schedule, (due, self.sequence, node))
+            self.lock.notify()
+
+    def _registered_count(self):
+        return sum(1 for node in self.nodes if node.registered)
+
+    def _step(self, due, node):
+        """Perform the next action for a Node, either (re-)registration or a heartbeat"""
+        with self.lock:
+            self.schedule_lag.append(max(0, time.monotonic() - due))
+        if not node.registered:
+            for res_type, data in node.resources:
+                if self._post("registration", self.reg_url + "resource", {"type": res_type, "data": data}) \
+                        not in [200, 201]:
+                    # Retry the whole registration on the next heartbeat interval
+                    self._enqueue(due + self.heartbeat_interval, node)
+                    return
+            node.registered = True
+        else:
+            status = self._post("heartbeat", self.reg_url + "health/nodes/" + node.node_id)
+            if status == 404:
+                node.registered = False
+                with self.lock:
+                    self.drops.append((time.monotonic() - self.start_time, self._registered_count() + 1))
+                # Re-register straight away, as a well behaved Node would
+                self._enqueue(time.monotonic(), node)
+                return
+        self._enqueue(due + self.heartbeat_interval, node)
+
+    def run(self):
+        """Run the fleet for the configured duration and return a report of its behaviour"""
+        self.start_time = time.monotonic()
+        end_time = self.start_time + self.duration
+        for node in self.nodes:
+            self._enqueue(self.start_time + self.ramp_time * node.index / max(len(self.nodes), 1), node)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while True:
+                with self.lock:
+                    now = time.monotonic()
+                    if now >= end_time:
+                        break
+                    if not self.schedule or self.schedule[0][0] > now:
+                        next_due = self.schedule[0][0] if self.schedule else end_time
+                        self.lock.wait(min(next_due, end_time) - now)
+                        continue
+                    due, sequence, node = heapq.heappop(self.schedule)
+                pool.submit(self._step, due, node)
+
+        registered = self._registered_count()
+        self._deregister()
+        return self.report(registered)
+
+    def _deregister(self):
+        """Remove the fleet's Nodes from the registry so that they do not linger until they expire"""
+        def delete(node):
+            try:
+                self._session().delete(self.reg_url + "resource/nodes/" + node.node_id,
+                                       timeout=self.heartbeat_interval)
+            except requests.exceptions.RequestException:
+                pass
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            list(pool.map(delete, [node for node in self.nodes if node.registered]))
+
+    def report(self, registered):
+        return {"nodes": len(self.nodes),
+                "registered": registered,
+                "duration": self.duration,
+                "registration_latency": self.registration_latency,
+                "heartbeat_latency": self.heartbeat_latency,
+                "schedule_lag": self.schedule_lag,
+                "requests": self.requests,
+                "errors": self.errors,
+                "drops": self.drops}
@@ -0,0 +1,166 @@
+# Copyright (C) 2018 British Broadcasting Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import TestHelper
+
+
+class NodeLoad(object):
+    """
+    Drives concurrent GET requests against a set of read endpoints for a fixed duration, as several controllers polling
+    a Node at once would. Each client cycles through every endpoint. A random sample of the responses to each endpoint
+    is kept, to be checked and compared with the endpoint's response before the load once the run is over, so that
+    checking does not hold back the load.
+    """
+    def __init__(self, targets, concurrency, duration, samples=20, check=None, timeout=None):
+        self.targets = OrderedDict(targets)
+        self.concurrency = concurrency
+        self.duration = duration
+        self.samples = samples
+        self.check = check
+        self.timeout = timeout
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.stats = OrderedDict()
+        self.start = None
+        self.end = None
+
+    def _session(self):
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = requests.Session()
+            self.local.session = session
+        return session
+
+    def _body(self, response):
+        try:
+            return response.json()
+        except ValueError:
+            return None
+
+    def baseline(self):
+        """Get each endpoint's JSON response before the load starts, or None where there is none"""
+        bodies = {}
+        for name, url in self.targets.items():
+            try:
+                response = self._session().get(url, timeout=self.timeout)
+                bodies[name] = self._body(response) if response.status_code == 200 else None
+            except requests.exceptions.RequestException:
+                bodies[name] = None
+        return bodies
+
+    def _record(self, name, latency, error, response):
+        with self.lock:
+            stats = self.stats[name]
+            stats["requests"] += 1
+            if error is not None:
+                stats["errors"] += 1
+                stats["error"] = error
+                if stats["first_error"] is None:
+                    stats["first_error"] = time.monotonic() - self.start
+                return
+            stats["latency"].append(latency)
+            # Reservoir sampling keeps an even sample across the whole run without knowing its length in advance
+            stats["seen"] += 1
+            if len(stats["sampled"]) < self.samples:
+                stats["sampled"].append(response)
+            else:
+                index = random.randrange(stats["seen"])
+                if index < self.samples:
+                    stats["sampled"][index] = response
+
+    def _client(self, offset):
+        names = list(self.targets)
+        index = offset
+        while time.monotonic() < self.end:
+            name = names[index % len(names)]
+            index += 1
+            start = time.monotonic()
+            try:
+                response = self._session().get(self.targets[name], timeout=self.timeout)
+            except requests.exceptions.RequestException as e:
+                self._record(name, time.monotonic() - start, "{}: {}".format(type(e).__name__, e), None)
+                continue
+            latency = time.monotonic() - start
+            if response.status_code != 200:
+                self._record(name, latency, "Response code {}".format(response.status_code), None)
+            else:
+                self._record(name, latency, None, response)
+
+    def _summarise(self, name, stats, before, elapsed):
+        invalid = 0
+        invalid_message = None
+        changed = 0
+        change = None
+        for response in stats["sampled"]:
+            if self.check is not None:
+                valid, message = self.check(name, response)
+                if not valid:
+                    invalid += 1
+                    invalid_message = message
+            body = self._body(response)
+            if before is not None and not same_json(before, body):
+                changed += 1
+                change = describe_changes(before, body)
+        return {"name": name, "requests": stats["requests"], "errors": stats["errors"], "error": stats["error"],
+                "first_error": stats["first_error"], "latency": stats["latency"],
+                "throughput": stats["requests"] / elapsed if elapsed else 0, "checked": len(stats["sampled"]),
+                "invalid": invalid, "invalid_message": invalid_message, "changed": changed, "change": change,
+                "compared": before is not None}
+
+    def run(self):
+        """
+        Run the load, returning the overall request count, throughput and latencies, and a report for each endpoint
+        """
+        before = self.baseline()
+        for name in self.targets:
+            self.stats[name] = {"requests": 0, "errors": 0, "error": None, "first_error": None, "latency": [],
+                                "seen": 0, "sampled": []}
+
+        self.start = time.monotonic()
+        self.end = self.start + self.duration
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            list(pool.map(self._client, range(self.concurrency)))
+        elapsed = time.monotonic() - self.start
+
+        endpoints = [self._summarise(name, self.stats[name], before[name], elapsed) for name in self.targets]
+        requests_made = sum(endpoint["requests"] for endpoint in endpoints)
+        return {"duration": elapsed, "requests": requests_made, "errors": sum(e["errors"] for e in endpoints),
+                "throughput": requests_made / elapsed if elapsed else 0,
+                "latency": [latency for endpoint in endpoints for latency in endpoint["latency"]],
+                "endpoints": endpoints}
+
+
+def same_json(before, after):
+    """Compare two JSON responses, ignoring the order of arrays where their items can be ordered"""
+    try:
+        return TestHelper.compare_json(before, after)
+    except TypeError:
+        return before == after
+
+
+def describe_changes(before, after):
+    """Describe how a JSON response differs from an earlier one, by the top level keys which differ"""
+    if isinstance(before, dict) and isinstance(after, dict):
+        keys = sorted(key for key in set(before) | set(after) if before.get(key) != after.get(key))
+        return "keys changed: {}".format(", ".join(keys))
+    return json.dumps(after)[:200]
@@ -0,0 +1,170 @@
+# Copyright (C) 2018 British Broadcasting Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import codecs
+import json
+import re
+from urllib.parse import urljoin, urlsplit, urlunsplit, parse_qsl, urlencode
+
+import requests
+
+import Config
+
+CHUNK_SIZE = 65536
+WHITESPACE = " \t\r\n"
+NON_WHITESPACE = re.compile(r"[^ \t\r\n]")
+
+
+class PagingError(Exception):
+    """A failure to retrieve or parse a page, with the HTTP status code where one was received"""
+    def __init__(self, message, status_code=None):
+        Exception.__init__(self, message)
+        self.status_code = status_code
+
+
+def iter_json_array(chunks):
+    """
+    Incrementally decode a JSON array from an iterable of byte chunks, yielding each element as soon as it is
+    complete. Raises json.JSONDecodeError for malformed JSON, or ValueError if the body is not an array.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    buffer = ""
+    pos = 0
+    state = "start"
+    eof = False
+    while True:
+        while True:
+            while pos < len(buffer) and buffer[pos] in WHITESPACE:
+                pos += 1
+            if pos == len(buffer):
+                break
+            if state == "start":
+                if buffer[pos] != "[":
+                    raise ValueError("Response is not a JSON array")
+                state = "first"
+                pos += 1
+            elif state == "first" and buffer[pos] == "]":
+                state = "end"
+                pos += 1
+            elif state in ["first", "value"]:
+                try:
+                    value, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    break
+                # A number may continue in the next chunk, so only accept a value once its delimiter has arrived
+                if not eof:
+                    delimiter = NON_WHITESPACE.search(buffer, end)
+                    if delimiter is None or delimiter.group() not in ",]":
+                        break
+                yield value
+                state = "separator"
+                pos = end
+            elif state == "separator" and buffer[pos] in ",]":
+                state = "value" if buffer[pos] == "," else "end"
+                pos += 1
+            else:
+                raise json.JSONDecodeError("Unexpected character in JSON array", buffer, pos)
+        if eof:
+            break
+        buffer = buffer[pos:]
+        pos = 0
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+            buffer += text_decoder.decode(b"", final=True)
+        else:
+            buffer += text_decoder.decode(chunk)
+    if state != "end":
+        raise json.JSONDecodeError("Incomplete JSON array", buffer, pos)
+
+
+def _default_get(url):
+    try:
+        return requests.get(url, stream=True, timeout=(Config.REQUEST_CONNECT_TIMEOUT, Config.REQUEST_READ_TIMEOUT))
+    except requests.exceptions.RequestException as e:
+        raise PagingError(str(e))
+
+
+class PagedWalker(object):
+    """
+    Iterates over the resources in a Query API collection, or any JSON array response, following cursor pagination
+    via 'Link: <...>; rel="next"' headers. Each page is parsed incrementally as it is received, so memory use is bound
+    by a single resource rather than the size of the page or collection.
+    """
+    def __init__(self, url, page_limit=None, get=None, max_pages=None):
+        self.url = url
+        self.page_limit = page_limit
+        self.get = get or _default_get
+        self.max_pages = max_pages
+        self.page_count = 0
+
+    def _first_url(self):
+        """Add paging parameters to the initial URL so that a paginated walk starts from the oldest resource"""
+        if self.page_limit is None:
+            return self.url
+        parts = urlsplit(self.url)
+        query = parse_qsl(parts.query)
+        keys = [key for key, value in query]
+        if "paging.since" not in keys and "paging.until" not in keys:
+            query.append(("paging.since", "0:0"))
+        if "paging.limit" not in keys:
+            query.append(("paging.limit", str(self.page_limit)))
+        return urlunsplit(parts._replace(query=urlencode(query, safe=":")))
+
+    def _items(self, url, response, counter):
+        try:
+            for item in iter_json_array(response.iter_content(CHUNK_SIZE)):
+                counter[0] += 1
+                yield item
+        except ValueError as e:
+            raise PagingError("Invalid JSON array received from {}: {}".format(url, e), response.status_code)
+
+    def iter_pages(self):
+        """Yield (response, items) for each page, where items is a generator which must be consumed in turn"""
+        url = self._first_url()
+        visited = set()
+        while url is not None and url not in visited:
+            if self.max_pages is not None and self.page_count >= self.max_pages:
+                return
+            visited.add(url)
+            response = self.get(url)
+            self.page_count += 1
+            try:
+                if response.status_code != 200:
+                    raise PagingError("GET {} returned {}".format(url, response.status_code), response.status_code)
+                counter = [0]
+                yield response, self._items(url, response, counter)
+            finally:
+                response.close()
+
+            # A short page, or a response without paging headers, marks the end of the collection
+            limit = response.headers.get("X-Paging-Limit")
+            if limit is None or not limit.isdigit() or counter[0] < int(limit):
+                return
+            next_link = response.links.get("next", {}).get("url")
+            url = urljoin(url, next_link) if next_link else None
+
+    def pages(self):
+        """Yield each page as a list of resources"""
+        for response, items in self.iter_pages():
+            yield list(items)
+
+    def __iter__(self):
+        for response, items in self.iter_pages():
+            for item in items:
+                yield item
@@ -0,0 +1,197 @@
+# Copyright (C) 2018 British Broadcasting Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# Number of lost updates described in detail for each step
+LOST_UPDATE_EXAMPLES = 3
+
+
+def staged_ports(body):
+    """Get the destination port of each leg from a staged parameters response, or None if it has none"""
+    try:
+        return [leg["destination_port"] for leg in body["transport_params"]]
+    except (KeyError, TypeError):
+        return None
+
+
+class PatchStress(object):
+    """
+    Changes the staged destination ports of Senders and Receivers from many concurrent clients, as several controllers
+    would, in steps of increasing concurrency. Clients cycle between a PATCH to a random port's /staged, a PATCH to the
+    same 'hot' port which every client writes to, and a bulk request for every port of one type.
+
+    After each step the staged parameters are read back. The value of a write is lost if a later write did not
+    overwrite it, and it is not the value read back. A write is only known to be overwritten by a successful write
+    which started after it finished, so the value read back must be that of one of the writes not known to be
+    overwritten.
+    """
+    def __init__(self, url, ports, choose, steps, step_duration, timeout=None):
+        self.url = url
+        self.ports = ports
+        self.choose = choose
+        self.steps = steps
+        self.step_duration = step_duration
+        self.timeout = timeout
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.hot = {port_type: ids[0] for port_type, ids in ports.items() if ids}
+        self.step = None
+
+    def _session(self):
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = requests.Session()
+            self.local.session = session
+        return session
+
+    def _staged_url(self, port_type, port_id):
+        return "{}single/{}s/{}/staged".format(self.url, port_type, port_id)
+
+    def _body(self, value):
+        return {"transport_params": [{"destination_port": port} for port in value]}
+
+    def _request(self, method, url, data):
+        """Make a request, recording its latency and any error, and returning the response and start and end times"""
+        start = time.monotonic()
+        try:
+            response = self._session().request(method, url, json=data, timeout=self.timeout)
+            error = None
+            if response.status_code != 200:
+                error = "{} {} returned {}".format(method, url, response.status_code)
+        except requests.exceptions.RequestException as e:
+            response = None
+            error = "{} {} failed: {}".format(method, url, e)
+        end = time.monotonic()
+        with self.lock:
+            self.step["requests"] += 1
+            self.step["latency"].append(end - start)
+            if error is not None:
+                self.step["errors"] += 1
+                self.step["error"] = self.step["error"] or error
+        return response, start, end
+
+    def _write(self, key, value, start, end, code):
+        with self.lock:
+            self.step["writes"].setdefault(key, []).append({"value": value, "start": start, "end": end, "code": code})
+
+    def _patch(self, port_type, port_id):
+        value = self.choose(port_type, port_id)
+        response, start, end = self._request("PATCH", self._staged_url(port_type, port_id), self._body(value))
+        self._write((port_type, port_id), value, start, end, response.status_code if response is not None else None)
+        if response is not None and response.status_code == 200:
+            try:
+                staged = staged_ports(response.json())
+            except ValueError:
+                staged = None
+            # The response should describe the staged parameters as this write left them
+            if staged != value:
+                with self.lock:
+                    self.step["inconsistent"] += 1
+                    self.step["inconsistency"] = "PATCH to {} of {} returned {}".format(
+                        self._staged_url(port_type, port_id), value, staged)
+
+    def _bulk(self, port_type):
+        values = {port_id: self.choose(port_type, port_id) for port_id in self.ports[port_type]}
+        data = [{"id": port_id, "params": self._body(value)} for port_id, value in values.items()]
+        response, start, end = self._request("POST", "{}bulk/{}s".format(self.url, port_type), data)
+        codes = {}
+        # Where the whole request failed, each port's write has the request's status code
+        default = response.status_code if response is not None and response.status_code != 200 else None
+        if response is not None and response.status_code == 200:
+            try:
+                codes = {item["id"]: item.get("code") for item in response.json()}
+            except (ValueError, KeyError, TypeError):
+                pass
+        for port_id, value in values.items():
+            self._write((port_type, port_id), value, start, end, codes.get(port_id, default))
+
+    def _client(self, offset):
+        port_types = sorted(self.hot)
+        keys = [(port_type, port_id) for port_type in port_types for port_id in self.ports[port_type]]
+        index = offset
+        while time.monotonic() < self.step["end"]:
+            operation = index % 3
+            port_type = port_types[(index // 3) % len(port_types)]
+            index += 1
+            if operation == 0:
+                self._patch(*random.choice(keys))
+            elif operation == 1:
+                self._patch(port_type, self.hot[port_type])
+            else:
+                self._bulk(port_type)
+
+    def _allowed(self, writes):
+        """Get the values which may be staged after a set of writes, or None if none are known to have succeeded"""
+        succeeded = [write["start"] for write in writes if write["code"] == 200]
+        if not succeeded:
+            return None
+        last_start = max(succeeded)
+        # A write with an error may or may not have been applied, but one which was rejected must not have been
+        return [write["value"] for write in writes
+                if write["end"] >= last_start and not (write["code"] is not None and 400 <= write["code"] < 500)]
+
+    def _read_back(self, step):
+        lost = []
+        for (port_type, port_id), writes in sorted(step["writes"].items()):
+            allowed = self._allowed(writes)
+            if allowed is None:
+                continue
+            url = self._staged_url(port_type, port_id)
+            try:
+                response = self._session().get(url, timeout=self.timeout)
+                staged = staged_ports(response.json()) if response.status_code == 200 else None
+            except (requests.exceptions.RequestException, ValueError):
+                staged = None
+            if staged not in allowed:
+                lost.append("{} has {} staged, expected one of {}".format(url, staged, allowed[:LOST_UPDATE_EXAMPLES]))
+        return lost
+
+    def run_step(self, concurrency):
+        """Run one step of the stress at a given concurrency, returning its measurements"""
+        start = time.monotonic()
+        self.step = {"concurrency": concurrency, "requests": 0, "errors": 0, "error": None, "latency": [],
+                     "inconsistent": 0, "inconsistency": None, "writes": {}, "end": start + self.step_duration}
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(self._client, range(concurrency)))
+        elapsed = time.monotonic() - start
+
+        step = self.step
+        lost = self._read_back(step)
+        return {"concurrency": concurrency, "requests": step["requests"], "errors": step["errors"],
+                "error": step["error"], "latency": step["latency"],
+                "throughput": step["requests"] / elapsed if elapsed else 0,
+                "writes": sum(len(writes) for writes in step["writes"].values()),
+                "inconsistent": step["inconsistent"], "inconsistency": step["inconsistency"],
+                "lost": len(lost), "lost_examples": lost[:LOST_UPDATE_EXAMPLES],
+                "ok": step["errors"] == 0 and step["inconsistent"] == 0 and not lost}
+
+    def run(self):
+        """
+        Run each step in turn, stopping after the first with errors or inconsistent state. Returns the measurements of
+        each step run, and the concurrency of the first failing step or None.
+        """
+        report = {"steps": [], "failed_at": None}
+        for concurrency in self.steps:
+            step = self.run_step(concurrency)
+            report["steps"].append(step)
+            if not step["ok"]:
+                report["failed_at"] = concurrency
+                break
+        return report
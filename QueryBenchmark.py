@@ -0,0 +1,216 @@
+# Copyright (C) 2018 British Broadcasting Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import copy
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+import requests
+
+import TestHelper
+from NodeFleet import load_fixtures, make_resource_set
+from PagedWalker import PagedWalker, PagingError
+
+# Number of synthetic resources attached to each seeded Node and Device
+RESOURCES_PER_NODE = 1000
+
+# Number of distinct labels used, so that filters select roughly 1 in LABEL_GROUPS resources
+LABEL_GROUPS = 10
+
+
+class QueryBenchmark(object):
+    """
+    Seeds a registry with synthetic Sources and Flows, then measures Query API latency for a range of query shapes.
+    Sources and Flows are registered in parent chains of a configurable depth to exercise ancestry queries.
+    """
+    def __init__(self, reg_url, query_url, resource_count, tree_depth=10, repeats=20, page_limit=100, workers=32):
+        self.reg_url = reg_url
+        self.query_url = query_url
+        self.resource_count = resource_count
+        self.tree_depth = tree_depth
+        self.repeats = repeats
+        self.page_limit = page_limit
+        self.workers = workers
+        self.run_id = str(uuid.uuid4())[:8]
+
+        self.local = threading.local()
+        self.fixtures = load_fixtures()
+        self.parents = []
+        self.chains = []
+        self.stop_heartbeats = threading.Event()
+
+    def _session(self):
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = requests.Session()
+            self.local.session = session
+        return session
+
+    def label(self, group):
+        return "qb-{}-{}".format(self.run_id, group)
+
+    def _build(self):
+        """Generate the synthetic resources, grouped into chains which must be registered in order"""
+        chain_items = []
+        for index in range(0, self.resource_count, 2):
+            if index % RESOURCES_PER_NODE == 0:
+                self.parents.append(make_resource_set(self.fixtures, "Query Benchmark")[:2])
+            device_id = self.parents[-1][1][1]["id"]
+            position = (index // 2) % self.tree_depth
+            if position == 0:
+                chain_items = []
+                self.chains.append(chain_items)
+            parent = chain_items[-2:] if chain_items else None
+
+            source = copy.deepcopy(self.fixtures["source"])
+            source["id"] = str(uuid.uuid4())
+            source["device_id"] = device_id
+            source["label"] = self.label((index // 2) % LABEL_GROUPS)
+            source["parents"] = [parent[0][1]["id"]] if parent else []
+            source["version"] = TestHelper.getTAITime()
+
+            flow = copy.deepcopy(self.fixtures["flow"])
+            flow["id"] = str(uuid.uuid4())
+            flow["device_id"] = device_id
+            flow["source_id"] = source["id"]
+            flow["label"] = source["label"]
+            flow["parents"] = [parent[1][1]["id"]] if parent else []
+            flow["version"] = source["version"]
+
+            chain_items += [("source", source), ("flow", flow)]
+
+    def _post_all(self, resources):
+        for res_type, data in resources:
+            response = self._session().post(self.reg_url + "resource", json={"type": res_type, "data": data},
+                                            timeout=10)
+            if response.status_code not in [200, 201]:
+                raise Exception("Registration of {} returned {}".format(res_type, response.status_code))
+
+    def _heartbeat_node(self, parent):
+        try:
+            self._session().post(self.reg_url + "health/nodes/" + parent[0][1]["id"], timeout=5)
+        except requests.exceptions.RequestException:
+            pass
+
+    def _heartbeat(self):
+        """Keep the seeded Nodes alive for the duration of the benchmark"""
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            while not self.stop_heartbeats.wait(5):
+                list(pool.map(self._heartbeat_node, self.parents))
+
+    def seed(self):
+        """Register all synthetic resources, returning the time taken"""
+        self._build()
+        start = time.monotonic()
+        for parent in self.parents:
+            self._post_all(parent)
+        threading.Thread(target=self._heartbeat, daemon=True).start()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            list(pool.map(self._post_all, self.chains))
+        return time.monotonic() - start
+
+    def cleanup(self):
+        self.stop_heartbeats.set()
+        for parent in self.parents:
+            try:
+                self._session().delete(self.reg_url + "resource/nodes/" + parent[0][1]["id"], timeout=10)
+            except requests.exceptions.RequestException:
+                pass
+
+    def _timed_get(self, url):
+        start = time.monotonic()
+        response = self._session().get(url, timeout=30)
+        return response, time.monotonic() - start
+
+    def measure(self, path):
+        """Repeat a query, returning its latencies, error count and the status code of any failure"""
+        latencies = []
+        errors = 0
+        status = None
+        for _ in range(self.repeats):
+            try:
+                response, latency = self._timed_get(self.query_url + path)
+            except requests.exceptions.RequestException:
+                errors += 1
+                continue
+            if response.status_code == 200:
+                latencies.append(latency)
+            else:
+                errors += 1
+                status = response.status_code
+        return {"latency": latencies, "errors": errors, "status": status}
+
+    def measure_walk(self, collection):
+        """Walk an entire collection page by page, returning per-page latencies and the total walk time"""
+        latencies = []
+        count = 0
+
+        def get(url):
+            return self._session().get(url, timeout=30, stream=True)
+
+        pages = PagedWalker(self.query_url + collection, page_limit=self.page_limit, get=get).pages()
+        start = time.monotonic()
+        while True:
+            page_start = time.monotonic()
+            try:
+                page = next(pages)
+            except StopIteration:
+                break
+            except (PagingError, requests.exceptions.RequestException) as e:
+                return {"latency": latencies, "errors": 1, "status": getattr(e, "status_code", None), "count": count,
+                        "duration": time.monotonic() - start}
+            latencies.append(time.monotonic() - page_start)
+            count += len(page)
+        return {"latency": latencies, "errors": 0, "status": None, "count": count,
+                "duration": time.monotonic() - start}
+
+    def query_shapes(self, downgrade_version=None):
+        """The query shapes to benchmark, as (name, path) pairs"""
+        label = quote(self.label(0), safe="")
+        other = quote(self.label(1), safe="")
+        root_source = self.chains[0][0][1]["id"]
+        leaf_flow = self.chains[0][-1][1]["id"]
+        shapes = [
+            ("Basic filter on label", "sources?label={}".format(label)),
+            ("Basic filter on two attributes", "flows?label={}&format=urn:x-nmos:format:video".format(label)),
+            ("RQL single comparison", "sources?query.rql=eq(label,{})".format(label)),
+            ("RQL conjunction", "flows?query.rql=and(eq(label,{}),eq(format,urn%3Ax-nmos%3Aformat%3Avideo))"
+                                .format(label)),
+            ("RQL disjunction and negation", "flows?query.rql=and(or(eq(label,{}),eq(label,{})),"
+                                             "not(eq(media_type,audio%2FL24)))".format(label, other)),
+            ("RQL regular expression", "sources?query.rql=and(matches(label,{}),ne(format,"
+                                       "urn%3Ax-nmos%3Aformat%3Aaudio))".format(quote("^qb-" + self.run_id))),
+            ("Ancestry children of a root Source", "sources?query.ancestry_id={}&query.ancestry_type=children"
+                                                   .format(root_source)),
+            ("Ancestry parents of a leaf Flow", "flows?query.ancestry_id={}&query.ancestry_type=parents"
+                                                .format(leaf_flow))
+        ]
+        if downgrade_version is not None:
+            shapes += [("Downgrade query on Sources", "sources?label={}&query.downgrade={}".format(
+                label, downgrade_version))]
+        return shapes
+
+    def run(self, downgrade_version=None):
+        """Seed the registry and measure each query shape. Returns the seeding time and per-shape measurements."""
+        try:
+            seed_time = self.seed()
+            results = [("Full pagination walk of Sources", self.measure_walk("sources"))]
+            for name, path in self.query_shapes(downgrade_version):
+                results.append((name, self.measure(path)))
+        finally:
+            self.cleanup()
+        return seed_time, results
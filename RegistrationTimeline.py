@@ -0,0 +1,122 @@
+# Copyright (C) 2018 British Broadcasting Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+
+RESOURCE_TYPES = ["node", "device", "source", "flow", "sender", "receiver"]
+
+
+class RegistrationTimeline(object):
+    """
+    Records when a mock registry was advertised and when each Node's registrations and heartbeats arrived, all on a
+    monotonic clock, so that the time taken for a Node to become fully visible can be reported.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.advertised = None
+            self.registrations = []
+            self.first_seen = {}
+            self.heartbeats = {}
+
+    def advertise(self, arrival=None):
+        """Mark the time at which the registry was advertised, from which all other times are measured"""
+        with self.lock:
+            self.advertised = arrival or time.monotonic()
+
+    def registration(self, res_type, data, arrival):
+        if not isinstance(data, dict) or "id" not in data:
+            return
+        parent = data.get("node_id") if res_type == "device" else data.get("device_id")
+        with self.lock:
+            self.registrations.append((arrival, res_type, data["id"], parent))
+            self.first_seen.setdefault(data["id"], arrival)
+
+    def heartbeat(self, node_id, arrival):
+        with self.lock:
+            self.heartbeats.setdefault(node_id, arrival)
+
+    def _owners(self):
+        """Map each registered resource ID to the ID of the Node it belongs to, via its Device where necessary"""
+        owners = {}
+        devices = {}
+        for arrival, res_type, res_id, parent in self.registrations:
+            if res_type == "node":
+                owners[res_id] = res_id
+            elif res_type == "device":
+                devices[res_id] = parent
+                owners[res_id] = parent
+        for arrival, res_type, res_id, parent in self.registrations:
+            if res_type not in ["node", "device"]:
+                owners[res_id] = devices.get(parent)
+        return owners
+
+    def node_ids(self):
+        """Get the IDs of the Nodes registered, in the order they first registered"""
+        with self.lock:
+            node_ids = [res_id for arrival, res_type, res_id, parent in self.registrations if res_type == "node"]
+        return sorted(set(node_ids), key=node_ids.index)
+
+    def milestones(self, node_id, expected_ids=None):
+        """
+        Get a Node's milestones as (label, seconds since advertisement) in order of occurrence. The resource set is
+        complete once every expected ID has been registered, or if none are given, at the last registration seen.
+        """
+        with self.lock:
+            advertised = start = self.advertised
+            owners = self._owners()
+            registrations = [entry for entry in self.registrations if owners.get(entry[2]) == node_id]
+            heartbeat = self.heartbeats.get(node_id)
+            first_seen = dict(self.first_seen)
+        if start is None:
+            start = registrations[0][0] if registrations else heartbeat
+
+        events = []
+        if advertised is not None:
+            events.append(("mDNS advertisement", 0.0))
+        for res_type in RESOURCE_TYPES:
+            arrivals = [arrival for arrival, entry_type, res_id, parent in registrations if entry_type == res_type]
+            if arrivals:
+                events.append(("first {}".format(res_type), min(arrivals) - start))
+        if expected_ids is not None:
+            if expected_ids and all(res_id in first_seen for res_id in expected_ids):
+                events.append(("complete", max(first_seen[res_id] for res_id in expected_ids) - start))
+        elif registrations:
+            events.append(("complete", max(arrival for arrival, res_type, res_id, parent in registrations) - start))
+        if heartbeat is not None:
+            events.append(("first heartbeat", heartbeat - start))
+        return sorted(events, key=lambda event: event[1])
+
+    def summary(self, node_id, expected_ids=None):
+        """Get a Node's time to first registration and to complete registration, and the expected IDs not seen"""
+        events = dict(self.milestones(node_id, expected_ids))
+        with self.lock:
+            missing = [res_id for res_id in expected_ids or [] if res_id not in self.first_seen]
+        return {"first": events.get("first node"), "complete": events.get("complete"), "missing": missing}
+
+    def waterfall(self, node_id, expected_ids=None):
+        """Describe a Node's milestones as a single line, each with its offset and the gap since the previous one"""
+        parts = []
+        previous = None
+        for label, offset in self.milestones(node_id, expected_ids):
+            if previous is None:
+                parts.append("{} {:.0f} ms".format(label, offset * 1000))
+            else:
+                parts.append("{} {:.0f} ms (+{:.0f} ms)".format(label, offset * 1000, (offset - previous) * 1000))
+            previous = offset
+        return " > ".join(parts)
@@ -12,32 +12,58 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import socket
+import threading
 import time
+from collections import deque
 
-from flask import request, jsonify, abort, Blueprint
+from flask import Flask, request, jsonify, abort, Blueprint
+from werkzeug.serving import make_server
+
+import Config
+from FaultInjector import FaultInjector
+from HeartbeatAnalyser import HeartbeatAnalyser
+from RegistrationTimeline import RegistrationTimeline
 
 
 class Registry(object):
+    """
+    A mock Registration API which records the registrations and heartbeats it receives. Times are taken from a
+    monotonic clock as each request arrives.
+    """
     def __init__(self):
         self.last_time = 0
         self.last_hb_time = 0
         self.data = []
-        self.heartbeats = []
+        self.heartbeats = deque(maxlen=Config.HEARTBEAT_HISTORY)
+        self.heartbeat_analyser = HeartbeatAnalyser(min_intervals=Config.HEARTBEAT_MIN_INTERVALS,
+                                                    precision=Config.HEARTBEAT_PRECISION)
+        self.timeline = RegistrationTimeline()
+        self.faults = FaultInjector()
         self.enabled = False
+        self.server = None
 
     def reset(self):
-        self.last_time = time.time()
+        self.last_time = time.monotonic()
         self.last_hb_time = 0
         self.data = []
-        self.heartbeats = []
-
-    def add(self, headers, payload):
-        self.last_time = time.time()
+        self.heartbeats = deque(maxlen=Config.HEARTBEAT_HISTORY)
+        self.heartbeat_analyser = HeartbeatAnalyser(min_intervals=Config.HEARTBEAT_MIN_INTERVALS,
+                                                    precision=Config.HEARTBEAT_PRECISION)
+        self.timeline.reset()
+        self.faults.reset()
+
+    def add(self, headers, payload, arrival=None):
+        self.last_time = arrival or time.monotonic()
         self.data.append((self.last_time, {"headers": headers, "payload": payload}))
+        if isinstance(payload, dict):
+            self.timeline.registration(payload.get("type"), payload.get("data"), self.last_time)
 
-    def heartbeat(self, headers, payload, node_id):
-        self.last_hb_time = time.time()
+    def heartbeat(self, headers, payload, node_id, arrival=None):
+        self.last_hb_time = arrival or time.monotonic()
         self.heartbeats.append((self.last_hb_time, {"headers": headers, "payload": payload, "node_id": node_id}))
+        self.heartbeat_analyser.add(self.last_hb_time)
+        self.timeline.heartbeat(node_id, self.last_hb_time)
 
     def get_data(self):
         return self.data
@@ -51,25 +77,117 @@ class Registry(object):
     def disable(self):
         self.enabled = False
 
-
+    def start(self, host="0.0.0.0", port=0, router=None):
+        """
+        Serve this registry on its own port on a background thread. A port of 0 selects an ephemeral port. Requests
+        from addresses claimed in the router by other test runs are passed to their registries instead.
+        """
+        app = Flask(__name__)
+        app.register_blueprint(create_registry_api(self, router))
+        self.server = make_server(host, port, app, threaded=True)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server.server_port
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+class RegistryRouter(object):
+    """
+    Maps the source address of each Node under test to the mock registry of the test run it belongs to, so that
+    concurrent runs keep separate records whichever advertised registry a Node happens to use
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = {}
+
+    def add(self, address, registry):
+        with self.lock:
+            if address in self.routes and self.routes[address] is not registry:
+                raise Exception("A test run for the Node at {} is already in progress".format(address))
+            self.routes[address] = registry
+
+    def remove(self, address):
+        with self.lock:
+            self.routes.pop(address, None)
+
+    def resolve(self, address):
+        """Get the registry for requests from an address, or None if no test run has claimed it"""
+        with self.lock:
+            return self.routes.get(address)
+
+
+def inject_fault(registry, endpoint, arrival):
+    """Apply any fault configured for an endpoint, returning a response to send in place of normal handling"""
+    fault = registry.faults.next_fault(endpoint, arrival)
+    if fault is None:
+        return None
+    if fault.latency:
+        time.sleep(fault.latency)
+    if fault.drop:
+        registry.faults.record(arrival, endpoint, "dropped")
+        sock = request.environ.get("werkzeug.socket")
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            return "", 500
+        # Without access to the socket the nearest equivalent is a server error
+        return jsonify({"code": 500, "error": "Injected dropped connection", "debug": None}), 500
+    if fault.status is not None:
+        registry.faults.record(arrival, endpoint, fault.status)
+        return jsonify({"code": fault.status, "error": "Injected fault", "debug": None}), fault.status
+    return None
+
+
+def create_registry_api(default_registry, router=None):
+    """
+    Create a blueprint serving the Registration API endpoints of a mock registry, routing requests by source address
+    if a router is given
+    """
+    registry_api = Blueprint('registry_api', __name__)
+
+    def target():
+        routed = router.resolve(request.remote_addr) if router is not None else None
+        return routed or default_registry
+
+    # IS-04 resources
+    @registry_api.route('/x-nmos/registration/<version>/resource', methods=["POST"])
+    def reg_page(version):
+        arrival = time.monotonic()
+        registry = target()
+        if not registry.enabled:
+            abort(500)
+        fault_response = inject_fault(registry, "resource", arrival)
+        if fault_response is not None:
+            return fault_response
+        registry.faults.record(arrival, "resource", 200)
+        registry.add(dict(request.headers), request.json, arrival)
+        # TODO: Ensure status code returned is correct
+        return jsonify(request.json["data"])
+
+    @registry_api.route('/x-nmos/registration/<version>/health/nodes/<node_id>', methods=["POST"])
+    def heartbeat(version, node_id):
+        arrival = time.monotonic()
+        registry = target()
+        if not registry.enabled:
+            abort(404)
+        fault_response = inject_fault(registry, "heartbeat", arrival)
+        if fault_response is not None:
+            return fault_response
+        registry.faults.record(arrival, "heartbeat", 200)
+        registry.heartbeat(dict(request.headers), request.json, node_id, arrival)
+        # TODO: Ensure status code returned is correct
+        return jsonify({"health": int(time.time())})
+
+    return registry_api
+
+
+# Requests from Nodes which are not under test are recorded by the shared REGISTRY
+ROUTER = RegistryRouter()
 REGISTRY = Registry()
-REGISTRY_API = Blueprint('registry_api', __name__)
-
-
-# IS-04 resources
-@REGISTRY_API.route('/x-nmos/registration/<version>/resource', methods=["POST"])
-def reg_page(version):
-    if not REGISTRY.enabled:
-        abort(500)
-    REGISTRY.add(request.headers, request.json)
-    # TODO: Ensure status code returned is correct
-    return jsonify(request.json["data"])
-
-
-@REGISTRY_API.route('/x-nmos/registration/<version>/health/nodes/<node_id>', methods=["POST"])
-def heartbeat(version, node_id):
-    if not REGISTRY.enabled:
-        abort(404)
-    REGISTRY.heartbeat(request.headers, request.json, node_id)
-    # TODO: Ensure status code returned is correct
-    return jsonify({"health": int(time.time())})
+REGISTRY_API = create_registry_api(REGISTRY, ROUTER)
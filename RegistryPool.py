@@ -0,0 +1,97 @@
+# Copyright (C) 2018 British Broadcasting Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import socket
+
+import netifaces
+from zeroconf import ServiceInfo, Zeroconf
+
+from Registry import Registry
+
+REGISTRATION_SERVICE_TYPE = "_nmos-registration._tcp.local."
+
+
+def default_address():
+    """Get the IPv4 address of the interface holding the default route"""
+    default_gw_interface = netifaces.gateways()['default'][netifaces.AF_INET][1]
+    return netifaces.ifaddresses(default_gw_interface)[netifaces.AF_INET][0]['addr']
+
+
+def registration_service_info(name, address, port, api_version, pri):
+    """Build the mDNS advertisement for a Registration API"""
+    # TODO: Set api_ver to just the version under test. Later test support for parsing CSV string
+    txt = {'api_ver': api_version, 'api_proto': 'http', 'pri': str(pri)}
+    return ServiceInfo(REGISTRATION_SERVICE_TYPE,
+                       "{}.{}".format(name, REGISTRATION_SERVICE_TYPE),
+                       socket.inet_aton(address), port, 0, 0,
+                       txt, "nmos-test.local.")
+
+
+class RegistryPool(object):
+    """
+    A set of mock registries, each served on its own ephemeral port and advertised via mDNS with its own priority, so
+    that a Node's choice of registry and its failover between them can be observed. The run_id is included in each
+    service name so that the pools of concurrent test runs do not clash.
+    """
+    def __init__(self, priorities, api_version, run_id, address=None):
+        self.priorities = sorted(priorities)
+        self.api_version = api_version
+        self.run_id = run_id
+        self.address = address
+        self.registries = {}
+        self.services = []
+        self.zeroconf = None
+
+    def start(self):
+        """Start every registry and advertise it, returning the map of priority to registry"""
+        self.address = self.address or default_address()
+        self.zeroconf = Zeroconf()
+        for pri in self.priorities:
+            registry = Registry()
+            registry.reset()
+            # Recorded as soon as it is started, so that stop cleans up after a start which fails part way
+            self.registries[pri] = registry
+            port = registry.start()
+            registry.enable()
+            info = registration_service_info("NMOS Test Suite {} pri {}".format(self.run_id, pri), self.address,
+                                             port, self.api_version, pri)
+            registry.timeline.advertise()
+            self.zeroconf.register_service(info)
+            self.services.append(info)
+        return self.registries
+
+    def stop(self):
+        if self.zeroconf is not None:
+            for info in self.services:
+                self.zeroconf.unregister_service(info)
+            self.zeroconf.close()
+            self.zeroconf = None
+        for registry in self.registries.values():
+            registry.disable()
+            registry.stop()
+        self.services = []
+
+    def first_registration(self, since, exclude=None):
+        """
+        Get the (arrival, priority) of the first registration accepted by any registry after 'since', ignoring the
+        priorities in 'exclude', or None if there has been none
+        """
+        first = None
+        for pri, registry in self.registries.items():
+            if exclude and pri in exclude:
+                continue
+            accepted = [entry[0] for entry in registry.faults.requests("resource", since=since) if entry[2] == 200]
+            if accepted and (first is None or accepted[0] < first[0]):
+                first = (accepted[0], pri)
+        return first
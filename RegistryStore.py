@@ -0,0 +1,207 @@
+# Copyright (C) 2018 British Broadcasting Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from multiprocessing import current_process
+from multiprocessing.managers import BaseProxy, SyncManager
+
+import Config
+from Registry import Registry, RegistryRouter
+from ResultStore import ResultStore
+
+
+def _local(obj):
+    """Get the object a proxy refers to, if it is held by the store process this is running in"""
+    if isinstance(obj, BaseProxy):
+        server = getattr(current_process(), "_manager_server", None)
+        if server is not None and obj._token.address == server.address:
+            return server.id_to_obj[obj._token.id][0]
+    return obj
+
+
+class StoredRegistry(Registry):
+    """A Registry held by the store process, with accessors for the objects it owns so that they can be proxied"""
+    def start(self, host="0.0.0.0", port=0, router=None):
+        return Registry.start(self, host, port, _local(router))
+
+    def get_faults(self):
+        return self.faults
+
+    def get_timeline(self):
+        return self.timeline
+
+    def get_heartbeat_analyser(self):
+        return self.heartbeat_analyser
+
+
+class StoredRouter(RegistryRouter):
+    def add(self, address, registry):
+        RegistryRouter.add(self, address, _local(registry))
+
+    def claims(self, address):
+        return self.resolve(address) is not None
+
+
+class RegistryProxy(BaseProxy):
+    """Gives worker processes the same interface to a stored Registry as to a local one"""
+    _exposed_ = ("reset", "add", "heartbeat", "get_data", "get_heartbeats", "enable", "disable", "start", "stop",
+                 "get_faults", "get_timeline", "get_heartbeat_analyser", "__getattribute__")
+    _method_to_typeid_ = {"get_faults": "FaultInjector",
+                          "get_timeline": "RegistrationTimeline",
+                          "get_heartbeat_analyser": "HeartbeatAnalyser"}
+
+    def reset(self):
+        return self._callmethod("reset")
+
+    def add(self, headers, payload, arrival=None):
+        return self._callmethod("add", (headers, payload, arrival))
+
+    def heartbeat(self, headers, payload, node_id, arrival=None):
+        return self._callmethod("heartbeat", (headers, payload, node_id, arrival))
+
+    def get_data(self):
+        return self._callmethod("get_data")
+
+    def get_heartbeats(self):
+        return self._callmethod("get_heartbeats")
+
+    def enable(self):
+        return self._callmethod("enable")
+
+    def disable(self):
+        return self._callmethod("disable")
+
+    def start(self, host="0.0.0.0", port=0, router=None):
+        return self._callmethod("start", (host, port, router))
+
+    def stop(self):
+        return self._callmethod("stop")
+
+    @property
+    def faults(self):
+        return self._callmethod("get_faults")
+
+    @property
+    def timeline(self):
+        return self._callmethod("get_timeline")
+
+    @property
+    def heartbeat_analyser(self):
+        return self._callmethod("get_heartbeat_analyser")
+
+    @property
+    def enabled(self):
+        return self._callmethod("__getattribute__", ("enabled",))
+
+    @property
+    def last_time(self):
+        return self._callmethod("__getattribute__", ("last_time",))
+
+    @property
+    def last_hb_time(self):
+        return self._callmethod("__getattribute__", ("last_hb_time",))
+
+
+class RouterProxy(BaseProxy):
+    _exposed_ = ("add", "remove", "resolve", "claims")
+    _method_to_typeid_ = {"resolve": "ExistingRegistry"}
+
+    def add(self, address, registry):
+        return self._callmethod("add", (address, registry))
+
+    def remove(self, address):
+        return self._callmethod("remove", (address,))
+
+    def resolve(self, address):
+        # A proxy is always created for the result, so check first whether there is one to refer to
+        if not self._callmethod("claims", (address,)):
+            return None
+        return self._callmethod("resolve", (address,))
+
+
+class HeartbeatAnalyserProxy(BaseProxy):
+    _exposed_ = ("confident", "summary", "jitter", "period", "margin", "__getattribute__")
+
+    def confident(self):
+        return self._callmethod("confident")
+
+    def summary(self):
+        return self._callmethod("summary")
+
+    def jitter(self):
+        return self._callmethod("jitter")
+
+    def period(self):
+        return self._callmethod("period")
+
+    def margin(self):
+        return self._callmethod("margin")
+
+    @property
+    def first(self):
+        return self._callmethod("__getattribute__", ("first",))
+
+    @property
+    def count(self):
+        return self._callmethod("__getattribute__", ("count",))
+
+
+# The shared registry, router and result store, created once in the store process
+SHARED = {}
+
+
+def _shared_registry():
+    if "registry" not in SHARED:
+        SHARED["registry"] = StoredRegistry()
+    return SHARED["registry"]
+
+
+def _router():
+    if "router" not in SHARED:
+        SHARED["router"] = StoredRouter()
+    return SHARED["router"]
+
+
+def _results():
+    if "results" not in SHARED:
+        SHARED["results"] = ResultStore(Config.RESULT_HISTORY)
+    return SHARED["results"]
+
+
+class RegistryStore(SyncManager):
+    """
+    A separate process which holds mock registry state for multi-process serving. Stored registries serve their
+    ephemeral ports from this process too, so registrations and heartbeats are taken in without contending with
+    test execution in the worker processes, which see the same state through proxies.
+    """
+    def shared_registry(self):
+        """Get the registry recording requests from Nodes which no test run has claimed"""
+        return self._shared_registry()
+
+    def router(self):
+        return self._router()
+
+    def results(self):
+        return self._results()
+
+
+RegistryStore.register("Registry", StoredRegistry, RegistryProxy)
+RegistryStore.register("RegistryRouter", StoredRouter, RouterProxy)
+# Objects owned by a registry, or a router, are only ever proxied when returned from one of its methods
+RegistryStore.register("ExistingRegistry", proxytype=RegistryProxy, create_method=False)
+RegistryStore.register("FaultInjector", create_method=False)
+RegistryStore.register("RegistrationTimeline", create_method=False)
+RegistryStore.register("HeartbeatAnalyser", proxytype=HeartbeatAnalyserProxy, create_method=False)
+RegistryStore.register("_shared_registry", _shared_registry, RegistryProxy)
+RegistryStore.register("_router", _router, RouterProxy)
+RegistryStore.register("_results", _results)
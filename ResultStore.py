@@ -0,0 +1,81 @@
+# Copyright (C) 2018 British Broadcasting Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import uuid
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+
+STATUSES = ["Pass", "Fail", "Timeout", "Manual", "N/A"]
+
+
+class ResultStore(object):
+    """
+    Keeps the results of the most recent test runs in memory, so that large result sets can be paged through and
+    filtered rather than rendered in one go
+    """
+    def __init__(self, capacity=20):
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.runs = OrderedDict()
+
+    def add(self, test, url, results, metadata=None):
+        """
+        Store the results of a run, each of the form [description, status, detail, test ID], along with any metadata
+        describing how the run was made, returning its ID
+        """
+        run_id = uuid.uuid4().hex
+        counts = {status: 0 for status in STATUSES}
+        for result in results:
+            counts[result[1]] = counts.get(result[1], 0) + 1
+        with self.lock:
+            self.runs[run_id] = {"test": test, "url": url, "results": results, "counts": counts,
+                                 "metadata": metadata or {}}
+            while len(self.runs) > self.capacity:
+                self.runs.popitem(last=False)
+        return run_id
+
+    def summary(self, run_id):
+        """
+        Get the test, URL, number of results, count of each status and metadata for a run, or None if it is not held
+        """
+        with self.lock:
+            run = self.runs.get(run_id)
+        if run is None:
+            return None
+        return {"test": run["test"], "url": run["url"], "total": len(run["results"]), "counts": run["counts"],
+                "metadata": run["metadata"]}
+
+    def query(self, run_id, statuses=None, test_id=None, offset=0, limit=None):
+        """
+        Get a page of a run's results, optionally only those with one of the given statuses and whose test ID matches
+        a glob pattern. Each result is returned with its position in the full result set. Returns None if the run is
+        not held.
+        """
+        with self.lock:
+            run = self.runs.get(run_id)
+        if run is None:
+            return None
+        matched = 0
+        page = []
+        for index, result in enumerate(run["results"]):
+            if statuses and result[1] not in statuses:
+                continue
+            if test_id and not fnmatchcase(result[3], test_id):
+                continue
+            if matched >= offset and (limit is None or len(page) < limit):
+                page.append({"index": index + 1, "description": result[0], "status": result[1],
+                             "detail": result[2], "id": result[3]})
+            matched += 1
+        return {"total": len(run["results"]), "matched": matched, "offset": offset, "results": page}
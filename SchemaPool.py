@@ -0,0 +1,113 @@
+# Copyright (C) 2018 British Broadcasting Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+import multiprocessing
+import os
+
+import jsonschema
+
+
+class ValidationTimeout(Exception):
+    """The time allowed for validating the items of an array ran out, as when a worker process has died"""
+    pass
+
+
+# Validators compiled in a worker process, by schema key, so that each is only built once per worker
+_VALIDATORS = {}
+
+
+def _validate_items(key, schema, base_uri, offset, items):
+    """Validate a chunk of the items of an array in a worker process, returning the indexes of any invalid items"""
+    validator = _VALIDATORS.get(key)
+    if validator is None:
+        resolver = jsonschema.RefResolver(base_uri, schema)
+        validator = jsonschema.validators.validator_for(schema)(schema["items"], resolver=resolver)
+        _VALIDATORS[key] = validator
+    return [offset + index for index, item in enumerate(items) if not validator.is_valid(item)]
+
+
+class ItemValidation(object):
+    """
+    The validation of the items of one array in a SchemaPool, submitted a chunk at a time. Waits for the workers are
+    limited by the Deadline, if any, raising ValidationTimeout once it passes.
+    """
+    def __init__(self, pool, schema, base_uri, max_pending, deadline=None):
+        self.pool = pool
+        self.schema = schema
+        self.base_uri = base_uri
+        self.key = hashlib.sha1((base_uri + json.dumps(schema, sort_keys=True, default=str)).encode()).hexdigest()
+        self.max_pending = max_pending
+        self.deadline = deadline
+        self.pending = []
+        self.invalid = []
+
+    def _wait(self):
+        """Wait for the oldest pending chunk, which never completes if the worker validating it dies"""
+        timeout = self.deadline.remaining() if self.deadline is not None else None
+        try:
+            self.invalid += self.pending.pop(0).get(timeout)
+        except multiprocessing.TimeoutError:
+            raise ValidationTimeout("Timed out waiting for response items to be validated")
+
+    def submit(self, offset, items):
+        """Validate a chunk of items, the first of which is at index 'offset' in the array"""
+        # Wait for earlier chunks when the workers fall behind, so that a large response is not all held in memory
+        while len(self.pending) >= self.max_pending:
+            self._wait()
+        self.pending.append(self.pool.apply_async(_validate_items, (self.key, self.schema, self.base_uri, offset,
+                                                                    items)))
+
+    def invalid_items(self):
+        """Wait for every chunk to be validated, returning the indexes of the invalid items in order"""
+        while self.pending:
+            self._wait()
+        return sorted(self.invalid)
+
+
+class SchemaPool(object):
+    """
+    A pool of worker processes which validate the items of large JSON arrays, so that the CPU time this takes does not
+    hold the GIL against every other test run. Like the RegistryStore, it must be started before any other threads
+    so that its workers can be forked safely.
+    """
+    def __init__(self):
+        self.pool = None
+        self.workers = 0
+
+    def start(self, workers=None):
+        """Start the given number of worker processes, defaulting to one per CPU. No pool is started for 0 workers."""
+        if workers == 0:
+            return
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = multiprocessing.get_context("fork").Pool(self.workers)
+
+    def stop(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
+
+    def available(self):
+        return self.pool is not None
+
+    def validation(self, schema, base_uri, deadline=None):
+        """
+        Start validating the items of an array against an array schema, whose references resolve from base_uri, within
+        an optional Deadline
+        """
+        return ItemValidation(self.pool, schema, base_uri, self.workers * 2, deadline)
+
+
+SCHEMA_POOL = SchemaPool()
@@ -0,0 +1,318 @@
+# Copyright (C) 2018 British Broadcasting Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import copy
+import json
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import TestHelper
+from NodeFleet import load_fixtures, make_resource_set
+from WebSocketClient import WebSocketClient, WebSocketError
+
+# Time allowed for the last update to be delivered, beyond the subscription's max_update_rate_ms
+DELIVERY_GRACE = 5
+
+# Grains arriving closer together than this fraction of max_update_rate_ms are counted as rate violations, allowing
+# for jitter in delivery across the network
+RATE_TOLERANCE = 0.8
+
+
+class SubscriptionMonitor(object):
+    """Receives grains from a Query API subscription on a background thread, recording when each change arrives"""
+    def __init__(self, ws_href, timeout=10):
+        self.client = WebSocketClient(ws_href, timeout)
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.arrivals = {}
+        self.grains = []
+        self.sync = None
+        self.thread = None
+
+    def start(self):
+        """Connect and wait for the initial sync grain, so that later changes are not mistaken for it"""
+        self.client.connect()
+        message = self.client.recv(self.timeout)
+        if message is None:
+            raise WebSocketError("WebSocket closed before the sync grain was received")
+        self.sync = json.loads(message)
+        self.thread = threading.Thread(target=self._receive, daemon=True)
+        self.thread.start()
+
+    def _receive(self):
+        while True:
+            try:
+                message = self.client.recv()
+            except socket.timeout:
+                continue
+            if message is None:
+                return
+            now = time.monotonic()
+            try:
+                events = json.loads(message)["grain"]["data"]
+            except (ValueError, KeyError, TypeError):
+                continue
+            with self.lock:
+                self.grains.append((now, len(events)))
+                for event in events:
+                    if "post" in event and event.get("path") not in self.arrivals:
+                        self.arrivals[event.get("path")] = now
+
+    def received(self, res_ids):
+        with self.lock:
+            return sum(1 for res_id in res_ids if res_id in self.arrivals)
+
+    def stop(self):
+        self.client.close()
+        if self.thread is not None:
+            self.thread.join(self.timeout)
+
+
+class SubscriptionBenchmark(object):
+    """
+    Measures Query API WebSocket subscriptions: for several combinations of resource_path, params and
+    max_update_rate_ms, a stream of Source registrations is pushed and the delivery latency, batching, rate limiting
+    and completeness of the resulting grains are measured. The number of concurrent subscriptions the registry can
+    sustain is then found by stepping up the subscription count until deliveries are late or lost.
+    """
+    def __init__(self, reg_url, query_url, update_count=200, update_rate=50, slo=0.5, max_subscriptions=500,
+                 workers=16):
+        self.reg_url = reg_url
+        self.query_url = query_url
+        self.update_count = update_count
+        self.update_rate = update_rate
+        self.slo = slo
+        self.max_subscriptions = max_subscriptions
+        self.workers = workers
+        self.run_id = str(uuid.uuid4())[:8]
+
+        self.local = threading.local()
+        self.fixtures = load_fixtures()
+        self.parents = make_resource_set(self.fixtures, "Subscription Benchmark")[:2]
+        self.node_id = self.parents[0][1]["id"]
+        self.device_id = self.parents[1][1]["id"]
+        self.stop_heartbeats = threading.Event()
+
+    def _session(self):
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = requests.Session()
+            self.local.session = session
+        return session
+
+    def label(self, group):
+        return "sb-{}-{}".format(self.run_id, group)
+
+    def configurations(self):
+        """The subscriptions to measure, as (name, request body, predicate for Sources it should deliver)"""
+        label = self.label("a")
+        return [
+            ("all resources, max_update_rate_ms=0",
+             {"resource_path": "", "params": {}, "max_update_rate_ms": 0}, lambda source: True),
+            ("Sources, max_update_rate_ms=100",
+             {"resource_path": "/sources", "params": {}, "max_update_rate_ms": 100}, lambda source: True),
+            ("Sources, max_update_rate_ms=1000",
+             {"resource_path": "/sources", "params": {}, "max_update_rate_ms": 1000}, lambda source: True),
+            ("Sources filtered by label, max_update_rate_ms=100",
+             {"resource_path": "/sources", "params": {"label": label}, "max_update_rate_ms": 100},
+             lambda source: source["label"] == label),
+            ("Flows, max_update_rate_ms=100",
+             {"resource_path": "/flows", "params": {}, "max_update_rate_ms": 100}, lambda source: False)
+        ]
+
+    def setup(self):
+        for res_type, data in self.parents:
+            response = self._session().post(self.reg_url + "resource", json={"type": res_type, "data": data},
+                                            timeout=5)
+            if response.status_code not in [200, 201]:
+                raise Exception("Registration of parent {} returned {}".format(res_type, response.status_code))
+        threading.Thread(target=self._heartbeat, daemon=True).start()
+
+    def _heartbeat(self):
+        """Keep the parent Node alive for the duration of the benchmark"""
+        session = requests.Session()
+        while not self.stop_heartbeats.wait(5):
+            try:
+                session.post(self.reg_url + "health/nodes/" + self.node_id, timeout=5)
+            except requests.exceptions.RequestException:
+                pass
+
+    def cleanup(self):
+        self.stop_heartbeats.set()
+        try:
+            self._session().delete(self.reg_url + "resource/nodes/" + self.node_id, timeout=5)
+        except requests.exceptions.RequestException:
+            pass
+
+    def subscribe(self, body):
+        """Create a subscription, returning its ID and ws_href"""
+        request = dict(body, persist=False, secure=False)
+        response = self._session().post(self.query_url + "subscriptions", json=request, timeout=5)
+        if response.status_code not in [200, 201]:
+            raise Exception("Subscription request returned {}".format(response.status_code))
+        subscription = response.json()
+        return subscription["id"], subscription["ws_href"]
+
+    def _make_sources(self, count):
+        sources = []
+        for index in range(count):
+            source = copy.deepcopy(self.fixtures["source"])
+            source["id"] = str(uuid.uuid4())
+            source["device_id"] = self.device_id
+            source["label"] = self.label("a" if index % 2 == 0 else "b")
+            source["parents"] = []
+            sources.append(source)
+        return sources
+
+    def push(self, sources):
+        """Register Sources open-loop at the configured rate, returning when each registration was started"""
+        sent = {}
+        lock = threading.Lock()
+
+        def post(source):
+            start = time.monotonic()
+            source["version"] = TestHelper.getTAITime()
+            try:
+                self._session().post(self.reg_url + "resource", json={"type": "source", "data": source}, timeout=5)
+            except requests.exceptions.RequestException:
+                return
+            with lock:
+                sent[source["id"]] = start
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            start = time.monotonic()
+            for index, source in enumerate(sources):
+                delay = start + index / self.update_rate - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(post, source)
+        return sent
+
+    def remove(self, sources):
+        def delete(source):
+            try:
+                self._session().delete(self.reg_url + "resource/sources/" + source["id"], timeout=5)
+            except requests.exceptions.RequestException:
+                pass
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            list(pool.map(delete, sources))
+
+    def _await_delivery(self, monitors, expected, max_update_rate_ms):
+        """Wait until every monitor has received every expected change, or the delivery deadline passes"""
+        deadline = time.monotonic() + max_update_rate_ms / 1000.0 + DELIVERY_GRACE
+        while time.monotonic() < deadline:
+            if all(monitor.received(expected) == len(expected) for monitor in monitors):
+                return
+            time.sleep(0.05)
+
+    def measure(self, body, predicate):
+        """Push a stream of registrations through one subscription and measure what it delivers"""
+        sub_id, ws_href = self.subscribe(body)
+        monitor = SubscriptionMonitor(ws_href)
+        monitor.start()
+        sources = self._make_sources(self.update_count)
+        try:
+            sent = self.push(sources)
+            expected = [source["id"] for source in sources if predicate(source) and source["id"] in sent]
+            self._await_delivery([monitor], expected, body["max_update_rate_ms"])
+            if not expected:
+                # Nothing should arrive, so give any spurious deliveries time to do so
+                time.sleep(body["max_update_rate_ms"] / 1000.0 + 1)
+        finally:
+            monitor.stop()
+            self.remove(sources)
+
+        unexpected_ids = set(source["id"] for source in sources if not predicate(source))
+        grains = [(arrival, count) for arrival, count in monitor.grains if count > 0]
+        intervals = [later[0] - earlier[0] for earlier, later in zip(grains, grains[1:])]
+        rate = body["max_update_rate_ms"] / 1000.0
+        return {"sent": len(sent),
+                "expected": len(expected),
+                "latency": [monitor.arrivals[res_id] - sent[res_id] for res_id in expected
+                            if res_id in monitor.arrivals],
+                "dropped": sum(1 for res_id in expected if res_id not in monitor.arrivals),
+                "unexpected": sum(1 for res_id in monitor.arrivals if res_id in unexpected_ids),
+                "grains": len(grains),
+                "events_per_grain": [count for arrival, count in grains],
+                "min_interval": min(intervals) if intervals else None,
+                "rate_violations": sum(1 for interval in intervals if interval < rate * RATE_TOLERANCE)}
+
+    def measure_scale(self, count, updates=20):
+        """Open a number of distinct subscriptions at once and measure delivery of a burst of changes to all of them"""
+        step = {"subscriptions": count, "connected": 0, "latency": [], "dropped": 0, "error": None}
+        monitors = []
+        sources = []
+        try:
+            # Vary max_update_rate_ms so that the registry treats each as a distinct subscription
+            for index in range(count):
+                sub_id, ws_href = self.subscribe({"resource_path": "/sources", "params": {},
+                                                  "max_update_rate_ms": 100 + index})
+                monitor = SubscriptionMonitor(ws_href)
+                monitors.append(monitor)
+                monitor.start()
+                step["connected"] += 1
+            sources = self._make_sources(updates)
+            sent = self.push(sources)
+            expected = list(sent)
+            self._await_delivery(monitors, expected, 100 + count)
+            for index, monitor in enumerate(monitors):
+                for res_id in expected:
+                    if res_id in monitor.arrivals:
+                        # Latency beyond that imposed by the subscription's own rate limit
+                        step["latency"].append(max(0, monitor.arrivals[res_id] - sent[res_id] - (100 + index) / 1000.0))
+                    else:
+                        step["dropped"] += 1
+        except Exception as e:
+            step["error"] = str(e)
+        finally:
+            for monitor in monitors:
+                monitor.stop()
+            self.remove(sources)
+        p99 = TestHelper.percentile(step["latency"], 99)
+        step["ok"] = step["error"] is None and step["dropped"] == 0 and p99 is not None and p99 <= self.slo
+        return step
+
+    def scale_steps(self):
+        count = 10
+        while count < self.max_subscriptions:
+            yield count
+            count *= 2
+        yield self.max_subscriptions
+
+    def run(self):
+        """Measure each subscription configuration, then find how many subscriptions can be sustained"""
+        self.setup()
+        results = []
+        steps = []
+        try:
+            for name, body, predicate in self.configurations():
+                try:
+                    results.append((name, body, self.measure(body, predicate)))
+                except Exception as e:
+                    results.append((name, body, {"error": str(e)}))
+            for count in self.scale_steps():
+                step = self.measure_scale(count)
+                steps.append(step)
+                if not step["ok"]:
+                    break
+        finally:
+            self.cleanup()
+        sustained = [step["subscriptions"] for step in steps if step["ok"]]
+        return {"configurations": results, "scale": steps, "max_subscriptions": max(sustained) if sustained else None}
@@ -88,3 +88,23 @@ def getTAITime(offset=0.0):
     nanos = int((myTime - secs) * 1e9)
     ippTime = from_UTC(secs, nanos)
     return str(ippTime[0]) + ":" + str(ippTime[1])
+
+
+def percentile(values, pct):
+    """Get a percentile (0-100) of a list of numbers, interpolating between the closest ranks"""
+    if not values:
+        return None
+    ordered_values = sorted(values)
+    rank = (len(ordered_values) - 1) * pct / 100.0
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered_values) - 1)
+    return ordered_values[lower] + (ordered_values[upper] - ordered_values[lower]) * (rank - lower)
+
+
+def summarise_latency(values):
+    """Summarise a list of latencies in seconds as a human readable string of milliseconds"""
+    if not values:
+        return "no samples"
+    return "n={}, p50={:.1f} ms, p90={:.1f} ms, p99={:.1f} ms, max={:.1f} ms".format(
+        len(values), percentile(values, 50) * 1000, percentile(values, 90) * 1000,
+        percentile(values, 99) * 1000, max(values) * 1000)
@@ -0,0 +1,63 @@
+# Copyright (C) 2018 British Broadcasting Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import threading
+
+
+class TestProfiles(object):
+    """
+    Named test selections for a test suite, saved to a JSON file so that they can be reused from the web form, the
+    command line and the API, and by every worker process
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def load(self):
+        """Get every profile, as a dict of name to {"test": test suite ID, "tests": selection}"""
+        try:
+            with open(self.path) as profile_file:
+                return json.load(profile_file)
+        except FileNotFoundError:
+            return {}
+
+    def get(self, name):
+        return self.load().get(name)
+
+    def names(self, test=None):
+        """Get the profile names, optionally only those for one test suite"""
+        return sorted(name for name, profile in self.load().items() if test is None or profile["test"] == test)
+
+    def save(self, name, test, selection):
+        with self.lock:
+            profiles = self.load()
+            profiles[name] = {"test": test, "tests": selection}
+            self._write(profiles)
+
+    def delete(self, name):
+        with self.lock:
+            profiles = self.load()
+            if profiles.pop(name, None) is None:
+                return False
+            self._write(profiles)
+            return True
+
+    def _write(self, profiles):
+        # Replace the file in one step so that other processes never read a partial write
+        temp_path = "{}.{}.tmp".format(self.path, os.getpid())
+        with open(temp_path, "w") as profile_file:
+            json.dump(profiles, profile_file, indent=2, sort_keys=True)
+        os.replace(temp_path, self.path)
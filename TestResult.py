@@ -28,3 +28,6 @@ class Test(object):
 
     def FAIL(self, detail):
         return [self.description, "Fail", detail]
+
+    def TIMEOUT(self, detail):
+        return [self.description, "Timeout", detail]
@@ -0,0 +1,106 @@
+# Copyright (C) 2018 British Broadcasting Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+from concurrent.futures import Future, FIRST_COMPLETED, wait
+
+from Deadline import Deadline
+from TestSelection import conflicts
+
+# Time in seconds allowed beyond a test's deadline for it to return a result before it is marked as timed out. Its
+# requests are limited to the deadline, so this need only cover handling their failure.
+TIMEOUT_GRACE = 1
+
+
+class TestScheduler(object):
+    """
+    Runs the tests of a suite in parallel threads. Each test starts once every test before it which it depends on, or
+    whose resources conflict with its own, has finished, so conflicting tests keep their relative order while others
+    overlap. Each test, and the suite as a whole, may be given a time budget.
+    """
+    def __init__(self, tests, workers):
+        self.tests = tests
+        self.workers = max(workers, 1)
+
+    def waits_for(self, test_ids):
+        """Get the earlier tests which each test must wait for"""
+        waits = {}
+        for index, test_id in enumerate(test_ids):
+            test = self.tests[test_id]
+            waits[test_id] = [earlier for earlier in test_ids[:index]
+                              if earlier in test["depends"] or conflicts(self.tests[earlier], test)]
+        return waits
+
+    def run(self, test_ids, run_test, timed_out, test_timeout=None, suite_deadline=None):
+        """
+        Run the given tests, in order, by calling run_test with each ID and its Deadline, and return a dict of ID to
+        the value it returned. A test which overruns its deadline is abandoned, and tests which cannot start before
+        the suite deadline are skipped, with timed_out called with the ID and a reason to give the value for each. If
+        a test raises an exception no more tests are started, and the exception is raised once those running have
+        finished.
+        """
+        waits = self.waits_for(test_ids)
+        pending = list(test_ids)
+        running = {}
+        finished = {}
+        error = None
+        while pending or running:
+            for test_id in list(pending):
+                if error is not None or len(running) >= self.workers:
+                    break
+                if suite_deadline is not None and suite_deadline.expired():
+                    pending.remove(test_id)
+                    finished[test_id] = timed_out(test_id, "The test suite ran out of time before this test started")
+                elif all(earlier in finished for earlier in waits[test_id]):
+                    pending.remove(test_id)
+                    deadline = Deadline(test_timeout, suite_deadline)
+                    running[self._start(run_test, test_id, deadline)] = (test_id, deadline)
+            if not running:
+                break
+            done, _ = wait(running, timeout=self._next_expiry(running.values()), return_when=FIRST_COMPLETED)
+            for future in done:
+                test_id, _ = running.pop(future)
+                try:
+                    finished[test_id] = future.result()
+                except Exception as e:
+                    finished[test_id] = None
+                    error = error or e
+            for future, (test_id, deadline) in list(running.items()):
+                if deadline.expiry is not None and time.monotonic() >= deadline.expiry + TIMEOUT_GRACE:
+                    # The test's thread cannot be stopped, so it is left to finish in the background
+                    del running[future]
+                    finished[test_id] = timed_out(test_id, "The test did not complete within its time budget")
+        if error is not None:
+            raise error
+        return finished
+
+    def _start(self, run_test, test_id, deadline):
+        future = Future()
+
+        def target():
+            try:
+                future.set_result(run_test(test_id, deadline))
+            except Exception as e:
+                future.set_exception(e)
+
+        threading.Thread(target=target, daemon=True).start()
+        return future
+
+    def _next_expiry(self, running):
+        """Get the time until the first running test should be marked as timed out, or None if none have a budget"""
+        expiries = [deadline.expiry for _, deadline in running if deadline.expiry is not None]
+        if not expiries:
+            return None
+        return max(min(expiries) + TIMEOUT_GRACE - time.monotonic(), 0)
@@ -0,0 +1,131 @@
+# Copyright (C) 2018 British Broadcasting Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+
+# ID of the generic API checks which every suite runs before its own tests
+BASICS = "basics"
+
+
+def depends(*test_ids):
+    """Declare the tests which must run before a test, because it relies on data or state they set up"""
+    def decorator(method):
+        method.depends = getattr(method, "depends", ()) + test_ids
+        return method
+    return decorator
+
+
+def tags(*names):
+    """Tag a test so that it can be selected along with others of the same kind, using 'tag:<name>'"""
+    def decorator(method):
+        method.tags = getattr(method, "tags", ()) + names
+        return method
+    return decorator
+
+
+def resources(reads=(), mutates=()):
+    """
+    Declare the shared resources a test reads and mutates, such as "registry" or "senders/staged", so that it may run
+    alongside tests it does not conflict with. A resource includes those named below it, e.g. "senders" includes
+    "senders/staged". Tests which declare no resources are run on their own.
+    """
+    def decorator(method):
+        method.reads = tuple(reads)
+        method.mutates = tuple(mutates)
+        return method
+    return decorator
+
+
+def overlaps(names, other_names):
+    """Check whether any of one set of resource names is, or includes, or is included in, any of another"""
+    for name in names:
+        for other in other_names:
+            if name == other or name.startswith(other + "/") or other.startswith(name + "/"):
+                return True
+    return False
+
+
+def conflicts(test, other):
+    """Check whether two declared tests may not run at the same time"""
+    if test["reads"] is None or other["reads"] is None:
+        return True
+    return overlaps(test["mutates"], other["reads"] + other["mutates"]) or overlaps(other["mutates"], test["reads"])
+
+
+def declared_tests(test_class):
+    """
+    Get the ID, dependencies, tags, resources and description of each test in a suite, in the order they are run.
+    Resources read and mutated are None where they are not declared.
+    """
+    tests = OrderedDict([(BASICS, {"depends": [], "tags": [], "reads": None, "mutates": None,
+                                   "description": "Basic API read requests"})])
+    for test_id in dir(test_class):
+        method = getattr(test_class, test_id)
+        if test_id.startswith("test_") and callable(method):
+            description = " ".join((method.__doc__ or "").split())
+            tests[test_id] = {"depends": list(getattr(method, "depends", ())),
+                              "tags": list(getattr(method, "tags", ())),
+                              "reads": _declared(method, "reads"),
+                              "mutates": _declared(method, "mutates"),
+                              "description": description}
+    return tests
+
+
+def _declared(method, attribute):
+    value = getattr(method, attribute, None)
+    return None if value is None else list(value)
+
+
+def parse_selection(selection):
+    """Split a selection of test IDs, globs and 'tag:<name>' terms, separated by commas or spaces, into its terms"""
+    if isinstance(selection, (list, tuple)):
+        return [term for term in selection if term]
+    return [term for term in re.split(r"[,\s]+", selection or "") if term]
+
+
+def resolve_selection(selection, tests):
+    """
+    Get the IDs of the tests to run for a selection, given the declared tests of a suite. Dependencies of selected
+    tests are added, and each test is ordered after its dependencies and otherwise in the suite's order. Raises
+    ValueError for terms which match no tests and for unknown or circular dependencies.
+    """
+    selected = set()
+    for term in parse_selection(selection):
+        if term.startswith("tag:"):
+            matches = [test_id for test_id, test in tests.items() if term[4:] in test["tags"]]
+        else:
+            matches = [test_id for test_id in tests if fnmatchcase(test_id, term)]
+        if not matches:
+            raise ValueError("No tests match '{}'".format(term))
+        selected.update(matches)
+
+    ordered = []
+
+    def visit(test_id, chain):
+        if test_id in ordered:
+            return
+        if test_id in chain:
+            raise ValueError("Circular dependency between tests: {}".format(" > ".join(chain + [test_id])))
+        if test_id not in tests:
+            raise ValueError("Test {} depends on unknown test {}".format(chain[-1], test_id))
+        for dependency in tests[test_id]["depends"]:
+            visit(dependency, chain + [test_id])
+        ordered.append(test_id)
+
+    for test_id in tests:
+        if test_id in selected:
+            visit(test_id, [])
+    return ordered
@@ -0,0 +1,182 @@
+# Copyright (C) 2018 British Broadcasting Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import base64
+import hashlib
+import os
+import socket
+import ssl
+import struct
+import threading
+from urllib.parse import urlsplit
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+class WebSocketError(Exception):
+    pass
+
+
+class WebSocketClient(object):
+    """A minimal RFC 6455 client, sufficient to receive text messages such as Query API subscription grains"""
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+        self.sock = None
+        self.buffer = b""
+        self.fragments = b""
+        self.send_lock = threading.Lock()
+        self.closed = False
+
+    def connect(self):
+        parts = urlsplit(self.url)
+        if parts.scheme not in ["ws", "wss"]:
+            raise WebSocketError("Unsupported WebSocket URL: {}".format(self.url))
+        secure = parts.scheme == "wss"
+        port = parts.port or (443 if secure else 80)
+        try:
+            sock = socket.create_connection((parts.hostname, port), timeout=self.timeout)
+            if secure:
+                sock = ssl.create_default_context().wrap_socket(sock, server_hostname=parts.hostname)
+        except OSError as e:
+            raise WebSocketError("Unable to connect to {}: {}".format(self.url, e))
+        self.sock = sock
+
+        key = base64.b64encode(os.urandom(16)).decode("ascii")
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        request = "GET {} HTTP/1.1\r\nHost: {}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n" \
+                  "Sec-WebSocket-Key: {}\r\nSec-WebSocket-Version: 13\r\n\r\n".format(path, parts.netloc, key)
+        try:
+            sock.sendall(request.encode("ascii"))
+            while b"\r\n\r\n" not in self.buffer:
+                chunk = sock.recv(4096)
+                if not chunk:
+                    raise WebSocketError("Connection closed during WebSocket handshake")
+                self.buffer += chunk
+        except OSError as e:
+            self.close()
+            raise WebSocketError("WebSocket handshake with {} failed: {}".format(self.url, e))
+        head, self.buffer = self.buffer.split(b"\r\n\r\n", 1)
+        lines = head.decode("latin-1").split("\r\n")
+        status = lines[0].split(" ")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        expected = base64.b64encode(hashlib.sha1((key + WS_GUID).encode("ascii")).digest()).decode("ascii")
+        if len(status) < 2 or status[1] != "101" or headers.get("sec-websocket-accept") != expected:
+            self.close()
+            raise WebSocketError("WebSocket handshake with {} was refused: {}".format(self.url, lines[0]))
+
+    def _take_frame(self):
+        """Take a complete frame from the buffer, returning its first byte and payload, or None if none is complete"""
+        if len(self.buffer) < 2:
+            return None
+        first, second = self.buffer[0], self.buffer[1]
+        length = second & 0x7F
+        offset = 2
+        if length == 126:
+            offset = 4
+            if len(self.buffer) < offset:
+                return None
+            length = struct.unpack_from("!H", self.buffer, 2)[0]
+        elif length == 127:
+            offset = 10
+            if len(self.buffer) < offset:
+                return None
+            length = struct.unpack_from("!Q", self.buffer, 2)[0]
+        if len(self.buffer) < offset + length:
+            return None
+        payload = self.buffer[offset:offset + length]
+        self.buffer = self.buffer[offset + length:]
+        return first, payload
+
+    def _recv_frame(self):
+        # Frames stay in the buffer until they are complete, so that a timeout part way through one loses nothing
+        while True:
+            frame = self._take_frame()
+            if frame is not None:
+                return frame
+            chunk = self.sock.recv(65536)
+            if not chunk:
+                raise ConnectionError("WebSocket closed")
+            self.buffer += chunk
+
+    def _send_frame(self, opcode, payload):
+        mask = os.urandom(4)
+        length = len(payload)
+        if length < 126:
+            header = struct.pack("!BB", 0x80 | opcode, 0x80 | length)
+        elif length < 65536:
+            header = struct.pack("!BBH", 0x80 | opcode, 0x80 | 126, length)
+        else:
+            header = struct.pack("!BBQ", 0x80 | opcode, 0x80 | 127, length)
+        masked = bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+        with self.send_lock:
+            if self.sock is not None:
+                self.sock.sendall(header + mask + masked)
+
+    def send_text(self, text):
+        self._send_frame(0x1, text.encode("utf-8"))
+
+    def recv(self, timeout=None):
+        """
+        Receive the next text message, answering any control frames along the way. Returns None once the connection
+        has closed, or raises socket.timeout if no complete message arrives within the timeout.
+        """
+        if self.sock is None or self.closed:
+            return None
+        self.sock.settimeout(timeout)
+        try:
+            while True:
+                first, payload = self._recv_frame()
+                opcode = first & 0x0F
+                if opcode == 0x8:
+                    self._close_handshake(payload[:2])
+                    return None
+                elif opcode == 0x9:
+                    self._send_frame(0xA, payload)
+                elif opcode in [0x0, 0x1, 0x2]:
+                    # The fragments of a message received so far are kept in case a timeout interrupts it
+                    self.fragments += payload
+                    if first & 0x80:
+                        message, self.fragments = self.fragments, b""
+                        return message.decode("utf-8")
+        except socket.timeout:
+            raise
+        except (ConnectionError, OSError):
+            self.closed = True
+            return None
+
+    def _close_handshake(self, code):
+        try:
+            self._send_frame(0x8, code)
+        except OSError:
+            pass
+        self.closed = True
+
+    def close(self):
+        if self.sock is None:
+            return
+        if not self.closed:
+            self._close_handshake(struct.pack("!H", 1000))
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        self.sock = None
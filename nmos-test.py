@@ -14,15 +14,31 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from flask import Flask, render_template, flash, request
+from flask import Flask, render_template, flash, request, redirect, url_for, abort, jsonify, stream_template
 from wtforms import Form, validators, StringField, SelectField, IntegerField, HiddenField
-from Registry import REGISTRY, REGISTRY_API
+from werkzeug.serving import make_server
+from Registry import Registry, REGISTRY_API, ROUTER, create_registry_api
+from RegistryStore import RegistryStore
+from AssetPipeline import AssetPipeline
+from ResultStore import ResultStore
+from TestProfiles import TestProfiles
+from TestSelection import declared_tests, parse_selection, resolve_selection
+from MemoryRegistry import MemoryRegistry
+from MdnsDiscovery import DISCOVERY, NMOS_SERVICE_TYPES
+from SchemaPool import SCHEMA_POOL
 
+import argparse
 import git
 import os
 import json
 import copy
+import multiprocessing
+import socket
+import sys
+import threading
 
+import Config
+import GenericTest
 import IS0401Test
 import IS0402Test
 import IS0501Test
@@ -32,8 +48,16 @@ import IS0701Test
 app = Flask(__name__)
 app.debug = True  # TODO: Set to False for production use
 app.config['SECRET_KEY'] = 'nmos-interop-testing-jtnm'
-app.config['TEST_ACTIVE'] = False
-app.register_blueprint(REGISTRY_API)  # Dependency for IS0401Test
+AssetPipeline(app.static_folder).init_app(app)  # Precompressed static files with content hashed URLs
+
+# Whether an exclusive test run is in progress, and the (spec_key, version) and number of concurrent runs in progress.
+# These, the results of recent runs and the mock registries are moved into a RegistryStore when serving from multiple
+# worker processes.
+TEST_LOCK = threading.Lock()
+TEST_STATE = {"active": False, "concurrent": None}
+RESULTS = ResultStore(Config.RESULT_HISTORY)
+REGISTRY_STORE = None
+PROFILES = TestProfiles(Config.PROFILE_PATH)
 
 CACHE_PATH = 'cache'
 SPEC_REPOS = [
@@ -48,30 +72,42 @@ TEST_DEFINITIONS = {
                  "default_version": "v1.2",
                  "input_labels": ["Node API"],
                  "spec_key": 'is-04',
+                 "modes": [("conformance", "Conformance"),
+                           ("load", "Node API concurrent load")],
+                 "concurrent": True,
                  "class": IS0401Test.IS0401Test},
     "IS-04-02": {"name": "IS-04 Registry APIs",
                  "versions": ["v1.0", "v1.1", "v1.2", "v1.3"],
                  "default_version": "v1.2",
                  "input_labels": ["Registration API", "Query API"],
                  "spec_key": 'is-04',
+                 "modes": [("conformance", "Conformance"),
+                           ("fleet", "Virtual Node fleet load"),
+                           ("capacity", "Registration capacity search"),
+                           ("query_bench", "Query API benchmark"),
+                           ("subscriptions", "Query API subscription benchmark")],
                  "class": IS0402Test.IS0402Test},
     "IS-05-01": {"name": "IS-05 Connection Management API",
                  "versions": ["v1.0", "v1.1"],
                  "default_version": "v1.0",
                  "input_labels": ["Connection API"],
                  "spec_key": 'is-05',
+                 "modes": [("conformance", "Conformance"),
+                           ("stress", "Connection API concurrent PATCH stress")],
                  "class": IS0501Test.IS0501Test},
     "IS-06-01": {"name": "IS-06 Network Control API",
                  "versions": ["v1.0"],
                  "default_version": "v1.0",
                  "input_labels": ["Network API"],
                  "spec_key": 'is-06',
+                 "modes": [("conformance", "Conformance")],
                  "class": IS0601Test.IS0601Test},
     "IS-07-01": {"name": "IS-07 Event & Tally API",
                  "versions": ["v1.0"],
                  "default_version": "v1.0",
                  "input_labels": ["Event API"],
                  "spec_key": 'is-07',
+                 "modes": [("conformance", "Conformance")],
                  "class": IS0701Test.IS0701Test}
 }
 
@@ -95,6 +131,15 @@ class DataForm(Form):
                                                          ("v1.1", "v1.1"),
                                                          ("v1.2", "v1.2"),
                                                          ("v1.3", "v1.3")])
+    mode_choices = []
+    for test_id in TEST_DEFINITIONS:
+        for mode_choice in TEST_DEFINITIONS[test_id]["modes"]:
+            if mode_choice not in mode_choices:
+                mode_choices.append(mode_choice)
+    mode = SelectField(label="Mode:", choices=mode_choices)
+    tests = StringField(label="Tests:", validators=[validators.optional()])
+    profile = SelectField(label="Profile:", choices=[("", "None")], validators=[validators.optional()])
+    save_profile = StringField(label="Save as profile:", validators=[validators.optional()])
 
     # Hide test data in the web form for dynamic modification of behaviour
     hidden_data = {}
@@ -104,71 +149,309 @@ class DataForm(Form):
     hidden = HiddenField(default=json.dumps(hidden_data))
 
 
+def begin_test(test, version):
+    """
+    Claim the testing tool for a test run, returning False if it is busy. Runs of test suites marked as concurrent may
+    overlap each other, provided they use the same specification checkout.
+    """
+    checkout = (TEST_DEFINITIONS[test]["spec_key"], version)
+    with TEST_LOCK:
+        active = TEST_STATE["concurrent"]
+        if TEST_STATE["active"]:
+            return False
+        if not TEST_DEFINITIONS[test].get("concurrent", False):
+            if active:
+                return False
+            TEST_STATE["active"] = True
+            return True
+        if active and active[0] != checkout:
+            return False
+        TEST_STATE["concurrent"] = (checkout, active[1] + 1 if active else 1)
+        return True
+
+
+def end_test(test):
+    with TEST_LOCK:
+        if not TEST_DEFINITIONS[test].get("concurrent", False):
+            TEST_STATE["active"] = False
+            return
+        checkout, count = TEST_STATE["concurrent"]
+        TEST_STATE["concurrent"] = (checkout, count - 1) if count > 1 else None
+
+
+def select_tests(test, tests, profile=None):
+    """
+    Get the selection of tests to run for a test suite, either as given or from a saved profile, raising ValueError
+    if it cannot be resolved. An empty selection runs every test.
+    """
+    if profile:
+        saved = PROFILES.get(profile)
+        if saved is None:
+            raise ValueError("There is no profile named '{}'".format(profile))
+        if saved["test"] != test:
+            raise ValueError("Profile '{}' is for {}, not {}".format(profile, saved["test"], test))
+        tests = saved["tests"]
+    if parse_selection(tests):
+        resolve_selection(tests, declared_tests(TEST_DEFINITIONS[test]["class"]))
+    return tests or ""
+
+
+def start_run(test, version, mode, base_url, base_url_sec, selection):
+    """Run a test suite and store its results, returning the ID of the run, or None if the testing tool is busy"""
+    if not begin_test(test, version):
+        return None
+    try:
+        result, metadata = run_test(test, version, mode, base_url, base_url_sec, selection)
+    finally:
+        end_test(test)
+    return RESULTS.add(test, base_url, result, metadata)
+
+
 # Index page
 @app.route('/', methods=["GET", "POST"])
 def index_page():
     form = DataForm(request.form)
-    if request.method == "POST" and not app.config['TEST_ACTIVE']:
+    form.profile.choices = [("", "None")] + [(name, "{} ({})".format(name, profile["test"]))
+                                             for name, profile in sorted(PROFILES.load().items())]
+    if request.method == "POST":
         test = request.form["test"]
         ip = request.form["ip"]
         port = request.form["port"]
         ip_sec = request.form["ip_sec"]
         port_sec = request.form["port_sec"]
         version = request.form["version"]
+        mode = request.form.get("mode", "conformance")
         base_url = "http://{}:{}".format(ip, str(port))
         base_url_sec = "http://{}:{}".format(ip_sec, str(port_sec))
-        if form.validate():
-            if test in TEST_DEFINITIONS:
-                spec_versions = TEST_DEFINITIONS[test]["versions"]
-                spec_path = CACHE_PATH + '/' + TEST_DEFINITIONS[test]["spec_key"]
-
-            if test == "IS-04-01":
-                apis = {"node": {"raml": "NodeAPI.raml",
-                                 "base_url": base_url,
-                                 "url": "{}/x-nmos/node/{}/".format(base_url, version)}}
-                test_obj = IS0401Test.IS0401Test(apis, spec_versions, version, spec_path, REGISTRY)
-            elif test == "IS-04-02":
-                apis = {"registration": {"raml": "RegistrationAPI.raml",
-                                         "base_url": base_url,
-                                         "url": "{}/x-nmos/registration/{}/".format(base_url, version)},
-                        "query": {"raml": "QueryAPI.raml",
-                                  "base_url": base_url_sec,
-                                  "url": "{}/x-nmos/query/{}/".format(base_url_sec, version)}}
-                test_obj = IS0402Test.IS0402Test(apis, spec_versions, version, spec_path)
-            elif test == "IS-05-01":
-                apis = {"connection": {"raml": "ConnectionAPI.raml",
-                                       "base_url": base_url,
-                                       "url": "{}/x-nmos/connection/{}/".format(base_url, version)}}
-                test_obj = IS0501Test.IS0501Test(apis, spec_versions, version, spec_path)
-            elif test == "IS-06-01":
-                apis = {"netctrl": {"raml": "NetworkControlAPI.raml",
-                                    "base_url": base_url,
-                                    "url": "{}/x-nmos/netctrl/{}/".format(base_url, version)}}
-                test_obj = IS0601Test.IS0601Test(apis, spec_versions, version, spec_path)
-            elif test == "IS-07-01":
-                apis = {"events": {"raml": "EventsAPI.raml",
-                                   "base_url": base_url,
-                                   "url": "{}/x-nmos/events/{}/".format(base_url, version)}}
-                test_obj = IS0701Test.IS0701Test(apis, spec_versions, version, spec_path)
-
-            if test_obj:
-                app.config['TEST_ACTIVE'] = True
-                try:
-                    result = test_obj.run_tests()
-                except Exception as ex:
-                    raise ex
-                finally:
-                    app.config['TEST_ACTIVE'] = False
-                return render_template("result.html", url=base_url, test=test, result=result)
-        else:
+        if not form.validate():
             flash("Error: {}".format(form.errors))
-    elif request.method == "POST":
-        flash("Error: A test is currently in progress. Please wait until it has completed or restart the testing tool.")
+        else:
+            try:
+                selection = select_tests(test, form.tests.data, form.profile.data)
+            except ValueError as e:
+                flash("Error: {}".format(e))
+                return render_template("index.html", form=form)
+            if form.save_profile.data:
+                PROFILES.save(form.save_profile.data, test, selection)
+            run_id = start_run(test, version, mode, base_url, base_url_sec, selection)
+            if run_id is not None:
+                return redirect(url_for("result_page", run_id=run_id))
+            flash("Error: A test is currently in progress. Please wait until it has completed or restart the testing "
+                  "tool.")
 
     return render_template("index.html", form=form)
 
 
+# Results page, which is streamed with the first page of results. Further pages are fetched from result_data.
+@app.route('/results/<run_id>', methods=["GET"])
+def result_page(run_id):
+    summary = RESULTS.summary(run_id)
+    if summary is None:
+        abort(404)
+    page = RESULTS.query(run_id, limit=Config.RESULT_PAGE_SIZE)
+    return app.response_class(stream_template("result.html", run_id=run_id, url=summary["url"], test=summary["test"],
+                                              summary=summary, page=page, page_size=Config.RESULT_PAGE_SIZE))
+
+
+@app.route('/results/<run_id>/data', methods=["GET"])
+def result_data(run_id):
+    """Get a page of results as JSON, filtered by a comma separated list of statuses and a test ID glob pattern"""
+    statuses = [status for status in request.args.get("status", "").split(",") if status]
+    try:
+        offset = max(int(request.args.get("offset", 0)), 0)
+        limit = min(max(int(request.args.get("limit", Config.RESULT_PAGE_SIZE)), 1), Config.RESULT_PAGE_SIZE)
+    except ValueError:
+        abort(400)
+    page = RESULTS.query(run_id, statuses, request.args.get("test") or None, offset, limit)
+    if page is None:
+        abort(404)
+    return jsonify(page)
+
+
+def api_error(message, status=400):
+    return jsonify({"error": message}), status
+
+
+@app.route('/api/tests/<test>', methods=["GET"])
+def api_tests(test):
+    """List the tests in a test suite, with the tests each depends on and its tags, for use in selections"""
+    if test not in TEST_DEFINITIONS:
+        return api_error("Unknown test suite '{}'".format(test), 404)
+    tests = declared_tests(TEST_DEFINITIONS[test]["class"])
+    return jsonify([dict(id=test_id, **tests[test_id]) for test_id in tests])
+
+
+@app.route('/api/runs', methods=["POST"])
+def api_run():
+    """
+    Run a test suite, given a JSON object with the same fields as the web form, and respond with the run's ID,
+    a summary of its results and where to get them
+    """
+    params = request.get_json(silent=True)
+    if not isinstance(params, dict):
+        return api_error("Request body must be a JSON object")
+    test = params.get("test")
+    if test not in TEST_DEFINITIONS:
+        return api_error("Unknown test suite '{}'".format(test))
+    definition = TEST_DEFINITIONS[test]
+    version = params.get("version", definition["default_version"])
+    mode = params.get("mode", "conformance")
+    if version not in definition["versions"]:
+        return api_error("Unsupported version '{}' for {}".format(version, test))
+    if mode not in [mode_choice[0] for mode_choice in definition["modes"]]:
+        return api_error("Unsupported mode '{}' for {}".format(mode, test))
+    if "ip" not in params or "port" not in params:
+        return api_error("The 'ip' and 'port' of the API under test are required")
+    try:
+        selection = select_tests(test, params.get("tests"), params.get("profile"))
+    except ValueError as e:
+        return api_error(str(e))
+    if params.get("save_profile"):
+        PROFILES.save(params["save_profile"], test, selection)
+
+    base_url = "http://{}:{}".format(params["ip"], params["port"])
+    base_url_sec = "http://{}:{}".format(params.get("ip_sec"), params.get("port_sec"))
+    run_id = start_run(test, version, mode, base_url, base_url_sec, selection)
+    if run_id is None:
+        return api_error("A test is currently in progress", 409)
+    return jsonify({"run_id": run_id, "summary": RESULTS.summary(run_id),
+                    "results": url_for("result_page", run_id=run_id),
+                    "data": url_for("result_data", run_id=run_id)}), 201
+
+
+@app.route('/api/profiles', methods=["GET"])
+def api_profiles():
+    return jsonify(PROFILES.load())
+
+
+@app.route('/api/profiles/<name>', methods=["GET", "PUT", "DELETE"])
+def api_profile(name):
+    """Get, save or delete a profile. Profiles are saved from a JSON object with a 'test' suite and 'tests' selection"""
+    if request.method == "PUT":
+        params = request.get_json(silent=True)
+        if not isinstance(params, dict) or params.get("test") not in TEST_DEFINITIONS:
+            return api_error("Request body must be a JSON object with a known 'test' suite")
+        try:
+            selection = select_tests(params["test"], params.get("tests"))
+        except ValueError as e:
+            return api_error(str(e))
+        PROFILES.save(name, params["test"], selection)
+    elif request.method == "DELETE":
+        if not PROFILES.delete(name):
+            return api_error("There is no profile named '{}'".format(name), 404)
+        return "", 204
+    profile = PROFILES.get(name)
+    if profile is None:
+        return api_error("There is no profile named '{}'".format(name), 404)
+    return jsonify(profile)
+
+
+def run_test(test, version, mode, base_url, base_url_sec, selection=None):
+    """Create the test object for a test suite and run it in the given mode, returning the results and run metadata"""
+    spec_versions = TEST_DEFINITIONS[test]["versions"]
+    spec_path = CACHE_PATH + '/' + TEST_DEFINITIONS[test]["spec_key"]
+
+    if test == "IS-04-01":
+        apis = {"node": {"raml": "NodeAPI.raml",
+                         "base_url": base_url,
+                         "url": "{}/x-nmos/node/{}/".format(base_url, version)}}
+        if REGISTRY_STORE is not None:
+            test_obj = IS0401Test.IS0401Test(apis, spec_versions, version, spec_path, REGISTRY_STORE.Registry(),
+                                             REGISTRY_STORE.router())
+        else:
+            test_obj = IS0401Test.IS0401Test(apis, spec_versions, version, spec_path, Registry(), ROUTER)
+    elif test == "IS-04-02":
+        apis = {"registration": {"raml": "RegistrationAPI.raml",
+                                 "base_url": base_url,
+                                 "url": "{}/x-nmos/registration/{}/".format(base_url, version)},
+                "query": {"raml": "QueryAPI.raml",
+                          "base_url": base_url_sec,
+                          "url": "{}/x-nmos/query/{}/".format(base_url_sec, version)}}
+        test_obj = IS0402Test.IS0402Test(apis, spec_versions, version, spec_path)
+    elif test == "IS-05-01":
+        apis = {"connection": {"raml": "ConnectionAPI.raml",
+                               "base_url": base_url,
+                               "url": "{}/x-nmos/connection/{}/".format(base_url, version)}}
+        test_obj = IS0501Test.IS0501Test(apis, spec_versions, version, spec_path)
+    elif test == "IS-06-01":
+        apis = {"netctrl": {"raml": "NetworkControlAPI.raml",
+                            "base_url": base_url,
+                            "url": "{}/x-nmos/netctrl/{}/".format(base_url, version)}}
+        test_obj = IS0601Test.IS0601Test(apis, spec_versions, version, spec_path)
+    elif test == "IS-07-01":
+        apis = {"events": {"raml": "EventsAPI.raml",
+                           "base_url": base_url,
+                           "url": "{}/x-nmos/events/{}/".format(base_url, version)}}
+        test_obj = IS0701Test.IS0701Test(apis, spec_versions, version, spec_path)
+
+    return test_obj.run_tests(mode, selection), test_obj.run_metadata()
+
+
+def run_cli(args):
+    """Run a test suite from the command line and print its results, returning the exit status"""
+    version = args.version or TEST_DEFINITIONS[args.suite]["default_version"]
+    try:
+        selection = select_tests(args.suite, args.tests, args.profile)
+    except ValueError as e:
+        print(" * Error: {}".format(e))
+        return 2
+    if args.save_profile:
+        PROFILES.save(args.save_profile, args.suite, selection)
+        print(" * Saved profile '{}'".format(args.save_profile))
+
+    base_url = "http://{}:{}".format(args.ip, args.port)
+    base_url_sec = "http://{}:{}".format(args.ip_sec, args.port_sec)
+    results, metadata = run_test(args.suite, version, args.mode, base_url, base_url_sec, selection)
+    for description, status, detail, test_id in results:
+        print("{:<8} {:<10} {}{}".format(status, test_id, description, ": " + detail if detail else ""))
+    for host, limit in metadata["concurrency"].items():
+        print(" * Concurrency limit for {}: {limit} (lowest {lowest}, highest {highest}, {decreases} decreases, "
+              "rate limit {rate_limit})".format(host, **limit))
+    for group in metadata["latency"]:
+        print(" * {path}: n={count}, errors={errors}, p50={p50_ms} ms, p95={p95_ms} ms, max={max_ms} ms, "
+              "{bytes} bytes".format(**group))
+    return 1 if any(result[1] in ["Fail", "Timeout"] for result in results) else 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="NMOS Testing Tool. Serves the web interface unless a test suite is "
+                                                 "given to run from the command line.")
+    parser.add_argument("--suite", choices=sorted(TEST_DEFINITIONS), help="test suite to run, e.g. IS-04-01")
+    parser.add_argument("--ip", help="IP address of the API under test")
+    parser.add_argument("--port", type=int, help="port of the API under test")
+    parser.add_argument("--ip-sec", help="IP address of the secondary API under test, e.g. the Query API")
+    parser.add_argument("--port-sec", type=int, help="port of the secondary API under test")
+    parser.add_argument("--version", help="API version to test, defaulting to the test suite's default")
+    parser.add_argument("--mode", default="conformance", help="test mode, defaulting to conformance")
+    parser.add_argument("--tests", help="tests to run, as comma separated IDs, glob patterns or 'tag:<name>' terms. "
+                                        "The tests these depend on are run too.")
+    parser.add_argument("--profile", help="run the tests selected by a saved profile")
+    parser.add_argument("--save-profile", help="save the selection of tests as a named profile")
+    args = parser.parse_args()
+    if args.suite and (args.ip is None or args.port is None):
+        parser.error("--ip and --port are required to run a test suite")
+    if not args.suite and (args.tests or args.profile or args.save_profile):
+        parser.error("--suite is required to select tests")
+    if args.suite and args.version and args.version not in TEST_DEFINITIONS[args.suite]["versions"]:
+        parser.error("unsupported version '{}' for {}".format(args.version, args.suite))
+    if args.suite and args.mode not in [mode_choice[0] for mode_choice in TEST_DEFINITIONS[args.suite]["modes"]]:
+        parser.error("unsupported mode '{}' for {}".format(args.mode, args.suite))
+    return args
+
+
+def serve_worker(sock):
+    """Serve the testing tool from a listening socket shared with the other worker processes"""
+    # Proxies lose their connection to the store when forked, and Zeroconf's threads do not survive it either, so each
+    # worker sets these up for itself. The schema validation pool is forked first, before any threads are started.
+    SCHEMA_POOL.start(Config.SCHEMA_POOL_WORKERS)
+    app.register_blueprint(create_registry_api(REGISTRY_STORE.shared_registry(), REGISTRY_STORE.router()))
+    DISCOVERY.start(NMOS_SERVICE_TYPES)
+    make_server('0.0.0.0', Config.SERVER_PORT, app, threaded=True, fd=sock.fileno()).serve_forever()
+
+
 if __name__ == '__main__':
+    ARGS = parse_args()
+
     print(" * Initialising specification repositories...")
 
     if not os.path.exists(CACHE_PATH):
@@ -186,6 +469,54 @@ if __name__ == '__main__':
 
     # TODO: Join 224.0.1.129 briefly and capture some announce messages
 
+    if ARGS.suite:
+        SCHEMA_POOL.start(Config.SCHEMA_POOL_WORKERS)
+        DISCOVERY.start(NMOS_SERVICE_TYPES)
+        sys.exit(run_cli(ARGS))
+
+    workers = []
+    if Config.SERVER_WORKERS > 1:
+        # Mock registry state and the test run bookkeeping are held in a store process shared by the workers, which
+        # must be forked before any other threads are started
+        app.debug = False
+        fork = multiprocessing.get_context("fork")
+        REGISTRY_STORE = RegistryStore(ctx=fork)
+        REGISTRY_STORE.start()
+        TEST_LOCK = REGISTRY_STORE.Lock()
+        TEST_STATE = REGISTRY_STORE.dict(TEST_STATE)
+        RESULTS = REGISTRY_STORE.results()
+        GenericTest.SPEC_LOCK = REGISTRY_STORE.Lock()
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(('0.0.0.0', Config.SERVER_PORT))
+        sock.listen(128)
+        workers = [fork.Process(target=serve_worker, args=(sock,), daemon=True) for _ in range(Config.SERVER_WORKERS)]
+        for worker in workers:
+            worker.start()
+        print(" * Serving from {} worker processes".format(Config.SERVER_WORKERS))
+    else:
+        # Routes requests reaching this port to the IS0401Test run for each Node
+        app.register_blueprint(REGISTRY_API)
+
+        # The schema validation pool's workers are forked, so it must be started before any other threads
+        SCHEMA_POOL.start(Config.SCHEMA_POOL_WORKERS)
+
+        # Browse for NMOS services throughout the tool's lifetime so that announcements are cached before tests need
+        # them
+        DISCOVERY.start(NMOS_SERVICE_TYPES)
+
+    if Config.STANDIN_REGISTRY_PORT is not None:
+        standin_registry = MemoryRegistry(Config.STANDIN_REGISTRY_EXPIRY)
+        standin_registry.start(port=Config.STANDIN_REGISTRY_PORT, ws_port=Config.STANDIN_REGISTRY_WS_PORT)
+        print(" * Stand-in Registration and Query APIs available on port {}".format(Config.STANDIN_REGISTRY_PORT))
+
     print(" * Initialisation complete")
 
-    app.run(host='0.0.0.0', threaded=True)
+    if workers:
+        for worker in workers:
+            worker.join()
+    else:
+        # The reloader would re-run all of the above in a child process, binding the stand-in registry's ports twice
+        # and starting a second schema validation pool and mDNS browser
+        app.run(host='0.0.0.0', port=Config.SERVER_PORT, threaded=True, use_reloader=False)
@@ -0,0 +1,91 @@
+var STATUS_CLASSES = {
+    "Pass": "bg-success pass",
+    "Manual": "bg-info manual",
+    "N/A": "bg-secondary notavailable"
+};
+
+var resultTable = document.getElementById("results");
+var pageSize = parseInt(resultTable.dataset.pageSize);
+var offset = 0;
+var matched = parseInt(resultTable.dataset.matched);
+var request = null;
+
+function addCell(row, text, className) {
+    var cell = row.insertCell(-1);
+    cell.textContent = text;
+    if (className) {
+      cell.className = className;
+    }
+}
+
+function renderResults(page) {
+    // Build the page off-document and swap it in, so only one page of rows is ever laid out
+    var body = document.createElement("tbody");
+    for (var i=0; i<page.results.length; i++) {
+      var result = page.results[i];
+      var row = body.insertRow(-1);
+      row.title = result.id;
+      addCell(row, result.index);
+      addCell(row, result.status, STATUS_CLASSES[result.status] || "bg-danger fail");
+      addCell(row, result.description);
+      addCell(row, typeof result.detail === "string" ? result.detail : JSON.stringify(result.detail));
+    }
+    resultTable.replaceChild(body, resultTable.tBodies[0]);
+    matched = page.matched;
+    offset = page.offset;
+    updatePager();
+}
+
+function updatePager() {
+    var first = matched == 0 ? 0 : offset + 1;
+    var last = Math.min(offset + pageSize, matched);
+    document.getElementById("page_info").textContent = "Showing " + first + " to " + last + " of " + matched;
+    document.getElementById("page_prev").disabled = offset == 0;
+    document.getElementById("page_next").disabled = last >= matched;
+}
+
+function loadPage(newOffset) {
+    var params = new URLSearchParams({"offset": newOffset, "limit": pageSize});
+    var status = document.getElementById("filter_status").value;
+    var testID = document.getElementById("filter_test").value.trim();
+    if (status) {
+      params.set("status", status);
+    }
+    if (testID) {
+      params.set("test", testID);
+    }
+
+    // Only the most recently requested page is rendered
+    if (request) {
+      request.abort();
+    }
+    request = new XMLHttpRequest();
+    request.open("GET", resultTable.dataset.url + "?" + params.toString());
+    request.responseType = "json";
+    request.onload = function() {
+      if (this.status == 200) {
+        renderResults(this.response);
+      }
+    };
+    request.send();
+}
+
+document.addEventListener("DOMContentLoaded", function() {
+    var filterTimer = null;
+
+    document.getElementById("page_prev").onclick = function() {
+        loadPage(Math.max(offset - pageSize, 0));
+    }
+    document.getElementById("page_next").onclick = function() {
+        loadPage(offset + pageSize);
+    }
+    document.getElementById("filter_status").onchange = function() {
+        loadPage(0);
+    }
+    document.getElementById("filter_test").oninput = function() {
+        clearTimeout(filterTimer);
+        filterTimer = setTimeout(function() { loadPage(0); }, 300);
+    }
+
+    updatePager();
+});
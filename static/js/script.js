@@ -14,6 +14,15 @@ function updateDropdown() {
     }
     versionDropdown.value = testData["default_version"];
 
+    // Update the mode dropdown, hiding it where only conformance testing is available
+    var modeDropdown = document.getElementById("mode");
+    modeDropdown.options.length = 0;
+    for (var i=0; i<testData["modes"].length; i++) {
+      modeDropdown.options[i] = new Option(testData["modes"][i][1], testData["modes"][i][0]);
+    }
+    modeDropdown.value = testData["modes"][0][0];
+    document.getElementById("mode_select").style.display = testData["modes"].length > 1 ? "inline-block" : "none";
+
     // Update the input boxes and their labels
     var input1 = document.getElementById("input1");
     var input2 = document.getElementById("input2");